@@ -0,0 +1,134 @@
+"""
+Per-user entitlement snapshots.
+
+An entitlement snapshot is everything feature gating needs to know about a
+merchant: the subscription tier and the resulting feature flags (tier,
+platform and per-user waffle flags). Snapshots are cached and rebuilt by
+``accounts.signals`` whenever a field that feeds them changes, so reading
+them is a single cache lookup.
+"""
+from __future__ import annotations
+
+from collections import defaultdict
+from typing import Any, Dict, Iterable, List, Optional
+
+from django.apps import apps
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+
+SNAPSHOT_TIMEOUT = 24 * 60 * 60
+
+# User fields that feed the snapshot; saving any of them triggers a rebuild.
+ENTITLEMENT_FIELDS = frozenset(
+    {"subscription_status", "store_platform", "has_shopify_store", "is_active"}
+)
+
+TIER_FLAGS = {
+    "trial": [],
+    "launch": ["live_data"],
+    "scale": ["live_data", "exchange_automation", "ai_coach"],
+    "elite": [
+        "live_data",
+        "exchange_automation",
+        "ai_coach",
+        "white_glove_support",
+        "custom_playbooks",
+        "quarterly_workshops",
+    ],
+}
+
+
+def snapshot_cache_key(user_id: Any) -> str:
+    return f"entitlements:v1:{user_id}"
+
+
+def _platform_flags(user) -> List[str]:
+    flags = []
+    if user.has_shopify_store:
+        flags.append("shopify_integration")
+    if user.store_platform == "bigcommerce":
+        flags.append("bigcommerce_integration")
+    if user.store_platform == "woocommerce":
+        flags.append("woocommerce_integration")
+    return flags
+
+
+def _bulk_waffle_flags(user_ids: List[Any]) -> Dict[Any, List[str]]:
+    flags: Dict[Any, List[str]] = defaultdict(list)
+    # django-waffle is optional; only query it when the app is enabled.
+    if not apps.is_installed("waffle") or not user_ids:
+        return flags
+    from waffle.models import Flag
+
+    rows = Flag.users.through.objects.filter(user_id__in=user_ids, flag__everyone=False).values_list(
+        "user_id", "flag__name"
+    )
+    for user_id, name in rows:
+        flags[user_id].append(name)
+    return flags
+
+
+def build_snapshot(user, waffle_flags: Optional[List[str]] = None) -> Dict[str, Any]:
+    """Compute a snapshot from the database, bypassing the cache."""
+    tier = user.subscription_status
+    flags = list(TIER_FLAGS.get(tier, []))
+    flags.extend(_platform_flags(user))
+    if waffle_flags is None:
+        waffle_flags = _bulk_waffle_flags([user.pk]).get(user.pk, [])
+    flags.extend(waffle_flags)
+    return {"tier": tier, "flags": flags}
+
+
+def refresh_snapshot(user) -> Dict[str, Any]:
+    snapshot = build_snapshot(user)
+    cache.set(snapshot_cache_key(user.pk), snapshot, SNAPSHOT_TIMEOUT)
+    return snapshot
+
+
+def get_snapshot(user) -> Dict[str, Any]:
+    """Return the cached snapshot for ``user``, building it on a miss."""
+    snapshot = cache.get(snapshot_cache_key(user.pk))
+    if snapshot is None:
+        snapshot = refresh_snapshot(user)
+    return snapshot
+
+
+def invalidate_snapshots(user_ids) -> None:
+    keys = [snapshot_cache_key(user_id) for user_id in user_ids]
+    if keys:
+        cache.delete_many(keys)
+
+
+def get_snapshots(user_ids: Iterable[Any]) -> Dict[Any, Dict[str, Any]]:
+    """
+    Resolve snapshots for many users at once.
+
+    Cached snapshots are fetched with one ``get_many``; the misses cost one
+    user query plus one waffle query in total and are written back with one
+    ``set_many``. Unknown user IDs are omitted from the result.
+    """
+    user_ids = list(dict.fromkeys(user_ids))
+    keys = {snapshot_cache_key(user_id): user_id for user_id in user_ids}
+    cached = cache.get_many(list(keys))
+    snapshots = {keys[key]: snapshot for key, snapshot in cached.items()}
+
+    missing = [user_id for user_id in user_ids if user_id not in snapshots]
+    if missing:
+        users = get_user_model().objects.filter(pk__in=missing).only(
+            "pk", "subscription_status", "store_platform", "has_shopify_store"
+        )
+        waffle_flags = _bulk_waffle_flags(missing)
+        built = {user.pk: build_snapshot(user, waffle_flags.get(user.pk, [])) for user in users}
+        cache.set_many(
+            {snapshot_cache_key(user_id): snapshot for user_id, snapshot in built.items()},
+            SNAPSHOT_TIMEOUT,
+        )
+        snapshots.update(built)
+    return snapshots
+
+
+def users_with_flag(user_ids: Iterable[Any], flag: str) -> List[Any]:
+    """Return the subset of ``user_ids`` whose snapshot grants ``flag``, in input order."""
+    user_ids = list(user_ids)
+    snapshots = get_snapshots(user_ids)
+    return [user_id for user_id in user_ids if flag in snapshots.get(user_id, {}).get("flags", ())]
@@ -0,0 +1,52 @@
+from __future__ import annotations
+
+from django.apps import apps
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+
+from .entitlements import ENTITLEMENT_FIELDS, invalidate_snapshots, refresh_snapshot
+
+
+def _rebuild_user_snapshot(sender, instance, created=False, update_fields=None, **kwargs) -> None:
+    if update_fields is not None and not ENTITLEMENT_FIELDS.intersection(update_fields):
+        return
+    # Drop the old snapshot now and rebuild once the new state is committed, so
+    # concurrent readers never cache a value from an uncommitted transaction.
+    invalidate_snapshots([instance.pk])
+    transaction.on_commit(lambda: refresh_snapshot(instance))
+
+
+def _drop_user_snapshot(sender, instance, **kwargs) -> None:
+    invalidate_snapshots([instance.pk])
+
+
+def _drop_flag_snapshots(sender, instance, **kwargs) -> None:
+    invalidate_snapshots(instance.users.values_list("pk", flat=True))
+
+
+def _flag_users_changed(sender, instance, action, reverse, pk_set, **kwargs) -> None:
+    if action not in {"post_add", "post_remove", "pre_clear"}:
+        return
+    if reverse:
+        # user.flag_set.add(...): ``instance`` is the user.
+        invalidate_snapshots([instance.pk])
+    elif action == "pre_clear":
+        invalidate_snapshots(instance.users.values_list("pk", flat=True))
+    else:
+        invalidate_snapshots(pk_set or [])
+
+
+def connect_signals() -> None:
+    User = get_user_model()
+    post_save.connect(_rebuild_user_snapshot, sender=User, dispatch_uid="entitlements_user_saved")
+    post_delete.connect(_drop_user_snapshot, sender=User, dispatch_uid="entitlements_user_deleted")
+
+    if apps.is_installed("waffle"):
+        from waffle.models import Flag
+
+        post_save.connect(_drop_flag_snapshots, sender=Flag, dispatch_uid="entitlements_flag_saved")
+        pre_delete.connect(_drop_flag_snapshots, sender=Flag, dispatch_uid="entitlements_flag_deleted")
+        m2m_changed.connect(
+            _flag_users_changed, sender=Flag.users.through, dispatch_uid="entitlements_flag_users"
+        )
@@ -137,3 +137,64 @@ class AuthAPITestCase(APITestCase):
         self.assertEqual(user.store_platform, "bigcommerce")
         self.assertEqual(user.store_domain, "store-bigcommerce.example.com")
         self.assertFalse(user.has_shopify_store)
+
+
+class EntitlementSnapshotTests(APITestCase):
+    def setUp(self):
+        from django.core.cache import cache
+
+        cache.clear()
+        self.user = User.objects.create_user(
+            username="gated",
+            email="gated@returnshield.app",
+            password="StrongPass123!",
+            subscription_status="launch",
+        )
+        self.client.force_authenticate(self.user)
+
+    def test_feature_flags_served_from_snapshot(self):
+        url = reverse("feature-flags")
+        self.assertEqual(self.client.get(url).json(), ["live_data"])
+
+        with mock.patch("accounts.entitlements.build_snapshot") as mock_build:
+            response = self.client.get(url)
+        mock_build.assert_not_called()
+        self.assertEqual(response.json(), ["live_data"])
+
+    def test_snapshot_rebuilt_when_subscription_changes(self):
+        from accounts.entitlements import get_snapshot
+
+        self.assertEqual(get_snapshot(self.user)["tier"], "launch")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.subscription_status = "elite"
+            self.user.save(update_fields=["subscription_status"])
+
+        with mock.patch("accounts.entitlements.build_snapshot") as mock_build:
+            snapshot = get_snapshot(self.user)
+        mock_build.assert_not_called()
+        self.assertEqual(snapshot["tier"], "elite")
+        self.assertIn("custom_playbooks", snapshot["flags"])
+
+    def test_bulk_snapshots_match_single_user_rules(self):
+        from django.core.cache import cache
+
+        from accounts.entitlements import get_snapshot, get_snapshots, users_with_flag
+
+        scale_user = User.objects.create_user(
+            username="scaler",
+            email="scaler@returnshield.app",
+            password="StrongPass123!",
+            subscription_status="scale",
+            store_platform="bigcommerce",
+        )
+        cache.clear()
+        get_snapshot(self.user)  # warm one entry; the other must come from the DB
+
+        with self.assertNumQueries(1):
+            snapshots = get_snapshots([self.user.pk, scale_user.pk, 999999])
+
+        self.assertEqual(set(snapshots), {self.user.pk, scale_user.pk})
+        cache.clear()
+        self.assertEqual(snapshots[scale_user.pk], get_snapshot(scale_user))
+        self.assertEqual(users_with_flag([self.user.pk, scale_user.pk], "ai_coach"), [scale_user.pk])
@@ -7,7 +7,9 @@ from returns.models import ReturnRequest, Order
 from datetime import timedelta
 from django.utils import timezone
 
-class ReturnReasonAnalyticsView(APIView):
+from core.db_routers import ReplicaReadMixin
+
+class ReturnReasonAnalyticsView(ReplicaReadMixin, APIView):
     """
     Aggregates return reasons by SKU/Product.
     """
@@ -50,7 +52,7 @@ class ReturnReasonAnalyticsView(APIView):
         return Response(response_data, status=status.HTTP_200_OK)
 
 
-class CohortAnalysisView(APIView):
+class CohortAnalysisView(ReplicaReadMixin, APIView):
     """
     Calculates return rates for New vs Returning customers.
     """
@@ -95,7 +97,7 @@ class CohortAnalysisView(APIView):
         }, status=status.HTTP_200_OK)
 
 
-class ProfitabilityImpactView(APIView):
+class ProfitabilityImpactView(ReplicaReadMixin, APIView):
     """
     Calculates margin saved via exchanges vs refunds.
     """
@@ -4,6 +4,15 @@ from datetime import timedelta
 from .models import AutomationRule, FraudSettings
 from returns.models import ReturnRequest
 
+
+def _items_total(return_request: ReturnRequest) -> Decimal:
+    """Value of the returned items (``ReturnRequest.items`` holds line item dicts)."""
+    return sum(
+        (Decimal(str(item.get('price', 0))) * int(item.get('quantity', 1)) for item in return_request.items),
+        Decimal('0'),
+    )
+
+
 class RuleEvaluator:
     @staticmethod
     def evaluate(return_request: ReturnRequest):
@@ -13,7 +22,7 @@ class RuleEvaluator:
         """
         # Get rules for the merchant
         rules = AutomationRule.objects.filter(
-            user=return_request.order.user,
+            user_id=return_request.order.user_id,
             is_active=True
         )
 
@@ -29,7 +38,7 @@ class RuleEvaluator:
         
         if rule.trigger_field == AutomationRule.TriggerField.TOTAL_VALUE:
             # Calculate total value of items being returned
-            actual_value = sum(item.price * item.quantity for item in request.items.all())
+            actual_value = _items_total(request)
         elif rule.trigger_field == AutomationRule.TriggerField.RETURN_REASON:
             actual_value = request.reason
         elif rule.trigger_field == AutomationRule.TriggerField.ITEM_CONDITION:
@@ -77,10 +86,10 @@ class FraudDetector:
         Checks if the return request is fraudulent based on merchant settings.
         Returns (is_fraud, reason).
         """
-        user = return_request.order.user
-        try:
-            settings = user.fraud_settings
-        except FraudSettings.DoesNotExist:
+        # Work from the order's user id; loading the User itself is not needed.
+        user_id = return_request.order.user_id
+        settings = FraudSettings.objects.filter(user_id=user_id).first()
+        if settings is None:
             return False, ""
 
         # 1. Check Velocity
@@ -91,7 +100,7 @@ class FraudDetector:
             customer_email = return_request.order.customer_email
             
             recent_returns_count = ReturnRequest.objects.filter(
-                order__user=user,
+                order__user_id=user_id,
                 order__customer_email=customer_email,
                 created_at__gte=month_ago
             ).exclude(id=return_request.id).count()
@@ -101,7 +110,7 @@ class FraudDetector:
 
         # 2. Check High Value
         if settings.flag_high_value:
-            total_value = sum(item.price * item.quantity for item in return_request.items.all())
+            total_value = _items_total(return_request)
             if total_value >= settings.high_value_threshold:
                 return True, f"High value return: ${total_value} exceeds threshold of ${settings.high_value_threshold}."
 
@@ -17,11 +17,13 @@ class BigCommerceIntegrationTests(APITestCase):
         )
         self.client.force_authenticate(self.user)
 
-    @mock.patch("bigcommerce_integration.views.requests.get")
-    def test_connect_success(self, mock_get):
-        mock_get.return_value = mock.Mock(
-            status_code=200,
-            json=lambda: {"data": {"name": "Demo Store", "domain": "demo.mybigcommerce.com"}},
+    @mock.patch("bigcommerce_integration.views.get_async_client")
+    def test_connect_success(self, mock_client):
+        mock_client.return_value.get = mock.AsyncMock(
+            return_value=mock.Mock(
+                status_code=200,
+                json=lambda: {"data": {"name": "Demo Store", "domain": "demo.mybigcommerce.com"}},
+            )
         )
 
         response = self.client.post(
@@ -41,9 +43,9 @@ class BigCommerceIntegrationTests(APITestCase):
         self.user.refresh_from_db()
         self.assertEqual(self.user.store_platform, User.StorePlatform.BIGCOMMERCE)
 
-    @mock.patch("bigcommerce_integration.views.requests.get")
-    def test_connect_failure(self, mock_get):
-        mock_get.return_value = mock.Mock(status_code=401, json=lambda: {})
+    @mock.patch("bigcommerce_integration.views.get_async_client")
+    def test_connect_failure(self, mock_client):
+        mock_client.return_value.get = mock.AsyncMock(return_value=mock.Mock(status_code=401, json=lambda: {}))
 
         response = self.client.post(
             reverse("bigcommerce_integration:connect"),
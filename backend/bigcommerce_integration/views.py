@@ -3,23 +3,26 @@ from __future__ import annotations
 import logging
 from typing import Any, Dict
 
-import requests
+import httpx
+from adrf.views import APIView as AsyncAPIView
+from asgiref.sync import sync_to_async
 from django.utils import timezone
 from rest_framework import permissions, status
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
 from accounts.models import User
+from core.http import get_async_client
 from .models import BigCommerceInstallation
 from .serializers import BigCommerceConnectSerializer
 
 logger = logging.getLogger(__name__)
 
 
-class BigCommerceConnectView(APIView):
+class BigCommerceConnectView(AsyncAPIView):
     permission_classes = [permissions.IsAuthenticated]
 
-    def post(self, request, *args, **kwargs):
+    async def post(self, request, *args, **kwargs):
         serializer = BigCommerceConnectSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
         data = serializer.validated_data
@@ -36,12 +39,12 @@ class BigCommerceConnectView(APIView):
             headers["X-Auth-Client"] = client_id
 
         try:
-            response = requests.get(
+            response = await get_async_client().get(
                 f"https://api.bigcommerce.com/stores/{store_hash}/v3/store",
                 headers=headers,
                 timeout=10,
             )
-        except requests.RequestException as exc:
+        except httpx.HTTPError as exc:
             logger.exception("BigCommerce verification failed: %s", exc)
             return Response(
                 {"detail": "Unable to reach BigCommerce. Please verify credentials."},
@@ -60,7 +63,7 @@ class BigCommerceConnectView(APIView):
         except ValueError:
             logger.warning("Unexpected BigCommerce response payload.")
 
-        installation, _created = BigCommerceInstallation.objects.get_or_create(
+        installation, _created = await BigCommerceInstallation.objects.aget_or_create(
             user=request.user,
             defaults={
                 "store_hash": store_hash,
@@ -74,13 +77,13 @@ class BigCommerceConnectView(APIView):
 
         if not _created:
             installation.store_hash = store_hash
-            installation.mark_active(
+            await sync_to_async(installation.mark_active)(
                 client_id=client_id,
                 access_token=access_token,
                 context=payload.get("context", ""),
             )
 
-        self._update_user_store_profile(request.user, payload)
+        await sync_to_async(self._update_user_store_profile)(request.user, payload)
 
         return Response(
             {
@@ -4,3 +4,11 @@ from django.apps import AppConfig
 class BillingConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "billing"
+
+    def ready(self) -> None:
+        import stripe
+
+        from core.http import get_session
+
+        # Send Stripe API calls through the shared pooled integration session.
+        stripe.default_http_client = stripe.RequestsClient(session=get_session())
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from billing.models import StripeEvent
+from billing.services import replay_events
+from billing.tasks import process_stripe_events
+
+
+class Command(BaseCommand):
+    help = "Reset stored Stripe webhook events to pending and enqueue them for processing."
+
+    def add_arguments(self, parser):
+        parser.add_argument("event_ids", nargs="*", help="Stripe event IDs (evt_...) to replay.")
+        parser.add_argument("--failed", action="store_true", help="Replay every failed event.")
+        parser.add_argument("--customer", help="Replay every event for this Stripe customer ID.")
+
+    def handle(self, *args, **options):
+        events = StripeEvent.objects.none()
+        if options["event_ids"]:
+            events |= StripeEvent.objects.filter(event_id__in=options["event_ids"])
+        if options["failed"]:
+            events |= StripeEvent.objects.filter(status=StripeEvent.Status.FAILED)
+        if options["customer"]:
+            events |= StripeEvent.objects.filter(customer_id=options["customer"])
+        if not (options["event_ids"] or options["failed"] or options["customer"]):
+            raise CommandError("Pass event IDs, --failed or --customer.")
+
+        events = list(events)
+        customer_ids = replay_events(events)
+        for customer_id in customer_ids:
+            process_stripe_events.delay(customer_id)
+        self.stdout.write(
+            self.style.SUCCESS(f"Replaying {len(events)} events for {len(customer_ids)} customers.")
+        )
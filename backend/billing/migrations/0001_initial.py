@@ -0,0 +1,34 @@
+# Generated by Django 5.2.8 on 2026-10-19 16:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StripeEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('event_id', models.CharField(max_length=255, unique=True)),
+                ('event_type', models.CharField(max_length=100)),
+                ('customer_id', models.CharField(blank=True, help_text='Stripe customer the event belongs to; events are applied in order per customer.', max_length=255)),
+                ('stripe_created_at', models.DateTimeField(blank=True, null=True)),
+                ('payload', models.JSONField(default=dict)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('processed', 'Processed'), ('failed', 'Failed')], default='pending', max_length=16)),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('last_error', models.TextField(blank=True)),
+                ('received_at', models.DateTimeField(auto_now_add=True)),
+                ('processed_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'ordering': ('stripe_created_at', 'id'),
+                'indexes': [models.Index(fields=['customer_id', 'status', 'stripe_created_at'], name='stripe_event_queue_idx'), models.Index(fields=['status', 'received_at'], name='stripe_event_status_idx')],
+            },
+        ),
+    ]
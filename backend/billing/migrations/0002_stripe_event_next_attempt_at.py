@@ -0,0 +1,22 @@
+# Generated by Django 5.2.8 on 2026-10-19 17:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('billing', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='stripeevent',
+            name='next_attempt_at',
+            field=models.DateTimeField(blank=True, help_text='When a failed event is next retried; the sweep picks up overdue ones.', null=True),
+        ),
+        migrations.AddIndex(
+            model_name='stripeevent',
+            index=models.Index(fields=['status', 'next_attempt_at'], name='stripe_event_retry_idx'),
+        ),
+    ]
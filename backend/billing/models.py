@@ -0,0 +1,45 @@
+from django.db import models
+
+
+class StripeEvent(models.Model):
+    """
+    Stripe webhook events, stored once per event id.
+
+    The webhook only verifies and records events; ``billing.tasks`` applies
+    them in order per customer, so Stripe retries are deduplicated and failed
+    events can be replayed.
+    """
+
+    class Status(models.TextChoices):
+        PENDING = "pending", "Pending"
+        PROCESSED = "processed", "Processed"
+        FAILED = "failed", "Failed"
+
+    event_id = models.CharField(max_length=255, unique=True)
+    event_type = models.CharField(max_length=100)
+    customer_id = models.CharField(
+        max_length=255,
+        blank=True,
+        help_text="Stripe customer the event belongs to; events are applied in order per customer.",
+    )
+    stripe_created_at = models.DateTimeField(null=True, blank=True)
+    payload = models.JSONField(default=dict)
+    status = models.CharField(max_length=16, choices=Status.choices, default=Status.PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    next_attempt_at = models.DateTimeField(
+        null=True, blank=True, help_text="When a failed event is next retried; the sweep picks up overdue ones."
+    )
+    received_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ("stripe_created_at", "id")
+        indexes = [
+            models.Index(fields=["customer_id", "status", "stripe_created_at"], name="stripe_event_queue_idx"),
+            models.Index(fields=["status", "received_at"], name="stripe_event_status_idx"),
+            models.Index(fields=["status", "next_attempt_at"], name="stripe_event_retry_idx"),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.event_id} ({self.event_type}, {self.status})"
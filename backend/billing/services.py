@@ -0,0 +1,263 @@
+"""
+Stripe event processing.
+
+``StripeWebhookView`` only verifies and records events; the functions below
+apply them to accounts. Events are applied strictly in Stripe creation order
+per customer, and an event that fails blocks the customer's later events
+until it succeeds or is replayed, so a cancellation can never be overtaken by
+an older plan change.
+"""
+from __future__ import annotations
+
+import logging
+from datetime import timedelta
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.utils import timezone
+
+from analytics.posthog import capture as capture_event
+
+from .models import StripeEvent
+
+logger = logging.getLogger(__name__)
+
+# Failed events are retried by the consumer up to this many times before they
+# are left for a manual replay.
+MAX_ATTEMPTS = 5
+RETRY_BACKOFF_BASE_SECONDS = 30
+RETRY_BACKOFF_CAP_SECONDS = 30 * 60
+
+
+def retry_delay(attempts: int) -> timedelta:
+    return timedelta(seconds=min(RETRY_BACKOFF_BASE_SECONDS * 2 ** (attempts - 1), RETRY_BACKOFF_CAP_SECONDS))
+
+
+def _handle_checkout_completed(event_data: Dict[str, Any]) -> None:
+    User = get_user_model()
+    customer_email = (event_data.get("customer_details") or {}).get("email")
+    customer_id = event_data.get("customer")
+    subscription_id = event_data.get("subscription")
+    plan = (event_data.get("metadata") or {}).get("plan", "").lower()
+
+    if not customer_email or plan not in ["launch", "scale", "elite"]:
+        logger.warning(
+            "Stripe checkout completed with invalid plan or missing email: plan=%s, email=%s",
+            plan,
+            customer_email,
+        )
+        return
+
+    try:
+        user = User.objects.get(email=customer_email)
+    except User.DoesNotExist:
+        logger.warning(
+            "Stripe checkout completed but user not found: %s (session: %s)",
+            customer_email,
+            event_data.get("id"),
+        )
+        return
+
+    user.subscription_status = plan
+    if customer_id:
+        user.stripe_customer_id = customer_id
+    user.save(update_fields=["subscription_status", "stripe_customer_id"])
+    logger.info(
+        "Activated %s subscription for user %s (Stripe session: %s)",
+        plan,
+        user.pk,
+        event_data.get("id"),
+    )
+    capture_event(
+        "subscription_activated_via_webhook",
+        distinct_id=str(user.pk),
+        properties={"plan": plan, "subscription_id": subscription_id, "customer_id": customer_id},
+    )
+
+
+def _handle_subscription_deleted(event_data: Dict[str, Any]) -> None:
+    User = get_user_model()
+    customer_id = event_data.get("customer")
+    subscription_id = event_data.get("id")
+    if not customer_id:
+        return
+
+    try:
+        user = User.objects.get(stripe_customer_id=customer_id)
+    except User.DoesNotExist:
+        logger.warning(
+            "Stripe subscription deleted but user not found: customer_id=%s, subscription=%s",
+            customer_id,
+            subscription_id,
+        )
+        return
+
+    old_status = user.subscription_status
+    user.subscription_status = "trial"
+    user.save(update_fields=["subscription_status"])
+    logger.info(
+        "Downgraded user %s from %s to trial after cancellation (subscription: %s)",
+        user.pk,
+        old_status,
+        subscription_id,
+    )
+    capture_event(
+        "subscription_canceled_via_webhook",
+        distinct_id=str(user.pk),
+        properties={"previous_plan": old_status, "subscription_id": subscription_id},
+    )
+
+
+def _handle_subscription_updated(event_data: Dict[str, Any]) -> None:
+    User = get_user_model()
+    customer_id = event_data.get("customer")
+    subscription_id = event_data.get("id")
+    subscription_status = event_data.get("status")
+
+    # Extract price ID from the first item in the subscription
+    price_id = None
+    items = (event_data.get("items") or {}).get("data") or []
+    if items and items[0].get("price"):
+        price_id = items[0]["price"].get("id")
+
+    plan_mapping = {
+        settings.STRIPE_PRICE_IDS.get("launch"): "launch",
+        settings.STRIPE_PRICE_IDS.get("scale"): "scale",
+        settings.STRIPE_PRICE_IDS.get("elite"): "elite",
+    }
+    new_plan = plan_mapping.get(price_id)
+    if not (customer_id and new_plan and subscription_status == "active"):
+        return
+
+    try:
+        user = User.objects.get(stripe_customer_id=customer_id)
+    except User.DoesNotExist:
+        logger.warning(
+            "Stripe subscription updated but user not found: customer_id=%s, subscription=%s",
+            customer_id,
+            subscription_id,
+        )
+        return
+
+    old_plan = user.subscription_status
+    user.subscription_status = new_plan
+    user.save(update_fields=["subscription_status"])
+    logger.info(
+        "Updated user %s subscription from %s to %s (subscription: %s)",
+        user.pk,
+        old_plan,
+        new_plan,
+        subscription_id,
+    )
+    capture_event(
+        "subscription_updated_via_webhook",
+        distinct_id=str(user.pk),
+        properties={"previous_plan": old_plan, "new_plan": new_plan, "subscription_id": subscription_id},
+    )
+
+
+def _handle_payment_failed(event_data: Dict[str, Any]) -> None:
+    User = get_user_model()
+    customer_id = event_data.get("customer")
+    subscription_id = event_data.get("subscription")
+    if not customer_id:
+        return
+
+    try:
+        user = User.objects.get(stripe_customer_id=customer_id)
+    except User.DoesNotExist:
+        logger.warning(
+            "Payment failed but user not found: customer_id=%s, subscription=%s",
+            customer_id,
+            subscription_id,
+        )
+        return
+
+    logger.warning(
+        "Payment failed for user %s (subscription: %s) - consider implementing grace period",
+        user.pk,
+        subscription_id,
+    )
+    capture_event(
+        "payment_failed_via_webhook",
+        distinct_id=str(user.pk),
+        properties={"subscription_id": subscription_id},
+    )
+
+
+EVENT_HANDLERS = {
+    "checkout.session.completed": _handle_checkout_completed,
+    "customer.subscription.deleted": _handle_subscription_deleted,
+    "customer.subscription.updated": _handle_subscription_updated,
+    "invoice.payment_failed": _handle_payment_failed,
+}
+
+
+def apply_stripe_event(event_type: str, event_data: Dict[str, Any]) -> None:
+    """Apply one Stripe event to our records. Unknown event types are ignored."""
+    handler = EVENT_HANDLERS.get(event_type)
+    if handler is None:
+        logger.debug("Ignoring Stripe event type %s", event_type)
+        return
+    handler(event_data)
+
+
+def process_customer_events(
+    customer_id: str, heartbeat: Optional[Callable[[], None]] = None
+) -> Optional[StripeEvent]:
+    """
+    Apply the customer's outstanding events in order.
+
+    Returns the event that failed, is waiting out its retry backoff or is
+    waiting for a replay, or ``None`` when everything was applied; later
+    events for the same customer are left pending so ordering is preserved
+    on retry. ``heartbeat`` is called before each event (the consumer
+    renews its lock there).
+    """
+    outstanding = StripeEvent.objects.filter(
+        customer_id=customer_id,
+        status__in=[StripeEvent.Status.PENDING, StripeEvent.Status.FAILED],
+    ).order_by("stripe_created_at", "id")
+
+    for event in outstanding:
+        if event.status == StripeEvent.Status.FAILED and (
+            event.attempts >= MAX_ATTEMPTS or (event.next_attempt_at and event.next_attempt_at > timezone.now())
+        ):
+            # Out of attempts, it blocks the customer until it is replayed;
+            # otherwise until its backoff has passed.
+            return event
+        if heartbeat is not None:
+            heartbeat()
+        try:
+            with transaction.atomic():
+                apply_stripe_event(event.event_type, (event.payload.get("data") or {}).get("object") or {})
+                event.status = StripeEvent.Status.PROCESSED
+                event.attempts += 1
+                event.last_error = ""
+                event.processed_at = timezone.now()
+                event.next_attempt_at = None
+                event.save(update_fields=["status", "attempts", "last_error", "processed_at", "next_attempt_at"])
+        except Exception as exc:
+            logger.exception("Error processing Stripe event %s (%s)", event.event_id, event.event_type)
+            event.status = StripeEvent.Status.FAILED
+            event.attempts += 1
+            event.last_error = str(exc)[:2000]
+            event.next_attempt_at = None
+            if event.attempts < MAX_ATTEMPTS:
+                event.next_attempt_at = timezone.now() + retry_delay(event.attempts)
+            event.save(update_fields=["status", "attempts", "last_error", "next_attempt_at"])
+            return event
+    return None
+
+
+def replay_events(events: Iterable[StripeEvent]) -> List[str]:
+    """Reset events to pending and return the customers that need a consumer run."""
+    event_ids = [event.pk for event in events]
+    StripeEvent.objects.filter(pk__in=event_ids).update(
+        status=StripeEvent.Status.PENDING, attempts=0, last_error="", processed_at=None, next_attempt_at=None
+    )
+    return list(
+        StripeEvent.objects.filter(pk__in=event_ids).order_by().values_list("customer_id", flat=True).distinct()
+    )
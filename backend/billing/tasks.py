@@ -0,0 +1,94 @@
+"""
+Stripe event consumer tasks.
+"""
+import logging
+from datetime import timedelta
+
+from celery import shared_task
+from django.core.cache import cache
+from django.db.models import Q
+from django.utils import timezone
+
+from billing.models import StripeEvent
+from billing.services import MAX_ATTEMPTS, process_customer_events
+
+
+logger = logging.getLogger(__name__)
+
+# One consumer per customer at a time keeps events strictly ordered. The
+# lock is renewed before every event, so only a single event has to finish
+# within the timeout.
+LOCK_TIMEOUT = 5 * 60
+LOCK_RETRY_SECONDS = 5
+# Pending events older than this are assumed to have lost their enqueue
+# (e.g. the broker was down) and are picked up by the sweep.
+STALE_AFTER = timedelta(minutes=2)
+
+
+def _lock_key(customer_id):
+    return f"billing:stripe-events:{customer_id or 'none'}"
+
+
+# Retries are bounded by the failing event's own attempts (MAX_ATTEMPTS), not
+# by Celery's retry count, which lock contention would otherwise use up.
+@shared_task(bind=True, max_retries=None, ignore_result=True)
+def process_stripe_events(self, customer_id=""):
+    """
+    Apply outstanding Stripe events for one customer, oldest first.
+
+    Args:
+        customer_id: Stripe customer ID ("" for events without a customer)
+    """
+    lock_key = _lock_key(customer_id)
+    if not cache.add(lock_key, self.request.id or "local", LOCK_TIMEOUT):
+        # Another worker is draining this customer; it will see our events too,
+        # but check again shortly in case it finished just before they landed.
+        process_stripe_events.apply_async((customer_id,), countdown=LOCK_RETRY_SECONDS)
+        return
+
+    try:
+        blocked = process_customer_events(customer_id, heartbeat=lambda: cache.touch(lock_key, LOCK_TIMEOUT))
+    finally:
+        cache.delete(lock_key)
+
+    if blocked is None:
+        return
+    if blocked.attempts >= MAX_ATTEMPTS:
+        logger.error(
+            f"Stripe event {blocked.event_id} for customer {customer_id!r} is out of attempts; "
+            "later events wait until it is replayed"
+        )
+        return
+    # If this retry message is lost, the sweep picks the event up once due.
+    countdown = max(int((blocked.next_attempt_at - timezone.now()).total_seconds()), 1)
+    logger.warning(f"Stripe event failed for customer {customer_id!r}; retrying in {countdown}s")
+    raise self.retry(countdown=countdown)
+
+
+@shared_task(ignore_result=True)
+def enqueue_pending_stripe_events():
+    """
+    Periodic sweep that re-enqueues customers with stale pending events or
+    failed events whose retry is due.
+    """
+    now = timezone.now()
+    customer_ids = (
+        StripeEvent.objects.filter(
+            Q(status=StripeEvent.Status.PENDING, received_at__lt=now - STALE_AFTER)
+            | (
+                Q(status=StripeEvent.Status.FAILED, attempts__lt=MAX_ATTEMPTS)
+                # Events that failed before retries were scheduled have no next_attempt_at.
+                & (Q(next_attempt_at__lte=now) | Q(next_attempt_at__isnull=True))
+            )
+        )
+        .order_by()
+        .values_list("customer_id", flat=True)
+        .distinct()
+    )
+    count = 0
+    for customer_id in customer_ids:
+        process_stripe_events.delay(customer_id)
+        count += 1
+    if count:
+        logger.info(f"Re-enqueued Stripe events for {count} customers")
+    return count
@@ -157,3 +157,162 @@ class StripeWebhookViewTests(APITestCase):
         )
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(response.json(), {"received": True, "event_type": "checkout.session.completed"})
+
+    @patch("billing.views.process_stripe_events.delay")
+    @patch("billing.views.stripe.Webhook.construct_event")
+    def test_duplicate_event_is_stored_and_enqueued_once(self, mock_construct, mock_delay) -> None:
+        from billing.models import StripeEvent
+
+        mock_construct.return_value = {
+            "id": "evt_123",
+            "type": "invoice.payment_failed",
+            "created": 1700000000,
+            "data": {"object": {"customer": "cus_123"}},
+        }
+        for _ in range(2):
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client.post(
+                    reverse("billing:webhook"),
+                    data="{}",
+                    content_type="application/json",
+                    HTTP_STRIPE_SIGNATURE="sig_header",
+                )
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        event = StripeEvent.objects.get()
+        self.assertEqual(event.event_id, "evt_123")
+        self.assertEqual(event.customer_id, "cus_123")
+        self.assertEqual(event.status, StripeEvent.Status.PENDING)
+        mock_delay.assert_called_once_with("cus_123")
+
+
+@override_settings(STRIPE_PRICE_IDS={"launch": "price_launch", "scale": "price_scale"})
+class StripeEventProcessingTests(APITestCase):
+    def test_events_applied_in_stripe_order_per_customer(self) -> None:
+        from datetime import datetime, timezone
+
+        from django.contrib.auth import get_user_model
+
+        from billing.models import StripeEvent
+        from billing.services import process_customer_events
+
+        user = get_user_model().objects.create_user(
+            username="subscriber",
+            email="subscriber@returnshield.app",
+            password="StrongPass123!",
+            stripe_customer_id="cus_order",
+        )
+        # Received out of order: the cancellation must win because it is newer.
+        StripeEvent.objects.create(
+            event_id="evt_deleted",
+            event_type="customer.subscription.deleted",
+            customer_id="cus_order",
+            stripe_created_at=datetime(2025, 1, 2, tzinfo=timezone.utc),
+            payload={"data": {"object": {"id": "sub_1", "customer": "cus_order"}}},
+        )
+        StripeEvent.objects.create(
+            event_id="evt_updated",
+            event_type="customer.subscription.updated",
+            customer_id="cus_order",
+            stripe_created_at=datetime(2025, 1, 1, tzinfo=timezone.utc),
+            payload={
+                "data": {
+                    "object": {
+                        "id": "sub_1",
+                        "customer": "cus_order",
+                        "status": "active",
+                        "items": {"data": [{"price": {"id": "price_scale"}}]},
+                    }
+                }
+            },
+        )
+
+        with patch("billing.services.capture_event"):
+            self.assertIsNone(process_customer_events("cus_order"))
+
+        user.refresh_from_db()
+        self.assertEqual(user.subscription_status, "trial")
+        self.assertEqual(
+            set(StripeEvent.objects.values_list("status", flat=True)), {StripeEvent.Status.PROCESSED}
+        )
+
+    def test_exhausted_failed_event_blocks_later_events_until_replayed(self) -> None:
+        from datetime import datetime, timezone
+
+        from billing.models import StripeEvent
+        from billing.services import MAX_ATTEMPTS, process_customer_events, replay_events
+
+        failed = StripeEvent.objects.create(
+            event_id="evt_failed",
+            event_type="invoice.payment_failed",
+            customer_id="cus_blocked",
+            stripe_created_at=datetime(2025, 1, 1, tzinfo=timezone.utc),
+            status=StripeEvent.Status.FAILED,
+            attempts=MAX_ATTEMPTS,
+        )
+        later = StripeEvent.objects.create(
+            event_id="evt_later",
+            event_type="invoice.payment_failed",
+            customer_id="cus_blocked",
+            stripe_created_at=datetime(2025, 1, 2, tzinfo=timezone.utc),
+        )
+
+        self.assertEqual(process_customer_events("cus_blocked"), failed)
+        later.refresh_from_db()
+        self.assertEqual(later.status, StripeEvent.Status.PENDING)
+
+        replay_events([failed])
+        self.assertIsNone(process_customer_events("cus_blocked"))
+        self.assertEqual(
+            set(StripeEvent.objects.values_list("status", flat=True)), {StripeEvent.Status.PROCESSED}
+        )
+
+    @patch("billing.tasks.process_stripe_events.apply_async")
+    @patch("billing.tasks.process_customer_events")
+    def test_lock_contention_requeues_without_spending_retries(self, mock_process, mock_apply_async) -> None:
+        from django.core.cache import cache
+
+        from billing.tasks import _lock_key, process_stripe_events
+
+        cache.add(_lock_key("cus_busy"), "other-worker", 60)
+        self.addCleanup(cache.delete, _lock_key("cus_busy"))
+
+        process_stripe_events.apply(args=("cus_busy",))
+
+        mock_process.assert_not_called()
+        mock_apply_async.assert_called_once_with(("cus_busy",), countdown=5)
+
+    @patch("billing.tasks.process_stripe_events.delay")
+    def test_sweep_retries_due_failed_events_and_respects_backoff(self, mock_delay) -> None:
+        from datetime import datetime, timedelta, timezone
+
+        from django.utils import timezone as django_timezone
+
+        from billing.models import StripeEvent
+        from billing.services import process_customer_events
+        from billing.tasks import enqueue_pending_stripe_events
+
+        failed = StripeEvent.objects.create(
+            event_id="evt_retry",
+            event_type="invoice.payment_failed",
+            customer_id="cus_retry",
+            stripe_created_at=datetime(2025, 1, 1, tzinfo=timezone.utc),
+            status=StripeEvent.Status.FAILED,
+            attempts=1,
+            next_attempt_at=django_timezone.now() + timedelta(minutes=1),
+        )
+        StripeEvent.objects.create(
+            event_id="evt_after",
+            event_type="invoice.payment_failed",
+            customer_id="cus_retry",
+            stripe_created_at=datetime(2025, 1, 2, tzinfo=timezone.utc),
+        )
+
+        # A later event does not skip the failed event's backoff.
+        self.assertEqual(process_customer_events("cus_retry"), failed)
+        self.assertEqual(enqueue_pending_stripe_events(), 0)
+
+        # Once due, the sweep retries it even if the task's retry was lost.
+        StripeEvent.objects.filter(pk=failed.pk).update(next_attempt_at=django_timezone.now())
+        self.assertEqual(enqueue_pending_stripe_events(), 1)
+        mock_delay.assert_called_once_with("cus_retry")
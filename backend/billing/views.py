@@ -1,10 +1,13 @@
 from __future__ import annotations
 
+import hashlib
 import logging
-from typing import Any, Dict
+from datetime import datetime, timezone as dt_timezone
+from typing import Any
 
 import stripe
 from django.conf import settings
+from django.db import transaction
 from rest_framework import permissions, status
 from rest_framework.request import Request
 from rest_framework.response import Response
@@ -12,6 +15,9 @@ from rest_framework.views import APIView
 
 from analytics.posthog import capture as capture_event
 
+from .models import StripeEvent
+from .tasks import process_stripe_events
+
 logger = logging.getLogger(__name__)
 
 
@@ -127,169 +133,24 @@ class StripeWebhookView(APIView):
 
         event_type = event.get("type", "unknown")
         event_data = event.get("data", {}).get("object", {})
-        logger.info("Processing Stripe webhook event: %s", event_type)
-
-        # Process different event types
-        from django.contrib.auth import get_user_model
-        User = get_user_model()
-
-        try:
-            if event_type == "checkout.session.completed":
-                # New subscription activated
-                customer_email = event_data.get("customer_details", {}).get("email") # Updated to customer_details.email
-                customer_id = event_data.get("customer")
-                subscription_id = event_data.get("subscription")
-                metadata = event_data.get("metadata", {})
-                plan = metadata.get("plan", "").lower()
-
-                if customer_email and plan in ["launch", "scale", "elite"]:
-                    try:
-                        user = User.objects.get(email=customer_email)
-                        user.subscription_status = plan
-                        if customer_id:
-                            user.stripe_customer_id = customer_id
-                        user.save(update_fields=["subscription_status", "stripe_customer_id"])
-                        logger.info(
-                            "Activated %s subscription for user %s (Stripe session: %s)",
-                            plan,
-                            user.pk,
-                            event_data.get("id"),
-                        )
-
-                        capture_event(
-                            "subscription_activated_via_webhook",
-                            distinct_id=str(user.pk),
-                            properties={
-                                "plan": plan,
-                                "subscription_id": subscription_id,
-                                "customer_id": customer_id,
-                            },
-                        )
-                    except User.DoesNotExist:
-                        logger.warning(
-                            "Stripe checkout completed but user not found: %s (session: %s)",
-                            customer_email,
-                            event_data.get("id"),
-                        )
-                else:
-                    logger.warning(
-                        "Stripe checkout completed with invalid plan or missing email: plan=%s, email=%s",
-                        plan,
-                        customer_email,
-                    )
-
-            elif event_type == "customer.subscription.deleted":
-                # Subscription canceled - downgrade to trial
-                customer_id = event_data.get("customer")
-                subscription_id = event_data.get("id")
-
-                if customer_id:
-                    try:
-                        user = User.objects.get(stripe_customer_id=customer_id)
-                        old_status = user.subscription_status
-                        user.subscription_status = "trial"
-                        user.save(update_fields=["subscription_status"])
-                        logger.info(
-                            "Downgraded user %s from %s to trial after cancellation (subscription: %s)",
-                            user.pk,
-                            old_status,
-                            subscription_id,
-                        )
-
-                        capture_event(
-                            "subscription_canceled_via_webhook",
-                            distinct_id=str(user.pk),
-                            properties={
-                                "previous_plan": old_status,
-                                "subscription_id": subscription_id,
-                            },
-                        )
-                    except User.DoesNotExist:
-                        logger.warning(
-                            "Stripe subscription deleted but user not found: customer_id=%s, subscription=%s",
-                            customer_id,
-                            subscription_id,
-                        )
-
-            elif event_type == "customer.subscription.updated":
-                # Subscription plan changed (upgrade/downgrade)
-                customer_id = event_data.get("customer")
-                subscription_id = event_data.get("id")
-                subscription_status = event_data.get("status")
-                # Extract price ID from the first item in the subscription
-                price_id = None
-                if event_data.get("items") and event_data["items"].get("data"):
-                    first_item = event_data["items"]["data"][0]
-                    if first_item.get("price"):
-                        price_id = first_item["price"].get("id")
-
-                # Map price ID to plan name
-                plan_mapping = {
-                    settings.STRIPE_PRICE_IDS.get("launch"): "launch",
-                    settings.STRIPE_PRICE_IDS.get("scale"): "scale",
-                    settings.STRIPE_PRICE_IDS.get("elite"): "elite",
-                }
-                new_plan = plan_mapping.get(price_id)
-
-                if customer_id and new_plan and subscription_status == "active":
-                    try:
-                        user = User.objects.get(stripe_customer_id=customer_id)
-                        old_plan = user.subscription_status
-                        user.subscription_status = new_plan
-                        user.save(update_fields=["subscription_status"])
-                        logger.info(
-                            "Updated user %s subscription from %s to %s (subscription: %s)",
-                            user.pk,
-                            old_plan,
-                            new_plan,
-                            subscription_id,
-                        )
-
-                        capture_event(
-                            "subscription_updated_via_webhook",
-                            distinct_id=str(user.pk),
-                            properties={
-                                "previous_plan": old_plan,
-                                "new_plan": new_plan,
-                                "subscription_id": subscription_id,
-                            },
-                        )
-                    except User.DoesNotExist:
-                        logger.warning(
-                            "Stripe subscription updated but user not found: customer_id=%s, subscription=%s",
-                            customer_id,
-                            subscription_id,
-                        )
-
-            elif event_type == "invoice.payment_failed":
-                # Payment failed - could implement grace period or immediate downgrade
-                customer_id = event_data.get("customer")
-                subscription_id = event_data.get("subscription")
-
-                if customer_id:
-                    try:
-                        user = User.objects.get(stripe_customer_id=customer_id)
-                        logger.warning(
-                            "Payment failed for user %s (subscription: %s) - consider implementing grace period",
-                            user.pk,
-                            subscription_id,
-                        )
-
-                        capture_event(
-                            "payment_failed_via_webhook",
-                            distinct_id=str(user.pk),
-                            properties={"subscription_id": subscription_id},
-                        )
-                    except User.DoesNotExist:
-                        logger.warning(
-                            "Payment failed but user not found: customer_id=%s, subscription=%s",
-                            customer_id,
-                            subscription_id,
-                        )
-
-        except Exception as exc:  # pragma: no cover
-            logger.exception("Error processing Stripe webhook event %s: %s", event_type, exc)
-            # Return 200 anyway to prevent Stripe from retrying
-            # The event is logged and can be manually replayed if needed
+        event_id = event.get("id") or f"unidentified_{hashlib.sha256(payload_bytes).hexdigest()}"
+        customer_id = event_data.get("customer") or ""
+        created = event.get("created")
+
+        # Record and acknowledge; billing.tasks applies events in order per customer.
+        stored, created_now = StripeEvent.objects.get_or_create(
+            event_id=event_id,
+            defaults={
+                "event_type": event_type,
+                "customer_id": customer_id,
+                "stripe_created_at": datetime.fromtimestamp(created, tz=dt_timezone.utc) if created else None,
+                "payload": event,
+            },
+        )
+        if created_now:
+            logger.info("Queued Stripe webhook event %s: %s", event_id, event_type)
+            transaction.on_commit(lambda: process_stripe_events.delay(customer_id))
+        else:
+            logger.info("Ignoring duplicate Stripe webhook event %s (%s)", event_id, stored.status)
 
         return Response({"received": True, "event_type": event_type}, status=status.HTTP_200_OK)
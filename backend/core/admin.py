@@ -0,0 +1,52 @@
+from collections import Counter
+
+from django.conf import settings
+from django.contrib import admin, messages
+from django.http import HttpResponse
+
+from . import profiling
+from .models import ProfilingSession
+
+
+@admin.register(ProfilingSession)
+class ProfilingSessionAdmin(admin.ModelAdmin):
+    list_display = ["id", "mode", "target", "status", "samples", "requests_profiled", "created_by", "created_at"]
+    list_filter = ["mode", "target", "status"]
+    readonly_fields = [
+        "status",
+        "requests_profiled",
+        "samples",
+        "hosts",
+        "collapsed_stacks",
+        "created_by",
+        "created_at",
+        "completed_at",
+    ]
+    actions = ["download_collapsed_stacks"]
+
+    def get_readonly_fields(self, request, obj=None):
+        if obj is not None:
+            # A session cannot be retargeted once it has been published.
+            return [field.name for field in self.model._meta.fields]
+        return self.readonly_fields
+
+    def save_model(self, request, obj, form, change):
+        if not change:
+            obj.created_by = request.user
+        super().save_model(request, obj, form, change)
+        if change:
+            return
+        if not settings.PROFILING_ENABLED:
+            self.message_user(
+                request, "PROFILING_ENABLED is off, so no process will pick this session up.", messages.WARNING
+            )
+        profiling.activate(obj)
+
+    @admin.action(description="Download collapsed stacks (merged)")
+    def download_collapsed_stacks(self, request, queryset):
+        merged = Counter()
+        for session in queryset:
+            merged.update(profiling.parse_collapsed(session.collapsed_stacks))
+        response = HttpResponse(profiling.render_collapsed(merged) + "\n", content_type="text/plain")
+        response["Content-Disposition"] = 'attachment; filename="profile.folded"'
+        return response
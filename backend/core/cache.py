@@ -0,0 +1,156 @@
+"""
+Instrumented cache backends.
+
+Both backends behave exactly like their Django counterparts but count hits,
+misses and errors and time every operation. Counters are kept per process;
+the Redis backend additionally exposes the server-side keyspace statistics,
+which are shared by every gunicorn and Celery process.
+"""
+from __future__ import annotations
+
+import os
+import threading
+import time
+from typing import Any, Dict, Optional
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.cache.backends.redis import RedisCache
+
+from .timing import record_cache
+
+_MISSING = object()
+# Set while an instrumented operation runs so that backends implementing e.g.
+# get_many() on top of get() are only counted once, as the outer operation.
+_state = threading.local()
+
+
+class CacheStats:
+    """Thread-safe hit/miss/latency counters for one process."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        with self._lock:
+            self.hits = 0
+            self.misses = 0
+            self.errors = 0
+            self._operations: Dict[str, Dict[str, float]] = {}
+
+    def record(self, operation: str, elapsed: Optional[float], *, hits: int = 0, misses: int = 0) -> None:
+        if elapsed is None:
+            return
+        record_cache(elapsed, hits, misses)
+        with self._lock:
+            self.hits += hits
+            self.misses += misses
+            entry = self._operations.setdefault(operation, {"count": 0, "total_ms": 0.0, "max_ms": 0.0})
+            elapsed_ms = elapsed * 1000
+            entry["count"] += 1
+            entry["total_ms"] += elapsed_ms
+            entry["max_ms"] = max(entry["max_ms"], elapsed_ms)
+
+    def record_error(self) -> None:
+        with self._lock:
+            self.errors += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "pid": os.getpid(),
+                "hits": self.hits,
+                "misses": self.misses,
+                "errors": self.errors,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+                "operations": {
+                    name: {
+                        "count": int(entry["count"]),
+                        "avg_ms": round(entry["total_ms"] / entry["count"], 3),
+                        "max_ms": round(entry["max_ms"], 3),
+                    }
+                    for name, entry in self._operations.items()
+                },
+            }
+
+
+cache_stats = CacheStats()
+
+
+class InstrumentedCacheMixin:
+    def _timed(self, func, *args):
+        if getattr(_state, "active", False):
+            return func(*args), None
+        _state.active = True
+        started = time.perf_counter()
+        try:
+            result = func(*args)
+        except Exception:
+            cache_stats.record_error()
+            raise
+        finally:
+            _state.active = False
+        return result, time.perf_counter() - started
+
+    def get(self, key, default=None, version=None):
+        value, elapsed = self._timed(super().get, key, _MISSING, version)
+        hit = value is not _MISSING
+        cache_stats.record("get", elapsed, hits=int(hit), misses=int(not hit))
+        return value if hit else default
+
+    def get_many(self, keys, version=None):
+        keys = list(keys)
+        found, elapsed = self._timed(super().get_many, keys, version)
+        cache_stats.record("get_many", elapsed, hits=len(found), misses=len(keys) - len(found))
+        return found
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        result, elapsed = self._timed(super().set, key, value, timeout, version)
+        cache_stats.record("set", elapsed)
+        return result
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        result, elapsed = self._timed(super().add, key, value, timeout, version)
+        cache_stats.record("add", elapsed)
+        return result
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        result, elapsed = self._timed(super().set_many, data, timeout, version)
+        cache_stats.record("set_many", elapsed)
+        return result
+
+    def delete(self, key, version=None):
+        result, elapsed = self._timed(super().delete, key, version)
+        cache_stats.record("delete", elapsed)
+        return result
+
+    def incr(self, key, delta=1, version=None):
+        result, elapsed = self._timed(super().incr, key, delta, version)
+        cache_stats.record("incr", elapsed)
+        return result
+
+    def server_stats(self) -> Optional[Dict[str, Any]]:
+        return None
+
+
+class InstrumentedLocMemCache(InstrumentedCacheMixin, LocMemCache):
+    pass
+
+
+class InstrumentedRedisCache(InstrumentedCacheMixin, RedisCache):
+    def server_stats(self) -> Optional[Dict[str, Any]]:
+        try:
+            info = self._cache.get_client().info("stats")
+        except Exception:
+            cache_stats.record_error()
+            return None
+        hits = int(info.get("keyspace_hits", 0))
+        misses = int(info.get("keyspace_misses", 0))
+        return {
+            "keyspace_hits": hits,
+            "keyspace_misses": misses,
+            "hit_rate": round(hits / (hits + misses), 4) if hits + misses else None,
+            "evicted_keys": int(info.get("evicted_keys", 0)),
+        }
@@ -5,6 +5,7 @@ import os
 
 from celery import Celery
 from celery.schedules import crontab
+from kombu import Queue
 
 # Set the default Django settings module
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
@@ -14,6 +15,9 @@ app = Celery('returnshield')
 # Load config from Django settings with CELERY_ prefix
 app.config_from_object('django.conf:settings', namespace='CELERY')
 
+# Task metrics, trace propagation and the profiler control command
+from . import metrics, profiling, tracing  # noqa: E402,F401
+
 # Auto-discover tasks from all installed apps
 app.autodiscover_tasks()
 
@@ -23,10 +27,80 @@ app.conf.beat_schedule = {
         'task': 'shopify_integration.tasks.sync_all_installations',
         'schedule': crontab(minute='*/15'),  # Every 15 minutes
     },
+    'enqueue-pending-stripe-events-every-5-min': {
+        'task': 'billing.tasks.enqueue_pending_stripe_events',
+        'schedule': crontab(minute='*/5'),
+    },
+    'flush-email-queue-every-minute': {
+        'task': 'notifications.tasks.flush_email_queue',
+        'schedule': crontab(),
+    },
+    'drain-support-outbox-every-minute': {
+        'task': 'support.tasks.drain_support_outbox',
+        'schedule': crontab(),
+    },
+    'refresh-helpscout-token-every-5-min': {
+        'task': 'support.tasks.refresh_helpscout_token',
+        'schedule': crontab(minute='*/5'),
+    },
+    'apply-tracking-updates-every-minute': {
+        'task': 'returns.tasks.apply_tracking_updates',
+        'schedule': crontab(),
+    },
+    'reclaim-stale-label-batches-every-10-min': {
+        'task': 'returns.tasks.reclaim_stale_label_batches',
+        'schedule': crontab(minute='*/10'),
+    },
 }
 
 app.conf.timezone = 'UTC'
 
+# Queue topology. Each queue is consumed by one worker profile (below), so
+# a burst of store syncs cannot delay labels, emails or webhook processing.
+# Tasks without a route go to the default queue.
+DEFAULT_QUEUE = 'celery'
+QUEUES = ('sync', 'backfill', 'labels', 'notifications', 'analytics-rollups', 'webhooks')
+
+app.conf.task_default_queue = DEFAULT_QUEUE
+app.conf.task_queues = [Queue(name) for name in (DEFAULT_QUEUE, *QUEUES)]
+
+# Priorities order tasks within a queue. With the Redis transport 0 is the
+# highest priority and 9 the lowest; priorities are bucketed into these steps.
+app.conf.broker_transport_options = {
+    'queue_order_strategy': 'priority',
+    'priority_steps': [0, 3, 6, 9],
+    'sep': ':',
+}
+app.conf.task_default_priority = 6
+
+app.conf.task_routes = {
+    'shopify_integration.tasks.sync_all_installations': {'queue': 'sync', 'priority': 0},
+    # sync_all_installations sets each store's priority from its plan tier.
+    'shopify_integration.tasks.sync_shopify_orders': {'queue': 'sync'},
+    'shopify_integration.tasks.backfill_shopify_window': {'queue': 'backfill'},
+    'shopify_integration.tasks.finish_shopify_backfill': {'queue': 'backfill', 'priority': 0},
+    'shopify_integration.tasks.fail_shopify_backfill': {'queue': 'backfill', 'priority': 0},
+    'returns.tasks.store_return_labels': {'queue': 'labels', 'priority': 0},
+    'returns.tasks.run_label_batch': {'queue': 'labels', 'priority': 3},
+    'returns.tasks.reclaim_stale_label_batches': {'queue': 'labels', 'priority': 3},
+    'notifications.tasks.flush_email_queue': {'queue': 'notifications', 'priority': 0},
+    'support.tasks.drain_support_outbox': {'queue': 'notifications', 'priority': 3},
+    'support.tasks.refresh_helpscout_token': {'queue': 'notifications', 'priority': 0},
+    'billing.tasks.process_stripe_events': {'queue': 'webhooks', 'priority': 0},
+    'billing.tasks.enqueue_pending_stripe_events': {'queue': 'webhooks', 'priority': 3},
+    'returns.tasks.apply_tracking_updates': {'queue': 'webhooks', 'priority': 3},
+    # Reserved for analytics rollup tasks.
+    'analytics.tasks.*': {'queue': 'analytics-rollups'},
+}
+
+# Worker profiles (docker-compose.yml runs one service per profile):
+#   realtime:  -Q labels,notifications,webhooks,celery --concurrency 8 --prefetch-multiplier 4
+#   sync:      -Q sync,backfill --concurrency 4 --prefetch-multiplier 1
+#   analytics: -Q analytics-rollups --concurrency 2 --prefetch-multiplier 1
+# Long sync and backfill tasks reserve one message at a time so a slow store
+# does not hold other stores' tasks; the sync profile's concurrency also caps
+# how many backfill shards run at once across all stores.
+
 
 @app.task(bind=True, ignore_result=True)
 def debug_task(self):
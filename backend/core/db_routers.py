@@ -0,0 +1,138 @@
+"""
+Database routing for the optional read replica.
+
+Reads are only sent to the ``replica`` alias while a view has opted in via
+``ReplicaReadMixin`` (analytics, insights, health and shopper lookups). Every
+write, and every read outside that scope, stays on the primary. Replica reads
+fall back to the primary when the replica lags too far behind or cannot be
+reached, and clients that just submitted a write are pinned to the primary by
+``core.middleware.ReplicaStickinessMiddleware``.
+"""
+from __future__ import annotations
+
+import contextvars
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from typing import Iterator, Optional
+
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+PRIMARY_ALIAS = "default"
+REPLICA_ALIAS = "replica"
+
+# How often (seconds) each process re-measures replication lag.
+LAG_CHECK_INTERVAL = 5.0
+
+_LAG_QUERY = (
+    "SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+    "ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) END"
+)
+
+_replica_reads: contextvars.ContextVar[bool] = contextvars.ContextVar("replica_reads", default=False)
+_pinned_to_primary: contextvars.ContextVar[bool] = contextvars.ContextVar("pinned_to_primary", default=False)
+
+
+def replica_configured() -> bool:
+    return REPLICA_ALIAS in settings.DATABASES
+
+
+@contextmanager
+def read_replica() -> Iterator[None]:
+    """Allow reads issued inside the block to be served by the replica."""
+    token = _replica_reads.set(True)
+    try:
+        yield
+    finally:
+        _replica_reads.reset(token)
+
+
+@contextmanager
+def pin_primary() -> Iterator[None]:
+    """Force every read inside the block onto the primary (read-your-writes)."""
+    token = _pinned_to_primary.set(True)
+    try:
+        yield
+    finally:
+        _pinned_to_primary.reset(token)
+
+
+class ReplicaLagProbe:
+    """
+    Process-local, rate-limited replication lag check.
+
+    The measurement is cached for ``LAG_CHECK_INTERVAL`` seconds so routing a
+    query never costs more than one extra round trip every few seconds.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._checked_at = 0.0
+        self._lag: Optional[float] = None
+
+    def lag_seconds(self) -> Optional[float]:
+        """Return the last measured lag, or ``None`` if the replica is unreachable."""
+        now = time.monotonic()
+        with self._lock:
+            if now - self._checked_at < LAG_CHECK_INTERVAL:
+                return self._lag
+            self._checked_at = now
+            self._lag = self._measure()
+            return self._lag
+
+    def is_healthy(self) -> bool:
+        lag = self.lag_seconds()
+        return lag is not None and lag <= settings.DB_REPLICA_MAX_LAG_SECONDS
+
+    def reset(self) -> None:
+        with self._lock:
+            self._checked_at = 0.0
+            self._lag = None
+
+    @staticmethod
+    def _measure() -> Optional[float]:
+        replica = connections[REPLICA_ALIAS]
+        if replica.vendor != "postgresql":
+            return 0.0
+        try:
+            with replica.cursor() as cursor:
+                cursor.execute(_LAG_QUERY)
+                row = cursor.fetchone()
+            return float(row[0] or 0)
+        except Exception as exc:
+            logger.warning("Replica lag check failed; reading from primary: %s", exc)
+            return None
+
+
+replica_probe = ReplicaLagProbe()
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints) -> Optional[str]:
+        if not _replica_reads.get() or _pinned_to_primary.get() or not replica_configured():
+            return None
+        if replica_probe.is_healthy():
+            return REPLICA_ALIAS
+        return PRIMARY_ALIAS
+
+    def db_for_write(self, model, **hints) -> Optional[str]:
+        return PRIMARY_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints) -> Optional[bool]:
+        # Both aliases point at the same data set.
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints) -> Optional[bool]:
+        return db != REPLICA_ALIAS
+
+
+class ReplicaReadMixin:
+    """Serve the ORM reads of a read-only APIView from the replica when possible."""
+
+    def dispatch(self, request, *args, **kwargs):
+        with read_replica():
+            return super().dispatch(request, *args, **kwargs)
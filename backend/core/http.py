@@ -0,0 +1,300 @@
+"""
+Shared HTTP layer for third-party integrations.
+
+Every outbound call (Shopify, BigCommerce, WooCommerce, HelpScout, SendGrid,
+EasyPost, Stripe) goes through one of two pooled clients:
+
+* ``get_session()`` - a process-wide ``requests.Session`` for sync code.
+* ``get_async_client()`` - one ``httpx.AsyncClient`` per event loop for async
+  views. Under ASGI (uvicorn workers) there is a single loop per worker.
+
+Both keep per-host keep-alive pools and share the same policy: a default
+timeout, retries with full jitter for idempotent requests and transient
+failures, a per-host circuit breaker, and per-host latency counters exposed
+through ``host_metrics`` (and to Prometheus per provider). Each attempt is
+traced as an OpenTelemetry client span.
+"""
+from __future__ import annotations
+
+import asyncio
+import os
+import random
+import threading
+import time
+import weakref
+from typing import Any, Dict, Optional
+from urllib.parse import urlsplit
+
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+
+from . import tracing
+from .metrics import record_external_call
+from .timing import record_http
+
+DEFAULT_TIMEOUT_SECONDS = 10.0
+DEFAULT_TIMEOUT = httpx.Timeout(DEFAULT_TIMEOUT_SECONDS, connect=5.0)
+DEFAULT_LIMITS = httpx.Limits(max_connections=100, max_keepalive_connections=20, keepalive_expiry=30.0)
+
+# Connection pools kept per host by the sync session.
+POOL_CONNECTIONS = 20
+POOL_MAXSIZE = 20
+
+MAX_RETRIES = 2
+RETRY_BACKOFF_BASE = 0.2
+RETRY_BACKOFF_CAP = 2.0
+RETRY_STATUSES = {429, 502, 503, 504}
+IDEMPOTENT_METHODS = {"GET", "HEAD", "OPTIONS", "PUT", "DELETE"}
+
+BREAKER_FAILURE_THRESHOLD = 5
+BREAKER_RESET_SECONDS = 30.0
+
+
+class CircuitOpenError(requests.ConnectionError):
+    """Raised without touching the network while a host's breaker is open."""
+
+    def __init__(self, host: str) -> None:
+        super().__init__(f"Circuit breaker open for {host}")
+        self.host = host
+
+
+class CircuitBreaker:
+    """Consecutive-failure breaker with a single half-open probe."""
+
+    def __init__(self, failure_threshold: int = BREAKER_FAILURE_THRESHOLD, reset_seconds: float = BREAKER_RESET_SECONDS):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self._probe_in_flight = False
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._state()
+
+    def _state(self) -> str:
+        if self._opened_at is None:
+            return "closed"
+        if time.monotonic() - self._opened_at >= self.reset_seconds:
+            return "half_open"
+        return "open"
+
+    def allow_request(self) -> bool:
+        with self._lock:
+            state = self._state()
+            if state == "closed":
+                return True
+            if state == "half_open" and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._probe_in_flight = False
+
+    def release_probe(self) -> None:
+        """End a probe that neither succeeded nor failed (cancelled, invalid request)."""
+        with self._lock:
+            self._probe_in_flight = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            self._probe_in_flight = False
+            if self._opened_at is not None or self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+
+
+class HostMetrics:
+    """Per-host request counts and latency for this process."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._hosts: Dict[str, Dict[str, float]] = {}
+
+    def record(self, host: str, elapsed: float, *, failed: bool) -> None:
+        record_http(host, elapsed)
+        record_external_call(host, elapsed, failed=failed)
+        elapsed_ms = elapsed * 1000
+        with self._lock:
+            entry = self._hosts.setdefault(host, {"count": 0, "errors": 0, "total_ms": 0.0, "max_ms": 0.0})
+            entry["count"] += 1
+            entry["errors"] += int(failed)
+            entry["total_ms"] += elapsed_ms
+            entry["max_ms"] = max(entry["max_ms"], elapsed_ms)
+
+    def reset(self) -> None:
+        with self._lock:
+            self._hosts.clear()
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            hosts = {
+                host: {
+                    "count": int(entry["count"]),
+                    "errors": int(entry["errors"]),
+                    "avg_ms": round(entry["total_ms"] / entry["count"], 2),
+                    "max_ms": round(entry["max_ms"], 2),
+                    "circuit": _breaker_for(host).state,
+                }
+                for host, entry in self._hosts.items()
+            }
+        return {"pid": os.getpid(), "hosts": hosts}
+
+
+host_metrics = HostMetrics()
+_breakers: Dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+
+def _breaker_for(host: str) -> CircuitBreaker:
+    with _breakers_lock:
+        breaker = _breakers.get(host)
+        if breaker is None:
+            breaker = _breakers[host] = CircuitBreaker()
+        return breaker
+
+
+def reset_breakers() -> None:
+    with _breakers_lock:
+        _breakers.clear()
+
+
+def _host(url: Any) -> str:
+    return urlsplit(str(url)).hostname or "unknown"
+
+
+def _retry_delay(attempt: int) -> float:
+    """Full-jitter exponential backoff."""
+    return random.uniform(0, min(RETRY_BACKOFF_CAP, RETRY_BACKOFF_BASE * (2 ** attempt)))
+
+
+def _can_retry(method: str, attempt: int) -> bool:
+    return method.upper() in IDEMPOTENT_METHODS and attempt < MAX_RETRIES
+
+
+class IntegrationAdapter(HTTPAdapter):
+    """Requests adapter applying timeouts, retries, breakers and metrics."""
+
+    def __init__(self, **kwargs: Any) -> None:
+        kwargs.setdefault("pool_connections", POOL_CONNECTIONS)
+        kwargs.setdefault("pool_maxsize", POOL_MAXSIZE)
+        super().__init__(**kwargs)
+
+    def send(self, request, stream=False, timeout=None, verify=True, cert=None, proxies=None):
+        host = _host(request.url)
+        breaker = _breaker_for(host)
+        timeout = timeout if timeout is not None else DEFAULT_TIMEOUT_SECONDS
+        attempt = 0
+        while True:
+            if not breaker.allow_request():
+                raise CircuitOpenError(host)
+            started = time.perf_counter()
+            try:
+                with tracing.outbound_span(request.method, host, attempt) as span:
+                    response = super().send(
+                        request, stream=stream, timeout=timeout, verify=verify, cert=cert, proxies=proxies
+                    )
+                    tracing.set_http_status(span, response.status_code)
+            except (requests.ConnectionError, requests.Timeout):
+                host_metrics.record(host, time.perf_counter() - started, failed=True)
+                breaker.record_failure()
+                if not _can_retry(request.method, attempt):
+                    raise
+            except BaseException:
+                # Not the host's fault, but a half-open probe must not stay taken.
+                breaker.release_probe()
+                raise
+            else:
+                failed = response.status_code >= 500
+                host_metrics.record(host, time.perf_counter() - started, failed=failed)
+                if failed:
+                    breaker.record_failure()
+                else:
+                    breaker.record_success()
+                if response.status_code not in RETRY_STATUSES or not _can_retry(request.method, attempt):
+                    return response
+                response.close()
+            time.sleep(_retry_delay(attempt))
+            attempt += 1
+
+
+class IntegrationTransport(httpx.AsyncBaseTransport):
+    """httpx transport applying the same policy as ``IntegrationAdapter``."""
+
+    def __init__(self) -> None:
+        self._transport = httpx.AsyncHTTPTransport(limits=DEFAULT_LIMITS)
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        host = request.url.host or "unknown"
+        breaker = _breaker_for(host)
+        attempt = 0
+        while True:
+            if not breaker.allow_request():
+                raise httpx.ConnectError(f"Circuit breaker open for {host}", request=request)
+            started = time.perf_counter()
+            try:
+                with tracing.outbound_span(request.method, host, attempt) as span:
+                    response = await self._transport.handle_async_request(request)
+                    tracing.set_http_status(span, response.status_code)
+            except httpx.TransportError:
+                host_metrics.record(host, time.perf_counter() - started, failed=True)
+                breaker.record_failure()
+                if not _can_retry(request.method, attempt):
+                    raise
+            except BaseException:
+                # Includes CancelledError when an ASGI client disconnects.
+                breaker.release_probe()
+                raise
+            else:
+                failed = response.status_code >= 500
+                host_metrics.record(host, time.perf_counter() - started, failed=failed)
+                if failed:
+                    breaker.record_failure()
+                else:
+                    breaker.record_success()
+                if response.status_code not in RETRY_STATUSES or not _can_retry(request.method, attempt):
+                    return response
+                await response.aclose()
+            await asyncio.sleep(_retry_delay(attempt))
+            attempt += 1
+
+    async def aclose(self) -> None:
+        await self._transport.aclose()
+
+
+_session: Optional[requests.Session] = None
+_session_lock = threading.Lock()
+_async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncClient]" = (
+    weakref.WeakKeyDictionary()
+)
+
+
+def get_session() -> requests.Session:
+    """Return the process-wide pooled session for sync integration calls."""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                session = requests.Session()
+                adapter = IntegrationAdapter()
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                _session = session
+    return _session
+
+
+def get_async_client() -> httpx.AsyncClient:
+    """Return the pooled client bound to the running event loop."""
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None or client.is_closed:
+        client = httpx.AsyncClient(timeout=DEFAULT_TIMEOUT, transport=IntegrationTransport())
+        _async_clients[loop] = client
+    return client
@@ -0,0 +1,241 @@
+"""
+Prometheus metrics.
+
+Collected here and exposed on ``/metrics``:
+
+* request latency per view name (``core.middleware.MetricsMiddleware``), with
+  the number of queries and database time of each request;
+* Celery task duration, retries and failures per task, and queue lag - the
+  time between a task being published (or its ETA) and a worker starting it;
+* outbound calls and their latency per integration provider, reported by
+  ``core.http``.
+
+Gunicorn and Celery run several processes, so in production
+``PROMETHEUS_MULTIPROC_DIR`` must point at a directory shared by every
+process of one service and be set before ``prometheus_client`` is imported.
+Each process then writes its samples there and ``registry()`` aggregates
+them at scrape time. ``gunicorn.conf.py`` and the Celery ``worker_init``
+handler below wipe the directory on start and drop the files of dead
+workers; Celery workers serve their own aggregate on ``CELERY_METRICS_PORT``.
+"""
+from __future__ import annotations
+
+import os
+import shutil
+import time
+from datetime import datetime, timezone as dt_timezone
+from typing import Dict, Optional, Tuple
+
+from celery.signals import (
+    before_task_publish,
+    task_failure,
+    task_postrun,
+    task_prerun,
+    task_retry,
+    worker_init,
+    worker_process_shutdown,
+    worker_ready,
+)
+from prometheus_client import REGISTRY, CollectorRegistry, Counter, Histogram, multiprocess, start_http_server
+from prometheus_client.exposition import CONTENT_TYPE_LATEST, generate_latest
+
+# Latency buckets from 5ms to 30s; tasks get longer ones.
+REQUEST_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+QUERY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0)
+QUERY_COUNT_BUCKETS = (1, 2, 3, 5, 8, 13, 21, 34, 55, 100, 250)
+TASK_BUCKETS = (0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 15.0, 30.0, 60.0, 300.0, 900.0, 1800.0)
+LAG_BUCKETS = (0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 15.0, 60.0, 300.0, 900.0, 3600.0)
+
+PUBLISHED_AT_HEADER = "published_at"
+
+# Integration hosts by domain suffix. WooCommerce stores live on the
+# merchant's own domain, so they are reported as "other".
+PROVIDERS = {
+    "myshopify.com": "shopify",
+    "shopify.com": "shopify",
+    "bigcommerce.com": "bigcommerce",
+    "helpscout.net": "helpscout",
+    "sendgrid.com": "sendgrid",
+    "easypost.com": "easypost",
+    "stripe.com": "stripe",
+    "posthog.com": "posthog",
+}
+
+request_latency = Histogram(
+    "http_request_duration_seconds",
+    "Request latency by view.",
+    ["view", "method", "status"],
+    buckets=REQUEST_BUCKETS,
+)
+request_queries = Histogram(
+    "db_queries_per_request",
+    "Database queries run by one request.",
+    ["view"],
+    buckets=QUERY_COUNT_BUCKETS,
+)
+request_db_time = Histogram(
+    "db_time_per_request_seconds",
+    "Database time spent by one request.",
+    ["view"],
+    buckets=REQUEST_BUCKETS,
+)
+query_latency = Histogram(
+    "db_query_duration_seconds",
+    "Latency of single database queries.",
+    ["alias"],
+    buckets=QUERY_BUCKETS,
+)
+task_duration = Histogram(
+    "celery_task_duration_seconds",
+    "Celery task run time.",
+    ["task", "state"],
+    buckets=TASK_BUCKETS,
+)
+task_retries = Counter("celery_task_retries", "Celery task retries.", ["task"])
+task_failures = Counter("celery_task_failures", "Celery tasks that raised.", ["task"])
+task_queue_lag = Histogram(
+    "celery_task_queue_lag_seconds",
+    "Time from publishing (or ETA) to a worker starting the task.",
+    ["task", "queue"],
+    buckets=LAG_BUCKETS,
+)
+external_calls = Counter(
+    "external_api_calls",
+    "Outbound integration calls.",
+    ["provider", "outcome"],
+)
+external_latency = Histogram(
+    "external_api_call_duration_seconds",
+    "Outbound integration call latency.",
+    ["provider"],
+    buckets=REQUEST_BUCKETS,
+)
+
+
+def multiprocess_enabled() -> bool:
+    return bool(os.environ.get("PROMETHEUS_MULTIPROC_DIR"))
+
+
+def registry() -> CollectorRegistry:
+    """The registry to scrape: every process's samples in multiprocess mode, else this process's."""
+    if not multiprocess_enabled():
+        return REGISTRY
+    aggregate = CollectorRegistry()
+    multiprocess.MultiProcessCollector(aggregate)
+    return aggregate
+
+
+def render() -> Tuple[bytes, str]:
+    return generate_latest(registry()), CONTENT_TYPE_LATEST
+
+
+def provider_for(host: str) -> str:
+    host = host.lower()
+    for suffix, provider in PROVIDERS.items():
+        if host == suffix or host.endswith(f".{suffix}"):
+            return provider
+    return "other"
+
+
+def record_external_call(host: str, elapsed: float, *, failed: bool) -> None:
+    provider = provider_for(host)
+    external_calls.labels(provider, "error" if failed else "ok").inc()
+    external_latency.labels(provider).observe(elapsed)
+
+
+class QueryObserver:
+    """``execute_wrapper`` hook timing each query on one database alias."""
+
+    def __init__(self, alias: str) -> None:
+        self.alias = alias
+        self.queries = 0
+        self.elapsed = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - started
+            self.queries += 1
+            self.elapsed += elapsed
+            query_latency.labels(self.alias).observe(elapsed)
+
+
+# Celery. Handlers are connected on import; ``core.celery`` imports this
+# module so both publishers and workers have them.
+
+_task_started: Dict[str, float] = {}
+
+
+@before_task_publish.connect
+def _stamp_published_at(headers=None, **kwargs) -> None:
+    if headers is not None:
+        headers.setdefault(PUBLISHED_AT_HEADER, time.time())
+
+
+def _ready_at(request) -> Optional[float]:
+    published_at = getattr(request, PUBLISHED_AT_HEADER, None)
+    if published_at is None:
+        published_at = (getattr(request, "headers", None) or {}).get(PUBLISHED_AT_HEADER)
+    if published_at is None:
+        return None
+    eta = getattr(request, "eta", None)
+    if eta:
+        # Countdown and ETA tasks are not late while they wait for their time.
+        eta_at = datetime.fromisoformat(eta) if isinstance(eta, str) else eta
+        if eta_at.tzinfo is None:
+            eta_at = eta_at.replace(tzinfo=dt_timezone.utc)
+        return max(float(published_at), eta_at.timestamp())
+    return float(published_at)
+
+
+@task_prerun.connect
+def _task_prerun(task_id=None, task=None, **kwargs) -> None:
+    _task_started[task_id] = time.perf_counter()
+    request = task.request
+    if getattr(request, "is_eager", False):
+        return
+    ready_at = _ready_at(request)
+    if ready_at is not None:
+        queue = (getattr(request, "delivery_info", None) or {}).get("routing_key") or "default"
+        task_queue_lag.labels(task.name, queue).observe(max(0.0, time.time() - ready_at))
+
+
+@task_postrun.connect
+def _task_postrun(task_id=None, task=None, state=None, **kwargs) -> None:
+    started = _task_started.pop(task_id, None)
+    if started is not None:
+        task_duration.labels(task.name, state or "UNKNOWN").observe(time.perf_counter() - started)
+
+
+@task_retry.connect
+def _task_retry(sender=None, **kwargs) -> None:
+    task_retries.labels(sender.name).inc()
+
+
+@task_failure.connect
+def _task_failure(sender=None, **kwargs) -> None:
+    task_failures.labels(sender.name).inc()
+
+
+@worker_init.connect
+def _reset_multiprocess_dir(**kwargs) -> None:
+    # Runs in the worker's main process before the pool forks.
+    path = os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+    if path:
+        shutil.rmtree(path, ignore_errors=True)
+        os.makedirs(path, exist_ok=True)
+
+
+@worker_ready.connect
+def _serve_worker_metrics(**kwargs) -> None:
+    port = os.environ.get("CELERY_METRICS_PORT")
+    if port:
+        start_http_server(int(port), registry=registry())
+
+
+@worker_process_shutdown.connect
+def _mark_worker_process_dead(pid=None, **kwargs) -> None:
+    if multiprocess_enabled():
+        multiprocess.mark_process_dead(pid or os.getpid())
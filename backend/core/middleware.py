@@ -0,0 +1,357 @@
+from __future__ import annotations
+
+import logging
+import random
+import threading
+import time
+from abc import ABC, abstractmethod
+from contextlib import ExitStack
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connections
+
+from . import metrics, profiling, tracing
+from .db_routers import pin_primary, replica_configured
+from .query_budget import QueryBudgetExceeded, QueryCounter, budget_for, budget_mode
+from .timing import collect
+
+logger = logging.getLogger(__name__)
+timing_logger = logging.getLogger("core.timing")
+
+UNSAFE_METHODS = {"POST", "PUT", "PATCH", "DELETE"}
+
+
+class HybridMiddleware(ABC):
+    """
+    Base for middleware that runs natively in both WSGI and ASGI chains.
+
+    Under ASGI ``__call__`` returns ``__acall__``'s coroutine, so async views
+    are not pushed onto a thread. Sync views and ORM calls then run in the
+    request's thread-sensitive executor thread, which owns its own database
+    connections: ``execute_wrapper`` hooks must be entered and exited there
+    (``install_query_wrappers`` through ``sync_to_async``). Context variables
+    set in ``__acall__`` are copied into that thread.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        return self.handle(request)
+
+    @abstractmethod
+    def handle(self, request):
+        """Sync (WSGI) path."""
+
+    @abstractmethod
+    async def __acall__(self, request):
+        """Async (ASGI) path."""
+
+
+def install_query_wrappers(wrappers) -> ExitStack:
+    """Enter ``(alias, wrapper)`` execute wrappers on this thread's connections."""
+    stack = ExitStack()
+    for alias, wrapper in wrappers:
+        stack.enter_context(connections[alias].execute_wrapper(wrapper))
+    return stack
+
+
+async def ainstall_query_wrappers(wrappers) -> ExitStack:
+    return await sync_to_async(install_query_wrappers)(wrappers)
+
+
+async def aclose_query_wrappers(stack: ExitStack) -> None:
+    await sync_to_async(stack.close)()
+
+
+class ReplicaStickinessMiddleware(HybridMiddleware):
+    """
+    Read-your-writes for replica routing.
+
+    A successful write sets a short-lived cookie; while it is present the
+    client's reads are pinned to the primary so freshly submitted returns,
+    connections and settings are visible immediately.
+    """
+
+    COOKIE_NAME = "rs_primary_pin"
+
+    def handle(self, request):
+        if not replica_configured():
+            return self.get_response(request)
+
+        if request.COOKIES.get(self.COOKIE_NAME):
+            with pin_primary():
+                response = self.get_response(request)
+        else:
+            response = self.get_response(request)
+        return self._pin_after_write(request, response)
+
+    async def __acall__(self, request):
+        if not replica_configured():
+            return await self.get_response(request)
+
+        if request.COOKIES.get(self.COOKIE_NAME):
+            with pin_primary():
+                response = await self.get_response(request)
+        else:
+            response = await self.get_response(request)
+        return self._pin_after_write(request, response)
+
+    def _pin_after_write(self, request, response):
+        if request.method in UNSAFE_METHODS and response.status_code < 400:
+            response.set_cookie(
+                self.COOKIE_NAME,
+                "1",
+                max_age=settings.DB_REPLICA_STICKY_SECONDS,
+                httponly=True,
+                samesite="Lax",
+            )
+        return response
+
+
+class QueryBudgetMiddleware(HybridMiddleware):
+    """
+    Enforce the per-view query budgets declared in ``core.query_budget``.
+
+    Queries are counted on every database alias for the whole request, so
+    authentication and session lookups count towards the view's budget.
+    """
+
+    def handle(self, request):
+        mode = budget_mode()
+        if mode == "off":
+            return self.get_response(request)
+
+        counter = QueryCounter()
+        with install_query_wrappers((alias, counter) for alias in connections):
+            response = self.get_response(request)
+        return self._check(request, response, counter, mode)
+
+    async def __acall__(self, request):
+        mode = budget_mode()
+        if mode == "off":
+            return await self.get_response(request)
+
+        counter = QueryCounter()
+        stack = await ainstall_query_wrappers([(alias, counter) for alias in connections])
+        try:
+            response = await self.get_response(request)
+        finally:
+            await aclose_query_wrappers(stack)
+        return self._check(request, response, counter, mode)
+
+    @staticmethod
+    def _check(request, response, counter, mode):
+        match = getattr(request, "resolver_match", None)
+        view_name = match.view_name if match else None
+        budget = budget_for(view_name)
+        if budget is not None and counter.count > budget.max_queries:
+            if mode == "raise":
+                raise QueryBudgetExceeded(view_name, counter.count, budget)
+            logger.warning(
+                "Query budget exceeded for %s: %s queries (budget %s)",
+                view_name,
+                counter.count,
+                budget.max_queries,
+                extra={"view_name": view_name, "queries": counter.count, "query_budget": budget.max_queries},
+            )
+        return response
+
+
+class ServerTimingMiddleware(HybridMiddleware):
+    """
+    Break down where a sample of requests spend their time (see ``core.timing``).
+
+    ``SERVER_TIMING_SAMPLE_RATE`` of requests are instrumented and logged;
+    the ``Server-Timing`` header is only added when ``SERVER_TIMING_HEADER``
+    is on, since it exposes integration host names to clients.
+    """
+
+    @staticmethod
+    def _sampled() -> bool:
+        rate = settings.SERVER_TIMING_SAMPLE_RATE
+        return rate > 0 and (rate >= 1 or random.random() < rate)
+
+    def handle(self, request):
+        if not self._sampled():
+            return self.get_response(request)
+
+        with collect() as timings, install_query_wrappers((alias, timings) for alias in connections):
+            response = self.get_response(request)
+        return self._report(request, response, timings)
+
+    async def __acall__(self, request):
+        if not self._sampled():
+            return await self.get_response(request)
+
+        with collect() as timings:
+            stack = await ainstall_query_wrappers([(alias, timings) for alias in connections])
+            try:
+                response = await self.get_response(request)
+            finally:
+                await aclose_query_wrappers(stack)
+        return self._report(request, response, timings)
+
+    @staticmethod
+    def _report(request, response, timings):
+        if settings.SERVER_TIMING_HEADER:
+            response["Server-Timing"] = timings.header()
+        match = getattr(request, "resolver_match", None)
+        fields = {
+            "method": request.method,
+            "path": request.path,
+            "view_name": match.view_name if match else None,
+            "status_code": response.status_code,
+            **timings.log_fields(),
+        }
+        timing_logger.info(
+            "%s %s %s in %.1fms (%s queries)",
+            request.method,
+            request.path,
+            response.status_code,
+            fields["duration_ms"],
+            fields["db_queries"],
+            extra=fields,
+        )
+        return response
+
+
+class MetricsMiddleware(HybridMiddleware):
+    """
+    Prometheus request metrics (see ``core.metrics``): latency per view name,
+    plus the queries and database time of each request.
+
+    Requests that do not resolve to a view are labelled ``unresolved`` so
+    scanners probing random paths cannot blow up label cardinality.
+    """
+
+    def handle(self, request):
+        if not settings.METRICS_ENABLED:
+            return self.get_response(request)
+
+        observers = [metrics.QueryObserver(alias) for alias in connections]
+        started = time.perf_counter()
+        with install_query_wrappers((observer.alias, observer) for observer in observers):
+            response = self.get_response(request)
+        return self._observe(request, response, observers, time.perf_counter() - started)
+
+    async def __acall__(self, request):
+        if not settings.METRICS_ENABLED:
+            return await self.get_response(request)
+
+        observers = [metrics.QueryObserver(alias) for alias in connections]
+        started = time.perf_counter()
+        stack = await ainstall_query_wrappers([(observer.alias, observer) for observer in observers])
+        try:
+            response = await self.get_response(request)
+        finally:
+            await aclose_query_wrappers(stack)
+        return self._observe(request, response, observers, time.perf_counter() - started)
+
+    @staticmethod
+    def _observe(request, response, observers, elapsed):
+        match = getattr(request, "resolver_match", None)
+        view_name = (match.view_name if match else None) or "unresolved"
+        metrics.request_latency.labels(view_name, request.method, str(response.status_code)).observe(elapsed)
+        metrics.request_queries.labels(view_name).observe(sum(observer.queries for observer in observers))
+        metrics.request_db_time.labels(view_name).observe(sum(observer.elapsed for observer in observers))
+        return response
+
+
+class TracingMiddleware(HybridMiddleware):
+    """
+    OpenTelemetry server span per request with a child span per query (see
+    ``core.tracing``). The span is renamed to the view name once the URL
+    has been resolved.
+    """
+
+    @staticmethod
+    def _server_span(request):
+        return tracing.tracer.start_as_current_span(
+            request.method,
+            context=tracing.propagate.extract(request.headers),
+            kind=tracing.SpanKind.SERVER,
+            attributes={"http.request.method": request.method, "url.path": request.path},
+        )
+
+    @staticmethod
+    def _query_tracers():
+        return [(alias, tracing.QueryTracer(alias)) for alias in connections]
+
+    def handle(self, request):
+        if not tracing.enabled():
+            return self.get_response(request)
+
+        with self._server_span(request) as span:
+            with install_query_wrappers(self._query_tracers()):
+                response = self.get_response(request)
+            self._finish(span, request, response)
+        return response
+
+    async def __acall__(self, request):
+        if not tracing.enabled():
+            return await self.get_response(request)
+
+        # Query spans are started in the request's executor thread, which
+        # sees the server span through the copied context.
+        with self._server_span(request) as span:
+            stack = await ainstall_query_wrappers(self._query_tracers())
+            try:
+                response = await self.get_response(request)
+            finally:
+                await aclose_query_wrappers(stack)
+            self._finish(span, request, response)
+        return response
+
+    @staticmethod
+    def _finish(span, request, response) -> None:
+        match = getattr(request, "resolver_match", None)
+        if match and match.view_name:
+            span.update_name(f"{request.method} {match.view_name}")
+            span.set_attribute("http.route", match.view_name)
+        tracing.set_http_status(span, response.status_code)
+
+
+class ProfilingMiddleware(HybridMiddleware):
+    """
+    Requests-mode profiling sessions (see ``core.profiling``). Starts this
+    process's profiling poller; requests are only sampled while a session
+    matching their path is active.
+    """
+
+    def __init__(self, get_response):
+        super().__init__(get_response)
+        profiling.start_poller(profiling.WEB_PLAN_KEY)
+
+    def handle(self, request):
+        plan = profiling.request_plan(request.path)
+        if plan is None:
+            return self.get_response(request)
+        with profiling.profile_request(plan):
+            return self.get_response(request)
+
+    async def __acall__(self, request):
+        plan = profiling.request_plan(request.path)
+        if plan is None:
+            return await self.get_response(request)
+        # The request runs on the event loop and, for sync code, in its
+        # executor thread; sample both. Slot claims and the session write
+        # run in the executor thread, off the event loop.
+        executor_thread = await sync_to_async(threading.get_ident)()
+        sampler = await sync_to_async(profiling.start_request_sampler)(
+            plan, [threading.get_ident(), executor_thread]
+        )
+        try:
+            return await self.get_response(request)
+        finally:
+            if sampler is not None:
+                await sync_to_async(profiling.finish_request_sampler)(plan, sampler)
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.8 on 2026-10-19 16:54
+
+import django.core.validators
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProfilingSession',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('mode', models.CharField(choices=[('duration', 'Every process of the target for N seconds'), ('requests', 'Next K web requests matching a path')], default='duration', max_length=16)),
+                ('target', models.CharField(choices=[('web', 'Web (gunicorn) workers'), ('worker', 'Celery workers')], default='web', max_length=16)),
+                ('worker_hostname', models.CharField(blank=True, help_text='Celery node name, e.g. celery@host. Empty profiles every worker.', max_length=255)),
+                ('seconds', models.PositiveIntegerField(default=30, validators=[django.core.validators.MinValueValidator(1), django.core.validators.MaxValueValidator(300)])),
+                ('path_prefix', models.CharField(blank=True, help_text='Requests mode: URL path prefix to profile.', max_length=255)),
+                ('request_count', models.PositiveIntegerField(default=10, validators=[django.core.validators.MinValueValidator(1), django.core.validators.MaxValueValidator(100)])),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('running', 'Running'), ('complete', 'Complete')], default='pending', max_length=16)),
+                ('requests_profiled', models.PositiveIntegerField(default=0)),
+                ('samples', models.PositiveIntegerField(default=0)),
+                ('hosts', models.JSONField(blank=True, default=list, help_text='Processes that contributed samples.')),
+                ('collapsed_stacks', models.TextField(blank=True, help_text='Flamegraph-compatible collapsed stacks.')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('completed_at', models.DateTimeField(blank=True, null=True)),
+                ('created_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
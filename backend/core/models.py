@@ -0,0 +1,62 @@
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.validators import MaxValueValidator, MinValueValidator
+from django.db import models
+
+
+class ProfilingSession(models.Model):
+    """A staff-requested sampling profile of web or worker processes (see ``core.profiling``)."""
+
+    MODE_DURATION = "duration"
+    MODE_REQUESTS = "requests"
+    MODE_CHOICES = [
+        (MODE_DURATION, "Every process of the target for N seconds"),
+        (MODE_REQUESTS, "Next K web requests matching a path"),
+    ]
+
+    TARGET_WEB = "web"
+    TARGET_WORKER = "worker"
+    TARGET_CHOICES = [
+        (TARGET_WEB, "Web (gunicorn) workers"),
+        (TARGET_WORKER, "Celery workers"),
+    ]
+
+    STATUS_CHOICES = [
+        ("pending", "Pending"),
+        ("running", "Running"),
+        ("complete", "Complete"),
+    ]
+
+    mode = models.CharField(max_length=16, choices=MODE_CHOICES, default=MODE_DURATION)
+    target = models.CharField(max_length=16, choices=TARGET_CHOICES, default=TARGET_WEB)
+    worker_hostname = models.CharField(
+        max_length=255, blank=True, help_text="Celery node name, e.g. celery@host. Empty profiles every worker."
+    )
+    seconds = models.PositiveIntegerField(default=30, validators=[MinValueValidator(1), MaxValueValidator(300)])
+    path_prefix = models.CharField(max_length=255, blank=True, help_text="Requests mode: URL path prefix to profile.")
+    request_count = models.PositiveIntegerField(
+        default=10, validators=[MinValueValidator(1), MaxValueValidator(100)]
+    )
+    status = models.CharField(max_length=16, choices=STATUS_CHOICES, default="pending")
+    requests_profiled = models.PositiveIntegerField(default=0)
+    samples = models.PositiveIntegerField(default=0)
+    hosts = models.JSONField(default=list, blank=True, help_text="Processes that contributed samples.")
+    collapsed_stacks = models.TextField(blank=True, help_text="Flamegraph-compatible collapsed stacks.")
+    created_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True, related_name="+"
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    completed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ["-created_at"]
+
+    def clean(self):
+        if self.mode == self.MODE_REQUESTS:
+            if self.target != self.TARGET_WEB:
+                raise ValidationError({"target": "Requests mode only profiles web requests."})
+            if not self.path_prefix.startswith("/"):
+                raise ValidationError({"path_prefix": "Enter a URL path prefix starting with /."})
+
+    def __str__(self):
+        return f"Profile {self.pk} ({self.mode}, {self.target})"
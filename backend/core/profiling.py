@@ -0,0 +1,289 @@
+"""
+On-demand sampling profiler for live web and Celery workers.
+
+Staff start a ``ProfilingSession`` from the Django admin (Celery sessions
+are delivered through the ``start_profiler`` remote control command, which
+can also be sent by hand with ``celery -A core control``). The session's
+plan is published in the cache and every process of the target picks it up
+through a poller thread that wakes every ``PROFILING_POLL_SECONDS``:
+
+* duration mode - the process samples the stacks of all its threads until
+  the session's time is up;
+* requests mode (web only) - ``core.middleware.ProfilingMiddleware``
+  samples the thread serving each of the next K requests whose path matches.
+
+Samples from every process are merged into the session as collapsed stacks
+(``frame;frame;frame count``), the input format of ``flamegraph.pl`` and
+speedscope. Nothing starts unless ``PROFILING_ENABLED`` is on; while no
+session is active the cost is one cache read per poll and a process-local
+check per request.
+"""
+from __future__ import annotations
+
+import logging
+import os
+import socket
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, Iterator, Optional, Set
+
+from celery.signals import celeryd_init, worker_process_init, worker_ready
+from celery.worker.control import control_command
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+WEB_PLAN_KEY = "core:profiling:web"
+WORKER_PLAN_KEY = "core:profiling:worker:{hostname}"
+SLOTS_KEY = "core:profiling:{session_id}:slots"
+# Requests-mode sessions stop waiting for matching requests after an hour.
+REQUESTS_PLAN_TIMEOUT = 60 * 60
+MAX_STACK_DEPTH = 128
+
+POLLER_THREAD = "profiling-poller"
+SAMPLER_THREAD = "profiling-sampler"
+SESSION_THREAD = "profiling-session"
+PROFILER_THREADS = {POLLER_THREAD, SAMPLER_THREAD, SESSION_THREAD}
+
+# Process-local state. Forked workers reset it through the pid checks.
+_plan: Optional[Dict[str, Any]] = None
+_poller_pid: Optional[int] = None
+_sampled_sessions: Set[int] = set()
+_worker_hostname = ""
+
+
+def _frame_name(frame) -> str:
+    code = frame.f_code
+    return f"{frame.f_globals.get('__name__', '?')}.{getattr(code, 'co_qualname', code.co_name)}"
+
+
+def collapse(frame) -> str:
+    """Root-first, ``;``-joined frame names of one stack."""
+    names = []
+    while frame is not None and len(names) < MAX_STACK_DEPTH:
+        names.append(_frame_name(frame))
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+def parse_collapsed(text: str) -> Counter:
+    counts: Counter = Counter()
+    for line in text.splitlines():
+        stack, _, count = line.rpartition(" ")
+        if stack and count.isdigit():
+            counts[stack] += int(count)
+    return counts
+
+
+def render_collapsed(counts: Counter) -> str:
+    return "\n".join(f"{stack} {count}" for stack, count in counts.most_common())
+
+
+class StackSampler:
+    """Sample the stacks of some (or all) threads of this process from a daemon thread."""
+
+    def __init__(self, interval: float, thread_ids: Optional[Iterable[int]] = None) -> None:
+        self.interval = interval
+        self.thread_ids = set(thread_ids) if thread_ids is not None else None
+        self.counts: Counter = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=SAMPLER_THREAD, daemon=True)
+
+    def start(self) -> "StackSampler":
+        self._thread.start()
+        return self
+
+    def stop(self) -> Counter:
+        self._stop.set()
+        self._thread.join()
+        return self.counts
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            ignored = {thread.ident for thread in threading.enumerate() if thread.name in PROFILER_THREADS}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id in ignored or (self.thread_ids is not None and thread_id not in self.thread_ids):
+                    continue
+                self.counts[collapse(frame)] += 1
+
+
+def _interval() -> float:
+    return settings.PROFILING_INTERVAL_MS / 1000
+
+
+def worker_plan_key(hostname: str) -> str:
+    return WORKER_PLAN_KEY.format(hostname=hostname)
+
+
+def _plan_for(session, seconds: Optional[int] = None) -> Dict[str, Any]:
+    seconds = seconds or session.seconds
+    return {
+        "session_id": session.pk,
+        "mode": session.mode,
+        "until": time.time() + seconds,
+        "path_prefix": session.path_prefix,
+        "request_count": session.request_count,
+    }
+
+
+def activate(session) -> None:
+    """Publish a new session's plan to the processes it targets."""
+    if session.mode == session.MODE_REQUESTS:
+        cache.set(SLOTS_KEY.format(session_id=session.pk), 0, REQUESTS_PLAN_TIMEOUT)
+        cache.set(WEB_PLAN_KEY, _plan_for(session, REQUESTS_PLAN_TIMEOUT), REQUESTS_PLAN_TIMEOUT)
+    elif session.target == session.TARGET_WEB:
+        cache.set(WEB_PLAN_KEY, _plan_for(session), session.seconds)
+    else:
+        from core.celery import app
+
+        app.control.broadcast(
+            "start_profiler",
+            arguments={"session_id": session.pk, "seconds": session.seconds},
+            destination=[session.worker_hostname] if session.worker_hostname else None,
+        )
+
+
+def record(session_id: int, counts: Counter, requests: int = 0) -> None:
+    """Merge this process's samples into the session."""
+    from .models import ProfilingSession
+
+    with transaction.atomic():
+        session = ProfilingSession.objects.select_for_update().filter(pk=session_id).first()
+        if session is None:
+            return
+        merged = parse_collapsed(session.collapsed_stacks)
+        merged.update(counts)
+        session.collapsed_stacks = render_collapsed(merged)
+        session.samples += sum(counts.values())
+        session.requests_profiled += requests
+        host = f"{socket.gethostname()}:{os.getpid()}"
+        if host not in session.hosts:
+            session.hosts.append(host)
+        done = session.mode == session.MODE_DURATION or session.requests_profiled >= session.request_count
+        session.status = "complete" if done else "running"
+        if done and session.completed_at is None:
+            session.completed_at = timezone.now()
+        session.save()
+    if done and session.mode == session.MODE_REQUESTS:
+        cache.delete(WEB_PLAN_KEY)
+
+
+def _profile_process(session_id: int, seconds: float) -> None:
+    sampler = StackSampler(_interval()).start()
+    time.sleep(seconds)
+    try:
+        record(session_id, sampler.stop())
+    except Exception:
+        logger.exception("Could not save profiling session %s", session_id)
+    finally:
+        # This thread opened its own database connection.
+        connection.close()
+
+
+def poll_once(key: str) -> Optional[Dict[str, Any]]:
+    """Refresh this process's plan and start a duration profile it has not run yet."""
+    global _plan
+    plan = _plan = cache.get(key)
+    if plan and plan["mode"] == "duration" and plan["session_id"] not in _sampled_sessions:
+        _sampled_sessions.add(plan["session_id"])
+        remaining = plan["until"] - time.time()
+        if remaining > 0:
+            threading.Thread(
+                target=_profile_process, args=(plan["session_id"], remaining), name=SESSION_THREAD, daemon=True
+            ).start()
+    return plan
+
+
+def _poll_forever(key: str) -> None:
+    while True:
+        try:
+            poll_once(key)
+        except Exception:
+            logger.exception("Profiling poll failed")
+        time.sleep(settings.PROFILING_POLL_SECONDS)
+
+
+def start_poller(key: str) -> None:
+    """Start this process's poller thread once, if profiling is enabled."""
+    global _poller_pid, _plan
+    if not settings.PROFILING_ENABLED or _poller_pid == os.getpid():
+        return
+    _poller_pid = os.getpid()
+    _plan = None
+    _sampled_sessions.clear()
+    threading.Thread(target=_poll_forever, args=(key,), name=POLLER_THREAD, daemon=True).start()
+
+
+def request_plan(path: str) -> Optional[Dict[str, Any]]:
+    plan = _plan
+    if plan is None or plan["mode"] != "requests" or not path.startswith(plan["path_prefix"]):
+        return None
+    return plan
+
+
+def start_request_sampler(plan: Dict[str, Any], thread_ids: Iterable[int]) -> Optional[StackSampler]:
+    """Start sampling ``thread_ids`` if the session still has a request slot left."""
+    try:
+        slot = cache.incr(SLOTS_KEY.format(session_id=plan["session_id"]))
+    except ValueError:
+        # The session expired or finished since the last poll.
+        slot = None
+    if slot is None or slot > plan["request_count"]:
+        return None
+    return StackSampler(_interval(), thread_ids=thread_ids).start()
+
+
+def finish_request_sampler(plan: Dict[str, Any], sampler: StackSampler) -> None:
+    record(plan["session_id"], sampler.stop(), requests=1)
+
+
+@contextmanager
+def profile_request(plan: Dict[str, Any]) -> Iterator[None]:
+    """Sample the current thread for the block if the session still has a request slot left."""
+    sampler = start_request_sampler(plan, [threading.get_ident()])
+    try:
+        yield
+    finally:
+        if sampler is not None:
+            finish_request_sampler(plan, sampler)
+
+
+# Celery workers. ``core.celery`` imports this module so the handlers and
+# the control command are registered in every worker.
+
+
+@celeryd_init.connect
+def _remember_worker_hostname(sender=None, **kwargs) -> None:
+    # Runs in the main process before the pool forks, so children inherit it.
+    global _worker_hostname
+    _worker_hostname = sender or ""
+
+
+@worker_process_init.connect
+@worker_ready.connect
+def _start_worker_poller(**kwargs) -> None:
+    if _worker_hostname:
+        start_poller(worker_plan_key(_worker_hostname))
+
+
+@control_command(args=[("session_id", int), ("seconds", int)], signature="<session_id> <seconds>")
+def start_profiler(state, session_id, seconds):
+    """Profile this worker's processes for ``seconds`` into profiling session ``session_id``."""
+    if not settings.PROFILING_ENABLED:
+        return {"error": "profiling is disabled (PROFILING_ENABLED)"}
+    hostname = state.consumer.hostname
+    plan = {
+        "session_id": session_id,
+        "mode": "duration",
+        "until": time.time() + seconds,
+        "path_prefix": "",
+        "request_count": 0,
+    }
+    cache.set(worker_plan_key(hostname), plan, seconds)
+    return {"ok": f"profiling {hostname} for {seconds}s"}
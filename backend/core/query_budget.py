@@ -0,0 +1,74 @@
+"""
+Per-view query budgets.
+
+``QUERY_BUDGETS`` declares the most queries a view may run per request,
+keyed by URL name. ``core.middleware.QueryBudgetMiddleware`` counts the
+queries of every request to a budgeted view and, depending on
+``settings.QUERY_BUDGET_MODE``:
+
+* ``"raise"`` - raise ``QueryBudgetExceeded`` (the default under
+  ``manage.py test``, so an N+1 fails the test that exercises the view);
+* ``"warn"`` - log a warning and keep serving;
+* ``"off"`` - do nothing.
+
+Budgets are constants on purpose: a view whose query count grows with the
+number of rows it reads will exceed any fixed budget once the dataset is big
+enough.
+"""
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+from django.conf import settings
+
+
+@dataclass(frozen=True)
+class QueryBudget:
+    max_queries: int
+    reason: str = ""
+
+
+class QueryBudgetExceeded(AssertionError):
+    def __init__(self, view_name: str, queries: int, budget: QueryBudget) -> None:
+        super().__init__(f"{view_name} ran {queries} queries; its budget is {budget.max_queries}")
+        self.view_name = view_name
+        self.queries = queries
+        self.budget = budget
+
+
+# Budgets for authenticated views include one query for token authentication,
+# and views reading from the replica one for the periodic lag probe.
+QUERY_BUDGETS: Dict[str, QueryBudget] = {
+    "returns:return-submit": QueryBudget(7, "order, insert, label, fraud settings, velocity, rules, status"),
+    "returns:order-lookup": QueryBudget(2, "order lookup"),
+    "returns:returnless-insights": QueryBudget(2, "one scan of completed returns"),
+    "returns:exchange-coach": QueryBudget(2, "one scan of completed returns"),
+    "returns:vip-resolution": QueryBudget(2, "latest completed returns with their orders"),
+    "returns:label-batch": QueryBudget(3, "batch and its items"),
+    "returns:analytics-reasons": QueryBudget(3, "one scan of returns"),
+    "returns:analytics-cohorts": QueryBudget(7, "orders scan and two counts per cohort"),
+    "returns:analytics-profitability": QueryBudget(6, "two sums and two counts"),
+    "feature-flags": QueryBudget(3, "entitlement snapshot rebuild on a cache miss"),
+}
+
+
+def budget_for(view_name: Optional[str]) -> Optional[QueryBudget]:
+    if not view_name:
+        return None
+    return QUERY_BUDGETS.get(view_name)
+
+
+def budget_mode() -> str:
+    return getattr(settings, "QUERY_BUDGET_MODE", "off")
+
+
+class QueryCounter:
+    """``execute_wrapper`` hook counting queries on one connection."""
+
+    def __init__(self) -> None:
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
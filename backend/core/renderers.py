@@ -0,0 +1,11 @@
+from rest_framework.renderers import JSONRenderer
+
+from .timing import timed
+
+
+class TimedJSONRenderer(JSONRenderer):
+    """JSON renderer reporting response serialization time as the ``serialize`` span."""
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        with timed("serialize"):
+            return super().render(data, accepted_media_type, renderer_context)
@@ -32,6 +32,19 @@ if os.getenv("SENTRY_DSN"):
         send_default_pii=True
     )
 
+# OpenTelemetry (core.tracing): spans go over OTLP/HTTP to this collector,
+# e.g. http://localhost:4318. Web and worker containers set their own
+# OTEL_SERVICE_NAME.
+OTEL_EXPORTER_OTLP_ENDPOINT = os.getenv("OTEL_EXPORTER_OTLP_ENDPOINT", "")
+if OTEL_EXPORTER_OTLP_ENDPOINT:
+    from core.tracing import configure as configure_tracing
+
+    configure_tracing(
+        service_name=os.getenv("OTEL_SERVICE_NAME", "returnshield"),
+        endpoint=OTEL_EXPORTER_OTLP_ENDPOINT,
+        sample_rate=float(os.getenv("OTEL_TRACES_SAMPLE_RATE", "1.0")),
+    )
+
 
 # Quick-start development settings - unsuitable for production
 # See https://docs.djangoproject.com/en/5.2/howto/deployment/checklist/
@@ -74,6 +87,13 @@ SHOPIFY_SCOPES = ["read_orders", "write_orders", "read_returns"]
 SENDGRID_API_KEY = os.getenv("SENDGRID_API_KEY", "")
 SENDGRID_FROM_EMAIL = os.getenv("SENDGRID_FROM_EMAIL", "noreply@returnshield.app")
 SENDGRID_FROM_NAME = os.getenv("SENDGRID_FROM_NAME", "ReturnShield")
+# Optional SendGrid dynamic template IDs; templates without one are rendered locally.
+SENDGRID_TEMPLATE_IDS = {
+    "onboarding": os.getenv("SENDGRID_TEMPLATE_ONBOARDING", ""),
+    "return_confirmation": os.getenv("SENDGRID_TEMPLATE_RETURN_CONFIRMATION", ""),
+}
+# Queued emails are coalesced for this many seconds before a batch is sent.
+EMAIL_BATCH_WINDOW_SECONDS = int(os.getenv("EMAIL_BATCH_WINDOW_SECONDS", "5"))
 
 if not DEBUG:
     if not STRIPE_SECRET_KEY:
@@ -84,6 +104,10 @@ if not DEBUG:
 # EasyPost Configuration
 EASYPOST_API_KEY = os.getenv("EASYPOST_API_KEY", "")
 EASYPOST_TEST_MODE = os.getenv("EASYPOST_TEST_MODE", "True") == "True"
+# Point at a local stub (see returns.testing.EasyPostStub) in development.
+EASYPOST_API_BASE = os.getenv("EASYPOST_API_BASE", "https://api.easypost.com/v2")
+# Concurrent label purchases per batch job.
+EASYPOST_BATCH_CONCURRENCY = int(os.getenv("EASYPOST_BATCH_CONCURRENCY", "8"))
 EASYPOST_FROM_ADDRESS = {
     "name": "ReturnShield Returns",
     "street1": "123 Return Way",
@@ -92,6 +116,22 @@ EASYPOST_FROM_ADDRESS = {
     "zip": "90210",
     "phone": "555-555-5555",
 }
+# Predefined return parcels; EasyPost parcel IDs for these are cached.
+EASYPOST_PARCEL_PRESETS = {
+    "default": {"length": 10, "width": 8, "height": 4, "weight": 16},  # oz
+}
+EASYPOST_DEFAULT_PARCEL = os.getenv("EASYPOST_DEFAULT_PARCEL", "default")
+# Carriers in order of preference, e.g. "USPS,UPS". Empty means any carrier.
+EASYPOST_CARRIER_PREFERENCES = [
+    carrier.strip() for carrier in os.getenv("EASYPOST_CARRIER_PREFERENCES", "").split(",") if carrier.strip()
+]
+# A preferred carrier wins over a cheaper one if it costs at most this
+# fraction more than the cheapest rate (0.1 = 10%).
+EASYPOST_RATE_TOLERANCE = float(os.getenv("EASYPOST_RATE_TOLERANCE", "0"))
+# Shared secret configured on the EasyPost tracker webhook.
+EASYPOST_WEBHOOK_SECRET = os.getenv("EASYPOST_WEBHOOK_SECRET", "")
+# Tracking events received within this many seconds are applied together.
+TRACKING_BATCH_WINDOW_SECONDS = int(os.getenv("TRACKING_BATCH_WINDOW_SECONDS", "10"))
 
 # Celery Configuration
 CELERY_BROKER_URL = os.getenv('CELERY_BROKER_URL', 'redis://localhost:6379/0')
@@ -102,10 +142,51 @@ CELERY_RESULT_SERIALIZER = 'json'
 CELERY_TIMEZONE = 'UTC'
 CELERY_TASK_TRACK_STARTED = True
 CELERY_TASK_TIME_LIMIT = 30 * 60  # 30 minutes
+# Fire-and-forget tasks set ignore_result; the results that are stored (the
+# Shopify backfill chord's shards) are only needed until the chord callback
+# runs. The Redis result backend expires the chord's completion counter with
+# the same setting, and a counter that expires while shards are still running
+# means the callback never fires. Keep this well above the longest initial
+# backfill. Even then, a backfill whose callback is lost still finishes: the
+# next sync after its lock lapses finds every window stored and runs the
+# callback.
+CELERY_RESULT_EXPIRES = int(os.getenv("CELERY_RESULT_EXPIRES", str(7 * 24 * 60 * 60)))
+# A Shopify sync run checkpoints and hands over to a new run after this long.
+SHOPIFY_SYNC_RUN_SECONDS = int(os.getenv("SHOPIFY_SYNC_RUN_SECONDS", str(20 * 60)))
+# Parallel lanes of an initial Shopify backfill; each lane is one API client,
+# so keep this within the store's REST rate limit.
+SHOPIFY_BACKFILL_CONCURRENCY = int(os.getenv("SHOPIFY_BACKFILL_CONCURRENCY", "4"))
+
+# Shared cache: reuses the Celery Redis instance unless CACHE_REDIS_URL is set.
+# Keys are prefixed per environment so staging and production can share Redis.
+DJANGO_ENV = os.getenv("DJANGO_ENV", "development" if DEBUG else "production")
+CACHE_REDIS_URL = os.getenv("CACHE_REDIS_URL", CELERY_BROKER_URL)
+if "test" in sys.argv or os.getenv("CACHE_BACKEND", "redis") == "locmem":
+    CACHES = {
+        'default': {
+            'BACKEND': 'core.cache.InstrumentedLocMemCache',
+            'LOCATION': 'returnshield',
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'core.cache.InstrumentedRedisCache',
+            'LOCATION': CACHE_REDIS_URL,
+            'KEY_PREFIX': f"returnshield:{DJANGO_ENV}",
+            'TIMEOUT': 300,
+            'OPTIONS': {
+                'socket_connect_timeout': 2,
+                'socket_timeout': 2,
+            },
+        }
+    }
 
 HELPSCOUT_APP_ID = os.getenv("HELPSCOUT_APP_ID", "")
 HELPSCOUT_APP_SECRET = os.getenv("HELPSCOUT_APP_SECRET", "")
 HELPSCOUT_MAILBOX_ID = os.getenv("HELPSCOUT_MAILBOX_ID", "")
+# Point at a local stub (see support.testing.HelpScoutStub) in development.
+HELPSCOUT_API_BASE_URL = os.getenv("HELPSCOUT_API_BASE_URL", "https://api.helpscout.net/v2")
 
 POSTHOG_API_KEY = os.getenv("POSTHOG_API_KEY", "")
 POSTHOG_HOST = os.getenv("POSTHOG_HOST", "https://analytics.returnshield.app")
@@ -132,19 +213,49 @@ INSTALLED_APPS = [
     'woocommerce_integration',
     'returns',
     'automation',
+    'core',
 ]
 
 MIDDLEWARE = [
+    'core.middleware.MetricsMiddleware',
+    'core.middleware.TracingMiddleware',
+    'core.middleware.ProfilingMiddleware',
+    'core.middleware.ServerTimingMiddleware',
+    'core.middleware.QueryBudgetMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
+    'core.middleware.ReplicaStickinessMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+# Per-view query budgets (core.query_budget): "raise", "warn" or "off".
+# Tests always raise so N+1 regressions fail the suite.
+QUERY_BUDGET_MODE = "raise" if "test" in sys.argv else os.getenv("QUERY_BUDGET_MODE", "off")
+
+# Share of requests broken down by core.middleware.ServerTimingMiddleware
+# (logged on "core.timing"); the Server-Timing header is opt-in because it
+# names integration hosts.
+SERVER_TIMING_SAMPLE_RATE = float(os.getenv("SERVER_TIMING_SAMPLE_RATE", "1" if DEBUG else "0.01"))
+SERVER_TIMING_HEADER = os.getenv("SERVER_TIMING_HEADER", "True" if DEBUG else "False") == "True"
+
+# Prometheus metrics (core.metrics). /metrics/ requires
+# "Authorization: Bearer <METRICS_TOKEN>"; without a token it is only
+# served in DEBUG. Multiprocess servers also need PROMETHEUS_MULTIPROC_DIR
+# in the environment.
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "True") == "True"
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
+
+# On-demand sampling profiler (core.profiling), started from the admin.
+# Off unless opted in; processes check for sessions every poll interval.
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "False") == "True"
+PROFILING_POLL_SECONDS = float(os.getenv("PROFILING_POLL_SECONDS", "5"))
+PROFILING_INTERVAL_MS = float(os.getenv("PROFILING_INTERVAL_MS", "10"))
+
 ROOT_URLCONF = 'core.urls'
 
 TEMPLATES = [
@@ -168,6 +279,31 @@ WSGI_APPLICATION = 'core.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
+# Gunicorn and Celery processes size their connection pools independently.
+PROCESS_ROLE = os.getenv("PROCESS_ROLE") or ("worker" if "celery" in Path(sys.argv[0]).name else "web")
+
+# Connection reuse strategy:
+#   psycopg    - Django's native psycopg 3 connection pool, sized per PROCESS_ROLE
+#   persistent - one health-checked connection per thread, kept for DB_CONN_MAX_AGE seconds
+#   pgbouncer  - connections to a transaction-pooling pgbouncer
+# The web tier runs under ASGI, where every request runs in a new thread and
+# per-thread persistent connections pile up, so DB_CONN_MAX_AGE defaults to 0
+# (close after each request). Raise it only for WSGI or worker processes.
+DB_POOL_MODE = os.getenv("DB_POOL_MODE", "psycopg").lower()
+DB_CONN_MAX_AGE = int(os.getenv("DB_CONN_MAX_AGE", "0"))
+DB_POOL_SIZES = {
+    "web": {
+        "min_size": int(os.getenv("DB_POOL_MIN_SIZE_WEB", "2")),
+        "max_size": int(os.getenv("DB_POOL_MAX_SIZE_WEB", "10")),
+    },
+    # Each prefork child owns a pool, so keep worker pools small.
+    "worker": {
+        "min_size": int(os.getenv("DB_POOL_MIN_SIZE_WORKER", "1")),
+        "max_size": int(os.getenv("DB_POOL_MAX_SIZE_WORKER", "2")),
+    },
+}
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "10"))
+
 if "test" in sys.argv and os.getenv("USE_SQLITE_FOR_TESTS", "1") == "1":
     DATABASES = {
         'default': {
@@ -187,8 +323,33 @@ elif os.getenv("DB_ENGINE"):
             'OPTIONS': {
                 'connect_timeout': 10,
             },
+            'CONN_MAX_AGE': DB_CONN_MAX_AGE,
+            'CONN_HEALTH_CHECKS': True,
         }
     }
+    if DB_POOL_MODE == "psycopg":
+        # Pooled connections are returned to the pool on close, so Django must
+        # not hold them persistently as well.
+        DATABASES['default']['CONN_MAX_AGE'] = 0
+        DATABASES['default']['OPTIONS']['pool'] = {
+            **DB_POOL_SIZES.get(PROCESS_ROLE, DB_POOL_SIZES["web"]),
+            'timeout': DB_POOL_TIMEOUT,
+        }
+    elif DB_POOL_MODE == "pgbouncer":
+        # Named server-side cursors do not survive transaction pooling.
+        DATABASES['default']['DISABLE_SERVER_SIDE_CURSORS'] = True
+    # Optional streaming replica used for read-only analytics, insights,
+    # health and lookup traffic (see core.db_routers.ReplicaRouter).
+    if os.getenv("DB_REPLICA_HOST"):
+        DATABASES['replica'] = {
+            **DATABASES['default'],
+            'HOST': os.getenv("DB_REPLICA_HOST"),
+            'PORT': os.getenv("DB_REPLICA_PORT", DATABASES['default']['PORT']),
+            'USER': os.getenv("DB_REPLICA_USER", DATABASES['default']['USER']),
+            'PASSWORD': os.getenv("DB_REPLICA_PASSWORD", DATABASES['default']['PASSWORD']),
+            'OPTIONS': {**DATABASES['default']['OPTIONS']},
+            'TEST': {'MIRROR': 'default'},
+        }
 else:
     DATABASES = {
         'default': {
@@ -197,6 +358,12 @@ else:
         }
     }
 
+DATABASE_ROUTERS = ['core.db_routers.ReplicaRouter']
+# Reads fall back to the primary while the replica lags further behind than this.
+DB_REPLICA_MAX_LAG_SECONDS = float(os.getenv("DB_REPLICA_MAX_LAG_SECONDS", "5"))
+# How long a client keeps reading from the primary after submitting a write.
+DB_REPLICA_STICKY_SECONDS = int(os.getenv("DB_REPLICA_STICKY_SECONDS", "15"))
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -249,6 +416,10 @@ REST_FRAMEWORK = {
     "DEFAULT_PERMISSION_CLASSES": [
         "rest_framework.permissions.IsAuthenticated",
     ],
+    "DEFAULT_RENDERER_CLASSES": [
+        "core.renderers.TimedJSONRenderer",
+        "rest_framework.renderers.BrowsableAPIRenderer",
+    ],
     "DEFAULT_PAGINATION_CLASS": "rest_framework.pagination.PageNumberPagination",
     "PAGE_SIZE": 25,
     "DEFAULT_THROTTLE_CLASSES": [
@@ -288,5 +459,21 @@ STATICFILES_DIRS = [
 MEDIA_URL = "media/"
 MEDIA_ROOT = BASE_DIR / "media"
 
+# Return labels are downloaded once and re-hosted from the "labels" storage.
+# Set LABEL_STORAGE_BACKEND to an object storage backend in production.
+LABEL_STORAGE_BACKEND = os.getenv("LABEL_STORAGE_BACKEND", "django.core.files.storage.FileSystemStorage")
+STORAGES = {
+    "default": {"BACKEND": "django.core.files.storage.FileSystemStorage"},
+    "staticfiles": {"BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage"},
+    "labels": {
+        "BACKEND": LABEL_STORAGE_BACKEND,
+        "OPTIONS": (
+            {"location": MEDIA_ROOT / "labels"}
+            if LABEL_STORAGE_BACKEND == "django.core.files.storage.FileSystemStorage"
+            else {}
+        ),
+    },
+}
+
 LOGIN_REDIRECT_URL = "/dashboard/"
 LOGOUT_REDIRECT_URL = "/"
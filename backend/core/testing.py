@@ -0,0 +1,93 @@
+"""
+Loopback HTTP servers for exercising integration clients without network access.
+
+``LoopbackStub`` owns the server, its thread and the JSON framing; a
+provider stub only implements ``handle`` to route its endpoints::
+
+    class ExampleStub(LoopbackStub):
+        def handle(self, path, headers, body):
+            if path == "/v2/ping":
+                return 200, {"pong": True}
+            return 404, {"message": "Not found"}
+
+    with ExampleStub() as stub, override_settings(EXAMPLE_API_BASE=stub.base_url):
+        ...
+
+See ``returns.testing.EasyPostStub`` and ``support.testing.HelpScoutStub``.
+"""
+from __future__ import annotations
+
+import json
+import threading
+from abc import ABC, abstractmethod
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Mapping, NamedTuple, Optional, Tuple, Union
+from urllib.parse import parse_qsl
+
+
+class StubResponse(NamedTuple):
+    status: int
+    body: Optional[Dict[str, Any]] = None
+    headers: Optional[Dict[str, str]] = None
+
+
+class LoopbackStub(ABC):
+    """Serve ``handle`` on a free loopback port for the duration of a ``with`` block."""
+
+    # Path prefix of the provider API, appended to ``base_url``.
+    api_prefix = "/v2"
+
+    def __init__(self) -> None:
+        # Guards the recorded state subclasses keep; requests arrive on server threads.
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}{self.api_prefix}"
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+        self._thread.join()
+
+    @abstractmethod
+    def handle(
+        self, path: str, headers: Mapping[str, str], body: Dict[str, Any]
+    ) -> Union[StubResponse, Tuple[Any, ...]]:
+        """
+        Answer a POST to ``path`` with ``(status, body[, headers])``; the reply ``body`` may be ``None``.
+
+        The request ``body`` is decoded from JSON, or from a form for OAuth-style token requests.
+        """
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args) -> None:  # keep test output quiet
+                pass
+
+            def do_POST(self) -> None:
+                raw = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+                if self.headers.get_content_type() == "application/x-www-form-urlencoded":
+                    body = dict(parse_qsl(raw.decode()))
+                else:
+                    body = json.loads(raw or b"{}")
+                response = StubResponse(*stub.handle(self.path, self.headers, body))
+                payload = json.dumps(response.body).encode() if response.body is not None else b""
+                self.send_response(response.status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                for name, value in (response.headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(payload)
+
+        return Handler
@@ -1,9 +1,50 @@
 from __future__ import annotations
 
+import asyncio
+import io
+import threading
+import time
+from types import SimpleNamespace
+from unittest import mock
+
+import httpx
+import requests
+from asgiref.sync import async_to_sync, iscoroutinefunction, sync_to_async
+from celery import shared_task
+from celery.signals import after_task_publish, before_task_publish
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, override_settings
 from django.urls import reverse
+from requests.adapters import HTTPAdapter
 from rest_framework import status
+from opentelemetry import trace
+from opentelemetry.sdk.trace import TracerProvider
+from opentelemetry.sdk.trace.export.in_memory_span_exporter import InMemorySpanExporter
+from opentelemetry.trace import SpanKind
 from rest_framework.test import APITestCase
 
+from accounts.models import User
+from core.cache import cache_stats
+from core.db_routers import ReplicaLagProbe, ReplicaRouter, pin_primary, read_replica, replica_probe
+from core.http import (
+    BREAKER_FAILURE_THRESHOLD,
+    CircuitOpenError,
+    IntegrationTransport,
+    _breaker_for,
+    get_session,
+    host_metrics,
+    reset_breakers,
+)
+from core import profiling, tracing
+from core.celery import app as celery_app
+from core.metrics import REGISTRY
+from core.models import ProfilingSession
+from core.middleware import HybridMiddleware, QueryBudgetMiddleware, ReplicaStickinessMiddleware
+from core.query_budget import QueryBudget
+from returns.models import Order
+from shopify_integration.tasks import BACKFILL_LOCK_SECONDS
+
 
 class PlatformStatusViewTests(APITestCase):
     def test_platform_status_returns_expected_payload(self) -> None:
@@ -38,3 +79,415 @@ class HealthCheckViewTests(APITestCase):
         self.assertIn('database', body['checks'])
         self.assertTrue(body['checks']['database']['healthy'])
         self.assertIn('latency_ms', body['checks']['database'])
+
+
+class ReplicaRouterTests(TestCase):
+    def setUp(self) -> None:
+        self.router = ReplicaRouter()
+        replica_probe.reset()
+
+    def test_reads_stay_on_primary_outside_replica_scope(self) -> None:
+        with mock.patch("core.db_routers.replica_configured", return_value=True):
+            self.assertIsNone(self.router.db_for_read(Order))
+
+    @mock.patch("core.db_routers.replica_configured", return_value=True)
+    def test_replica_reads_fall_back_when_lagging(self, _configured) -> None:
+        with mock.patch.object(ReplicaLagProbe, "_measure", return_value=0.4), read_replica():
+            self.assertEqual(self.router.db_for_read(Order), "replica")
+        replica_probe.reset()
+        with mock.patch.object(ReplicaLagProbe, "_measure", return_value=120.0), read_replica():
+            self.assertEqual(self.router.db_for_read(Order), "default")
+        self.assertEqual(self.router.db_for_write(Order), "default")
+
+    @mock.patch("core.db_routers.replica_configured", return_value=True)
+    def test_pinned_requests_read_from_primary(self, _configured) -> None:
+        with mock.patch.object(ReplicaLagProbe, "_measure", return_value=0.0), read_replica(), pin_primary():
+            self.assertIsNone(self.router.db_for_read(Order))
+
+
+@override_settings(DB_REPLICA_STICKY_SECONDS=15)
+class ReplicaStickinessMiddlewareTests(TestCase):
+    def test_successful_write_pins_client_to_primary(self) -> None:
+        middleware = ReplicaStickinessMiddleware(lambda request: HttpResponse(status=201))
+        request = RequestFactory().post("/api/returns/submit/")
+
+        with mock.patch("core.middleware.replica_configured", return_value=True):
+            response = middleware(request)
+
+        cookie = response.cookies[ReplicaStickinessMiddleware.COOKIE_NAME]
+        self.assertEqual(cookie["max-age"], 15)
+
+
+class ServerTimingMiddlewareTests(APITestCase):
+    def setUp(self) -> None:
+        cache.clear()
+
+    @override_settings(SERVER_TIMING_SAMPLE_RATE=1.0, SERVER_TIMING_HEADER=True)
+    def test_sampled_request_reports_breakdown(self) -> None:
+        with self.assertLogs("core.timing", level="INFO") as logs:
+            response = self.client.get(reverse("health-check"))
+
+        header = response["Server-Timing"]
+        self.assertRegex(header, r'db;dur=[\d.]+;desc="[1-9]\d* queries"')
+        self.assertRegex(header, r'cache;dur=[\d.]+;desc="\d+ hits, [1-9]\d* misses"')
+        self.assertIn("serialize;dur=", header)
+        record = logs.records[0]
+        self.assertEqual(record.view_name, "health-check")
+        self.assertEqual(record.status_code, 200)
+        self.assertGreaterEqual(record.db_queries, 1)
+
+    @override_settings(SERVER_TIMING_SAMPLE_RATE=0.0, SERVER_TIMING_HEADER=True)
+    def test_unsampled_request_is_untouched(self) -> None:
+        response = self.client.get(reverse("platform-status"))
+        self.assertNotIn("Server-Timing", response)
+
+
+@shared_task(name="core.tests.failing_task")
+def failing_task():
+    raise ValueError("boom")
+
+
+class PrometheusMetricsTests(APITestCase):
+    def setUp(self) -> None:
+        cache.clear()
+
+    @override_settings(METRICS_TOKEN="scrape-token")
+    def test_requests_are_exposed_per_view_behind_the_token(self) -> None:
+        self.client.get(reverse("health-check"))
+
+        self.assertEqual(self.client.get(reverse("metrics")).status_code, 401)
+        response = self.client.get(reverse("metrics"), HTTP_AUTHORIZATION="Bearer scrape-token")
+        self.assertEqual(response.status_code, 200)
+        body = response.content.decode()
+        self.assertIn('http_request_duration_seconds_count{method="GET",status="200",view="health-check"}', body)
+        self.assertIn('db_queries_per_request_count{view="health-check"}', body)
+
+    def test_task_failures_and_external_calls_are_counted(self) -> None:
+        failures = REGISTRY.get_sample_value("celery_task_failures_total", {"task": "core.tests.failing_task"}) or 0
+        calls = REGISTRY.get_sample_value("external_api_calls_total", {"provider": "shopify", "outcome": "error"}) or 0
+
+        failing_task.apply()
+        host_metrics.record("demo.myshopify.com", 0.2, failed=True)
+
+        self.assertEqual(
+            REGISTRY.get_sample_value("celery_task_failures_total", {"task": "core.tests.failing_task"}), failures + 1
+        )
+        self.assertEqual(
+            REGISTRY.get_sample_value("external_api_calls_total", {"provider": "shopify", "outcome": "error"}),
+            calls + 1,
+        )
+        self.assertIsNotNone(
+            REGISTRY.get_sample_value(
+                "celery_task_duration_seconds_count", {"task": "core.tests.failing_task", "state": "FAILURE"}
+            )
+        )
+
+
+span_exporter = InMemorySpanExporter()
+
+
+class TracingTests(APITestCase):
+    @classmethod
+    def setUpClass(cls) -> None:
+        super().setUpClass()
+        # The global tracer provider can only be installed once per process.
+        if not isinstance(trace.get_tracer_provider(), TracerProvider):
+            tracing.configure("returnshield-tests", exporter=span_exporter)
+
+    def setUp(self) -> None:
+        cache.clear()
+        tracing._enabled = True
+        span_exporter.clear()
+        self.addCleanup(setattr, tracing, "_enabled", False)
+
+    def test_request_continues_incoming_trace_with_query_spans(self) -> None:
+        trace_id = "4bf92f3577b34da6a3ce929d0e0e4736"
+        self.client.get(reverse("health-check"), HTTP_TRACEPARENT=f"00-{trace_id}-00f067aa0ba902b7-01")
+
+        spans = span_exporter.get_finished_spans()
+        server = next(span for span in spans if span.kind == SpanKind.SERVER)
+        self.assertEqual(server.name, "GET health-check")
+        self.assertEqual(format(server.context.trace_id, "032x"), trace_id)
+        queries = [span for span in spans if span.attributes.get("db.system")]
+        self.assertTrue(queries)
+        self.assertTrue(all(span.parent.span_id == server.context.span_id for span in queries))
+
+    def test_task_run_continues_the_publishing_trace(self) -> None:
+        headers = {"id": "task-1", "task": "returns.tasks.store_return_labels"}
+        before_task_publish.send(sender="returns.tasks.store_return_labels", headers=headers, body=())
+        after_task_publish.send(sender="returns.tasks.store_return_labels", headers=headers, body=())
+        self.assertIn("traceparent", headers)
+
+        task = SimpleNamespace(name="returns.tasks.store_return_labels", request=SimpleNamespace(headers=headers))
+        tracing._start_task_span(task_id="task-1", task=task)
+        tracing._end_task_span(task_id="task-1", state="SUCCESS")
+
+        publish, run = span_exporter.get_finished_spans()
+        self.assertEqual(publish.kind, SpanKind.PRODUCER)
+        self.assertEqual(run.kind, SpanKind.CONSUMER)
+        self.assertEqual(run.context.trace_id, publish.context.trace_id)
+        self.assertEqual(run.parent.span_id, publish.context.span_id)
+
+
+def _spin(stop: threading.Event) -> None:
+    while not stop.is_set():
+        sum(range(1000))
+
+
+class ProfilingTests(APITestCase):
+    def setUp(self) -> None:
+        cache.clear()
+        self.addCleanup(setattr, profiling, "_plan", None)
+
+    def test_sampler_reports_collapsed_stacks_of_selected_threads(self) -> None:
+        stop = threading.Event()
+        worker = threading.Thread(target=_spin, args=(stop,))
+        worker.start()
+        sampler = profiling.StackSampler(0.001, thread_ids=[worker.ident]).start()
+        time.sleep(0.05)
+        counts = sampler.stop()
+        stop.set()
+        worker.join()
+
+        self.assertTrue(counts)
+        self.assertTrue(all("core.tests._spin" in stack for stack in counts))
+        self.assertEqual(profiling.parse_collapsed(profiling.render_collapsed(counts)), counts)
+
+    def test_requests_session_profiles_next_matching_requests(self) -> None:
+        session = ProfilingSession.objects.create(mode="requests", path_prefix="/health", request_count=1)
+        profiling.activate(session)
+        profiling.poll_once(profiling.WEB_PLAN_KEY)
+
+        self.client.get(reverse("platform-status"))
+        self.client.get(reverse("health-check"))
+        self.client.get(reverse("health-check"))
+
+        session.refresh_from_db()
+        self.assertEqual(session.requests_profiled, 1)
+        self.assertEqual(session.status, "complete")
+        self.assertIsNone(cache.get(profiling.WEB_PLAN_KEY))
+
+    @override_settings(PROFILING_ENABLED=True)
+    def test_admin_sends_worker_sessions_through_the_control_command(self) -> None:
+        staff = User.objects.create_superuser(username="ops", email="ops@example.com", password="pass1234")
+        self.client.force_login(staff)
+        with mock.patch("core.celery.app.control.broadcast") as broadcast:
+            response = self.client.post(
+                reverse("admin:core_profilingsession_add"),
+                {
+                    "mode": "duration",
+                    "target": "worker",
+                    "worker_hostname": "celery@worker-1",
+                    "seconds": 20,
+                    "path_prefix": "",
+                    "request_count": 10,
+                },
+            )
+        self.assertEqual(response.status_code, 302)
+        session = ProfilingSession.objects.get()
+        self.assertEqual(session.created_by, staff)
+        broadcast.assert_called_once_with(
+            "start_profiler", arguments={"session_id": session.pk, "seconds": 20}, destination=["celery@worker-1"]
+        )
+
+        state = SimpleNamespace(consumer=SimpleNamespace(hostname="celery@worker-1"))
+        self.assertIn("ok", profiling.start_profiler(state, session_id=session.pk, seconds=20))
+        self.assertEqual(cache.get(profiling.worker_plan_key("celery@worker-1"))["session_id"], session.pk)
+
+
+class CeleryQueueTopologyTests(TestCase):
+    def test_tasks_are_routed_to_their_queues_with_priorities(self) -> None:
+        router = celery_app.amqp.router
+        expected = {
+            "shopify_integration.tasks.sync_shopify_orders": "sync",
+            "shopify_integration.tasks.backfill_shopify_window": "backfill",
+            "returns.tasks.store_return_labels": "labels",
+            "notifications.tasks.flush_email_queue": "notifications",
+            "billing.tasks.process_stripe_events": "webhooks",
+            "analytics.tasks.rollup_daily": "analytics-rollups",
+            "core.celery.debug_task": "celery",
+        }
+        for task_name, queue in expected.items():
+            with self.subTest(task=task_name):
+                self.assertEqual(router.route({}, task_name)["queue"].name, queue)
+        self.assertEqual(router.route({}, "returns.tasks.store_return_labels")["priority"], 0)
+
+    def test_fire_and_forget_tasks_do_not_store_results(self) -> None:
+        celery_app.loader.import_default_modules()
+        for task_name in (
+            "shopify_integration.tasks.sync_shopify_orders",
+            "shopify_integration.tasks.sync_all_installations",
+            "returns.tasks.store_return_labels",
+            "notifications.tasks.flush_email_queue",
+        ):
+            self.assertTrue(celery_app.tasks[task_name].ignore_result, task_name)
+        # The backfill chord waits on its shards' results.
+        self.assertFalse(celery_app.tasks["shopify_integration.tasks.backfill_shopify_window"].ignore_result)
+        # Its completion counter expires with the results; it must outlive the
+        # lock the backfill holds on the store, or the callback can be lost.
+        self.assertGreater(celery_app.conf.result_expires, BACKFILL_LOCK_SECONDS)
+
+
+class QueryBudgetMiddlewareTests(TestCase):
+    @override_settings(QUERY_BUDGET_MODE="warn")
+    def test_warn_mode_logs_and_serves_the_response(self) -> None:
+        def view(request):
+            request.resolver_match = mock.Mock(view_name="budgeted")
+            list(Order.objects.all())
+            list(Order.objects.all())
+            return HttpResponse(status=200)
+
+        middleware = QueryBudgetMiddleware(view)
+        with mock.patch.dict("core.query_budget.QUERY_BUDGETS", {"budgeted": QueryBudget(1)}), self.assertLogs(
+            "core.middleware", level="WARNING"
+        ) as logs:
+            response = middleware(RequestFactory().get("/"))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("budgeted: 2 queries (budget 1)", logs.output[0])
+
+    @override_settings(QUERY_BUDGET_MODE="warn")
+    async def test_async_chain_counts_queries_run_off_the_event_loop(self) -> None:
+        async def view(request):
+            request.resolver_match = mock.Mock(view_name="budgeted")
+            await sync_to_async(list)(Order.objects.all())
+            await Order.objects.acount()
+            return HttpResponse(status=200)
+
+        middleware = QueryBudgetMiddleware(view)
+        self.assertTrue(iscoroutinefunction(middleware))
+        with mock.patch.dict("core.query_budget.QUERY_BUDGETS", {"budgeted": QueryBudget(1)}), self.assertLogs(
+            "core.middleware", level="WARNING"
+        ) as logs:
+            response = await middleware(RequestFactory().get("/"))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("budgeted: 2 queries (budget 1)", logs.output[0])
+
+
+class AsyncMiddlewareChainTests(TestCase):
+    def test_middleware_missing_a_path_cannot_be_loaded(self) -> None:
+        class SyncOnly(HybridMiddleware):
+            def handle(self, request):
+                return self.get_response(request)
+
+        with self.assertRaises(TypeError):
+            SyncOnly(lambda request: HttpResponse())
+
+    async def test_asgi_requests_record_metrics_and_queries(self) -> None:
+        labels = {"view": "health-check"}
+        before = REGISTRY.get_sample_value("db_queries_per_request_sum", labels) or 0
+
+        response = await self.async_client.get(reverse("health-check"))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertGreater(REGISTRY.get_sample_value("db_queries_per_request_sum", labels), before)
+
+
+class DatabaseStatsTests(APITestCase):
+    def test_pool_stats_are_admin_only(self) -> None:
+        response = self.client.get(reverse('health-check'))
+        self.assertNotIn('pool', response.json()['checks']['database'])
+
+        self.client.force_authenticate(User.objects.create_user(username="merchant", password="pass"))
+        self.assertEqual(self.client.get(reverse('db-stats')).status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_db_stats_reports_pool_stats(self) -> None:
+        fake_pool = mock.Mock(min_size=2, max_size=10)
+        fake_pool.get_stats.return_value = {"pool_size": 3, "pool_available": 2, "requests_num": 40}
+        self.client.force_authenticate(User.objects.create_user(username="ops", password="pass", is_staff=True))
+
+        with mock.patch("core.views.connection") as mock_connection:
+            mock_connection.pool = fake_pool
+            mock_connection.settings_dict = {"CONN_MAX_AGE": 0}
+            response = self.client.get(reverse('db-stats'))
+
+        pool = response.json()['connections']
+        self.assertEqual(pool['pool']['size'], 3)
+        self.assertEqual(pool['pool']['max_size'], 10)
+        self.assertEqual(pool['pool']['requests_num'], 40)
+
+
+class CacheInstrumentationTests(APITestCase):
+    def setUp(self) -> None:
+        cache.clear()
+        cache_stats.reset()
+
+    def test_hits_and_misses_are_counted(self) -> None:
+        cache.get("missing-key")
+        cache.set("present-key", "value")
+        cache.get("present-key")
+        cache.get_many(["present-key", "missing-key"])
+
+        snapshot = cache_stats.snapshot()
+        self.assertEqual(snapshot["hits"], 2)
+        self.assertEqual(snapshot["misses"], 2)
+        self.assertEqual(snapshot["operations"]["get"]["count"], 2)
+        self.assertEqual(snapshot["operations"]["get_many"]["count"], 1)
+
+    def test_cache_stats_endpoint_is_staff_only(self) -> None:
+        url = reverse('cache-stats')
+        user = User.objects.create_user(username="ops", password="StrongPass123!")
+        self.client.force_authenticate(user)
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_403_FORBIDDEN)
+
+        user.is_staff = True
+        user.save(update_fields=["is_staff"])
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn("hits", response.json()["process"])
+
+
+def _http_response(status_code: int) -> requests.Response:
+    response = requests.Response()
+    response.status_code = status_code
+    response.raw = io.BytesIO(b"")
+    return response
+
+
+class IntegrationHTTPLayerTests(TestCase):
+    def setUp(self) -> None:
+        reset_breakers()
+        host_metrics.reset()
+
+    @mock.patch("core.http.time.sleep")
+    def test_idempotent_requests_retry_transient_failures(self, mock_sleep) -> None:
+        with mock.patch.object(HTTPAdapter, "send", side_effect=[_http_response(503), _http_response(200)]) as send:
+            response = get_session().get("https://api.bigcommerce.com/stores/abc/v3/store")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(send.call_count, 2)
+        mock_sleep.assert_called_once()
+        stats = host_metrics.snapshot()["hosts"]["api.bigcommerce.com"]
+        self.assertEqual(stats["count"], 2)
+        self.assertEqual(stats["errors"], 1)
+
+    def test_circuit_opens_after_repeated_failures(self) -> None:
+        with mock.patch.object(HTTPAdapter, "send", side_effect=requests.ConnectionError("down")) as send:
+            for _ in range(BREAKER_FAILURE_THRESHOLD):
+                with self.assertRaises(requests.ConnectionError):
+                    get_session().post("https://api.helpscout.net/v2/conversations", json={})
+            with self.assertRaises(CircuitOpenError):
+                get_session().post("https://api.helpscout.net/v2/conversations", json={})
+
+        self.assertEqual(send.call_count, BREAKER_FAILURE_THRESHOLD)
+        self.assertEqual(host_metrics.snapshot()["hosts"]["api.helpscout.net"]["circuit"], "open")
+
+    def test_cancelled_probe_is_released(self) -> None:
+        breaker = _breaker_for("api.helpscout.net")
+        for _ in range(BREAKER_FAILURE_THRESHOLD):
+            breaker.record_failure()
+        breaker._opened_at -= breaker.reset_seconds
+        self.assertEqual(breaker.state, "half_open")
+
+        async def call():
+            transport = IntegrationTransport()
+            with mock.patch.object(
+                transport._transport, "handle_async_request", side_effect=asyncio.CancelledError
+            ), self.assertRaises(asyncio.CancelledError):
+                await transport.handle_async_request(httpx.Request("GET", "https://api.helpscout.net/v2/users/me"))
+
+        async_to_sync(call)()
+
+        # The probe was released, so the next caller gets to probe the host.
+        self.assertTrue(breaker.allow_request())
@@ -0,0 +1,146 @@
+"""
+Per-request performance breakdown.
+
+``core.middleware.ServerTimingMiddleware`` starts a ``RequestTimings``
+collector for a sample of requests. While it is active:
+
+* SQL queries are counted and timed through ``connection.execute_wrapper``;
+* ``core.cache`` reports cache hits, misses and time;
+* ``core.http`` reports outbound call time per integration host;
+* ``core.renderers.TimedJSONRenderer`` reports response serialization time;
+* any code can add its own span with ``timed("name")``, which is also
+  traced as an OpenTelemetry span (``core.tracing``).
+
+The totals are returned as a ``Server-Timing`` header (when enabled) and
+logged as structured fields on the ``core.timing`` logger.
+"""
+from __future__ import annotations
+
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+
+from .tracing import span
+
+_current: contextvars.ContextVar[Optional["RequestTimings"]] = contextvars.ContextVar(
+    "request_timings", default=None
+)
+
+
+class RequestTimings:
+    """Counters for one request; safe to update from the request's helper threads."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.started = time.perf_counter()
+        self.db_queries = 0
+        self.db_ms = 0.0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.cache_ms = 0.0
+        self.http: Dict[str, Dict[str, float]] = {}
+        self.spans: Dict[str, float] = {}
+
+    def __call__(self, execute, sql, params, many, context):
+        # connection.execute_wrapper hook.
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            with self._lock:
+                self.db_queries += 1
+                self.db_ms += elapsed_ms
+
+    def add_cache(self, elapsed: float, hits: int, misses: int) -> None:
+        with self._lock:
+            self.cache_hits += hits
+            self.cache_misses += misses
+            self.cache_ms += elapsed * 1000
+
+    def add_http(self, host: str, elapsed: float) -> None:
+        with self._lock:
+            entry = self.http.setdefault(host, {"calls": 0, "ms": 0.0})
+            entry["calls"] += 1
+            entry["ms"] += elapsed * 1000
+
+    def add_span(self, name: str, elapsed: float) -> None:
+        with self._lock:
+            self.spans[name] = self.spans.get(name, 0.0) + elapsed * 1000
+
+    @property
+    def total_ms(self) -> float:
+        return (time.perf_counter() - self.started) * 1000
+
+    def header(self) -> str:
+        """``Server-Timing`` header value."""
+        entries: List[str] = [
+            f'db;dur={self.db_ms:.1f};desc="{self.db_queries} queries"',
+            f'cache;dur={self.cache_ms:.1f};desc="{self.cache_hits} hits, {self.cache_misses} misses"',
+        ]
+        for host, entry in sorted(self.http.items()):
+            entries.append(f'http-{host};dur={entry["ms"]:.1f};desc="{int(entry["calls"])} calls"')
+        for name, elapsed_ms in sorted(self.spans.items()):
+            entries.append(f"{name};dur={elapsed_ms:.1f}")
+        entries.append(f"total;dur={self.total_ms:.1f}")
+        return ", ".join(entries)
+
+    def log_fields(self) -> Dict[str, Any]:
+        return {
+            "duration_ms": round(self.total_ms, 2),
+            "db_queries": self.db_queries,
+            "db_ms": round(self.db_ms, 2),
+            "cache_hits": self.cache_hits,
+            "cache_misses": self.cache_misses,
+            "cache_ms": round(self.cache_ms, 2),
+            "http_calls": sum(int(entry["calls"]) for entry in self.http.values()),
+            "http_ms": round(sum(entry["ms"] for entry in self.http.values()), 2),
+            "http_hosts": {host: round(entry["ms"], 2) for host, entry in self.http.items()},
+            **{f"{name}_ms": round(elapsed_ms, 2) for name, elapsed_ms in self.spans.items()},
+        }
+
+
+def current() -> Optional[RequestTimings]:
+    return _current.get()
+
+
+@contextmanager
+def collect() -> Iterator[RequestTimings]:
+    timings = RequestTimings()
+    token = _current.set(timings)
+    try:
+        yield timings
+    finally:
+        _current.reset(token)
+
+
+def record_cache(elapsed: float, hits: int = 0, misses: int = 0) -> None:
+    timings = _current.get()
+    if timings is not None:
+        timings.add_cache(elapsed, hits, misses)
+
+
+def record_http(host: str, elapsed: float) -> None:
+    timings = _current.get()
+    if timings is not None:
+        timings.add_http(host, elapsed)
+
+
+@contextmanager
+def timed(name: str) -> Iterator[None]:
+    """
+    Add the block's duration to the current request's ``name`` span, if it
+    is being timed, and trace it as an OpenTelemetry span when tracing is on.
+    """
+    timings = _current.get()
+    with span(name):
+        if timings is None:
+            yield
+            return
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            timings.add_span(name, time.perf_counter() - started)
@@ -0,0 +1,199 @@
+"""
+OpenTelemetry tracing.
+
+When ``OTEL_EXPORTER_OTLP_ENDPOINT`` is set, settings call ``configure()``
+and spans are exported over OTLP/HTTP to that collector:
+
+* one server span per request (``core.middleware.TracingMiddleware``),
+  continuing an incoming W3C ``traceparent``;
+* one client span per ORM query, in requests and Celery tasks;
+* a producer span per Celery publish whose context travels in the message
+  headers, and a consumer span per task run that continues it, so a sync or
+  email queued by a request shows up in the request's trace;
+* one client span per outbound integration call (``core.http``);
+* an internal span for every ``core.timing.timed()`` block.
+
+Until ``configure()`` runs every helper is a no-op.
+"""
+from __future__ import annotations
+
+import threading
+from contextlib import ExitStack, contextmanager
+from typing import Any, Dict, Iterator, Optional
+
+from celery.signals import after_task_publish, before_task_publish, task_failure, task_postrun, task_prerun
+from django.db import connections
+from opentelemetry import context, propagate, trace
+from opentelemetry.trace import SpanKind, Status, StatusCode
+
+# SQL longer than this is cut in span attributes.
+MAX_STATEMENT_LENGTH = 2000
+
+tracer = trace.get_tracer("returnshield")
+_enabled = False
+
+
+def enabled() -> bool:
+    return _enabled
+
+
+def configure(service_name: str, endpoint: str = "", sample_rate: float = 1.0, exporter=None) -> None:
+    """
+    Install the tracer provider for this process.
+
+    Spans go to ``exporter`` when given (tests), else in batches to the OTLP
+    collector at ``endpoint``. ``sample_rate`` applies to new traces only;
+    traces started upstream keep their sampling decision.
+    """
+    global _enabled
+    from opentelemetry.sdk.resources import Resource
+    from opentelemetry.sdk.trace import TracerProvider
+    from opentelemetry.sdk.trace.export import BatchSpanProcessor, SimpleSpanProcessor
+    from opentelemetry.sdk.trace.sampling import ParentBased, TraceIdRatioBased
+
+    provider = TracerProvider(
+        resource=Resource.create({"service.name": service_name}),
+        sampler=ParentBased(TraceIdRatioBased(sample_rate)),
+    )
+    if exporter is not None:
+        provider.add_span_processor(SimpleSpanProcessor(exporter))
+    else:
+        from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+
+        # BatchSpanProcessor restarts its export thread in forked workers.
+        provider.add_span_processor(BatchSpanProcessor(OTLPSpanExporter(endpoint=f"{endpoint.rstrip('/')}/v1/traces")))
+    trace.set_tracer_provider(provider)
+    _enabled = True
+
+
+@contextmanager
+def span(name: str, kind: SpanKind = SpanKind.INTERNAL, **attributes: Any) -> Iterator[Optional[trace.Span]]:
+    """A span around the block, or ``None`` when tracing is off."""
+    if not _enabled:
+        yield None
+        return
+    with tracer.start_as_current_span(name, kind=kind, attributes=attributes) as current:
+        yield current
+
+
+def outbound_span(method: str, host: str, attempt: int):
+    """Client span for one attempt of an outbound integration call."""
+    return span(
+        f"{method} {host}",
+        SpanKind.CLIENT,
+        **{"http.request.method": method, "server.address": host, "http.request.resend_count": attempt},
+    )
+
+
+def set_http_status(current: Optional[trace.Span], status_code: int) -> None:
+    if current is None:
+        return
+    current.set_attribute("http.response.status_code", status_code)
+    if status_code >= 500:
+        current.set_status(Status(StatusCode.ERROR))
+
+
+class QueryTracer:
+    """``execute_wrapper`` hook adding a client span per query on one database alias."""
+
+    def __init__(self, alias: str) -> None:
+        self.alias = alias
+        self.vendor = connections[alias].vendor
+
+    def __call__(self, execute, sql, params, many, context):
+        with tracer.start_as_current_span(
+            sql.split(None, 1)[0].upper() if sql else "query",
+            kind=SpanKind.CLIENT,
+            attributes={
+                "db.system": self.vendor,
+                "db.name": self.alias,
+                "db.statement": sql[:MAX_STATEMENT_LENGTH],
+            },
+        ):
+            return execute(sql, params, many, context)
+
+
+def trace_queries(stack: ExitStack) -> None:
+    """Trace queries on every database alias until ``stack`` closes."""
+    for alias in connections:
+        stack.enter_context(connections[alias].execute_wrapper(QueryTracer(alias)))
+
+
+# Celery. Handlers are connected on import; ``core.celery`` imports this
+# module so both publishers and workers have them.
+
+_lock = threading.Lock()
+_publishing: Dict[str, trace.Span] = {}
+_running: Dict[str, tuple] = {}
+
+
+def _task_carrier(request) -> Dict[str, str]:
+    # Celery exposes custom message headers as request attributes, or under
+    # ``request.headers`` depending on the protocol.
+    carrier = dict(getattr(request, "headers", None) or {})
+    for key in ("traceparent", "tracestate"):
+        value = getattr(request, key, None)
+        if value:
+            carrier[key] = value
+    return carrier
+
+
+@before_task_publish.connect
+def _start_publish_span(sender=None, headers=None, **kwargs) -> None:
+    if not _enabled or headers is None:
+        return
+    publish_span = tracer.start_span(f"publish {sender}", kind=SpanKind.PRODUCER, attributes={"celery.task": sender})
+    propagate.inject(headers, context=trace.set_span_in_context(publish_span))
+    task_id = headers.get("id")
+    if task_id:
+        with _lock:
+            _publishing[task_id] = publish_span
+    else:
+        publish_span.end()
+
+
+@after_task_publish.connect
+def _end_publish_span(headers=None, **kwargs) -> None:
+    task_id = (headers or {}).get("id")
+    with _lock:
+        publish_span = _publishing.pop(task_id, None)
+    if publish_span is not None:
+        publish_span.end()
+
+
+@task_prerun.connect
+def _start_task_span(task_id=None, task=None, **kwargs) -> None:
+    if not _enabled:
+        return
+    # Eager tasks run inside the caller's span already.
+    parent = None if getattr(task.request, "is_eager", False) else propagate.extract(_task_carrier(task.request))
+    task_span = tracer.start_span(
+        f"run {task.name}",
+        context=parent,
+        kind=SpanKind.CONSUMER,
+        attributes={"celery.task": task.name, "celery.task_id": task_id},
+    )
+    token = context.attach(trace.set_span_in_context(task_span))
+    stack = ExitStack()
+    trace_queries(stack)
+    _running[task_id] = (task_span, token, stack)
+
+
+@task_failure.connect
+def _record_task_failure(task_id=None, exception=None, **kwargs) -> None:
+    entry = _running.get(task_id)
+    if entry is not None and exception is not None:
+        entry[0].record_exception(exception)
+        entry[0].set_status(Status(StatusCode.ERROR, str(exception)))
+
+
+@task_postrun.connect
+def _end_task_span(task_id=None, state=None, **kwargs) -> None:
+    entry = _running.pop(task_id, None)
+    if entry is None:
+        return
+    task_span, token, stack = entry
+    stack.close()
+    task_span.set_attribute("celery.state", state or "UNKNOWN")
+    context.detach(token)
+    task_span.end()
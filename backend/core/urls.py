@@ -17,7 +17,17 @@ Including another URLconf
 from django.contrib import admin
 from django.urls import include, path
 
-from .views import FeatureFlagsView, HealthCheckView, IntegrationsHealthView, PlatformStatusView
+from .views import (
+    CacheStatsView,
+    DatabaseStatsView,
+    EmailDeliveryStatsView,
+    FeatureFlagsView,
+    HealthCheckView,
+    IntegrationHTTPStatsView,
+    IntegrationsHealthView,
+    PlatformStatusView,
+    metrics_view,
+)
 
 urlpatterns = [
     path('admin/', admin.site.urls),
@@ -33,4 +43,9 @@ urlpatterns = [
     path('api/integrations/health/', IntegrationsHealthView.as_view(), name='integrations-health'),
     path('api/feature-flags/', FeatureFlagsView.as_view(), name='feature-flags'),
     path('health/', HealthCheckView.as_view(), name='health-check'),
+    path('internal/cache-stats/', CacheStatsView.as_view(), name='cache-stats'),
+    path('internal/db-stats/', DatabaseStatsView.as_view(), name='db-stats'),
+    path('internal/http-stats/', IntegrationHTTPStatsView.as_view(), name='http-stats'),
+    path('internal/email-stats/', EmailDeliveryStatsView.as_view(), name='email-stats'),
+    path('metrics/', metrics_view, name='metrics'),
 ]
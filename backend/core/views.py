@@ -4,12 +4,23 @@ import time
 from typing import Dict, List
 
 from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.utils.crypto import constant_time_compare
 from django.db import connection
 from django.utils import timezone
-from rest_framework.permissions import AllowAny, IsAuthenticated
+from rest_framework.permissions import AllowAny, IsAdminUser, IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
+from accounts.entitlements import get_snapshot
+from notifications.email import delivery_metrics, email_queue_stats
+
+from . import metrics
+from .cache import cache_stats
+from .http import host_metrics
+from .db_routers import ReplicaReadMixin, replica_configured, replica_probe
+
 
 class PlatformStatusView(APIView):
     permission_classes = [AllowAny]
@@ -50,7 +61,72 @@ class HealthCheckView(APIView):
             return {"healthy": False, "error": str(exc)}
 
 
-class IntegrationsHealthView(APIView):
+class DatabaseStatsView(APIView):
+    """Internal: this process's connection reuse mode and pool counters, plus replica lag."""
+    permission_classes = [IsAdminUser]
+
+    def get(self, request, *args, **kwargs):
+        payload = {"connections": _connection_pool_stats(), "replica": None}
+        if replica_configured():
+            # A lagging or unreachable replica is not an error: reads
+            # transparently fall back to the primary.
+            lag = replica_probe.lag_seconds()
+            payload["replica"] = {
+                "serving_reads": "replica" if replica_probe.is_healthy() else "primary",
+                "lag_seconds": round(lag, 2) if lag is not None else None,
+            }
+        return Response(payload, status=200)
+
+
+class CacheStatsView(APIView):
+    """Internal: hit/miss/latency counters for this process plus shared Redis keyspace stats."""
+    permission_classes = [IsAdminUser]
+
+    def get(self, request, *args, **kwargs):
+        server_stats = getattr(cache, "server_stats", None)
+        return Response(
+            {
+                "backend": f"{type(cache).__module__}.{type(cache).__name__}",
+                "key_prefix": cache.key_prefix,
+                "process": cache_stats.snapshot(),
+                "server": server_stats() if server_stats else None,
+            },
+            status=200,
+        )
+
+
+class IntegrationHTTPStatsView(APIView):
+    """Internal: per-host outbound call counts, latency and circuit state for this process."""
+    permission_classes = [IsAdminUser]
+
+    def get(self, request, *args, **kwargs):
+        return Response(host_metrics.snapshot(), status=200)
+
+
+class EmailDeliveryStatsView(APIView):
+    """Internal: email queue depth and outcomes plus this process's SendGrid delivery counters."""
+    permission_classes = [IsAdminUser]
+
+    def get(self, request, *args, **kwargs):
+        return Response({"queue": email_queue_stats(), "process": delivery_metrics.snapshot()}, status=200)
+
+
+def metrics_view(request):
+    """
+    Prometheus scrape endpoint. A plain Django view so scrapes skip DRF
+    authentication and throttling; access is by bearer token instead.
+    """
+    if settings.METRICS_TOKEN:
+        scheme, _, token = request.headers.get("Authorization", "").partition(" ")
+        if scheme.lower() != "bearer" or not constant_time_compare(token, settings.METRICS_TOKEN):
+            return HttpResponse(status=401)
+    elif not settings.DEBUG:
+        return HttpResponse(status=404)
+    body, content_type = metrics.render()
+    return HttpResponse(body, content_type=content_type)
+
+
+class IntegrationsHealthView(ReplicaReadMixin, APIView):
     """Returns health status of all connected integrations for the authenticated user."""
     permission_classes = [IsAuthenticated]
 
@@ -158,37 +234,31 @@ class FeatureFlagsView(APIView):
     permission_classes = [IsAuthenticated]
 
     def get(self, request, *args, **kwargs):
-        user = request.user
-        flags = []
-
-        # Subscription-based feature flags
-        if user.subscription_status in ["launch", "scale", "elite"]:
-            flags.append("live_data")
-        if user.subscription_status in ["scale", "elite"]:
-            flags.append("exchange_automation")
-            flags.append("ai_coach")
-        if user.subscription_status == "elite":
-            flags.append("white_glove_support")
-            flags.append("custom_playbooks")
-            flags.append("quarterly_workshops")
-
-        # Platform-based feature flags
-        if user.has_shopify_store:
-            flags.append("shopify_integration")
-        if user.store_platform == "bigcommerce":
-            flags.append("bigcommerce_integration")
-        if user.store_platform == "woocommerce":
-            flags.append("woocommerce_integration")
-
-        # Waffle feature flags (if django-waffle is installed)
-        try:
-            from waffle.models import Flag
-            active_flags = Flag.objects.filter(users=user, everyone=False).values_list("name", flat=True)
-            flags.extend(active_flags)
-        except ImportError:
-            pass  # django-waffle not installed or not configured
+        # Subscription, platform and waffle flags come from the cached
+        # entitlement snapshot, rebuilt whenever any of them change.
+        return Response(get_snapshot(request.user)["flags"], status=200)
+
 
-        return Response(flags, status=200)
+def _connection_pool_stats() -> dict:
+    """Describe how this process reuses database connections."""
+    stats: Dict[str, object] = {
+        "mode": settings.DB_POOL_MODE,
+        "process_role": settings.PROCESS_ROLE,
+        "conn_max_age": connection.settings_dict.get("CONN_MAX_AGE", 0),
+    }
+    pool = getattr(connection, "pool", None)
+    if pool is not None:
+        pool_stats = pool.get_stats()
+        stats["pool"] = {
+            "size": pool_stats.get("pool_size", 0),
+            "available": pool_stats.get("pool_available", 0),
+            "min_size": pool.min_size,
+            "max_size": pool.max_size,
+            "requests_waiting": pool_stats.get("requests_waiting", 0),
+            "requests_num": pool_stats.get("requests_num", 0),
+            "connections_errors": pool_stats.get("connections_errors", 0),
+        }
+    return stats
 
 
 def _get_platform_status() -> List[dict]:
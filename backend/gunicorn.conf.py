@@ -0,0 +1,23 @@
+"""
+Gunicorn settings loaded from the working directory.
+
+Only the Prometheus multiprocess bookkeeping lives here (see
+``core.metrics``); the worker class and bind address stay on the command line.
+"""
+import os
+import shutil
+
+
+def on_starting(server):
+    # Samples left by a previous master would be summed into the new ones.
+    path = os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+    if path:
+        shutil.rmtree(path, ignore_errors=True)
+        os.makedirs(path, exist_ok=True)
+
+
+def child_exit(server, worker):
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+
+        multiprocess.mark_process_dead(worker.pid)
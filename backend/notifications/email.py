@@ -1,15 +1,40 @@
 from __future__ import annotations
 
 import logging
-from typing import Iterable, Optional
+import os
+import threading
+import time
+from collections import defaultdict
+from datetime import timedelta
+from typing import Any, Dict, Iterable, List, Optional, Tuple
 
 from django.conf import settings
-from django.utils.html import format_html
-from sendgrid import SendGridAPIClient
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, F
+from django.utils import timezone
 from sendgrid.helpers.mail import Mail
 
+from core.http import get_session
+
+from .email_templates import EMAIL_TEMPLATES, ONBOARDING, EmailTemplate
+from .models import EmailMessage
+
 logger = logging.getLogger(__name__)
 
+SENDGRID_SEND_URL = "https://api.sendgrid.com/v3/mail/send"
+
+# SendGrid accepts at most 1000 personalizations per request.
+PERSONALIZATION_LIMIT = 1000
+DISPATCH_BATCH_SIZE = 5000
+MAX_ATTEMPTS = 5
+RETRY_BACKOFF_BASE_SECONDS = 30
+RETRY_BACKOFF_CAP_SECONDS = 60 * 60
+FLUSH_SCHEDULED_KEY = "notifications:email-flush-scheduled"
+# Claimed messages are hidden from other dispatches for this long, so a
+# dispatch that dies mid-batch hands them back once the lease runs out.
+CLAIM_LEASE = timedelta(minutes=15)
+
 
 def _is_enabled() -> bool:
     return bool(settings.SENDGRID_API_KEY)
@@ -37,8 +62,7 @@ def send_email(
         html_content=html_content,
     )
     try:
-        client = SendGridAPIClient(settings.SENDGRID_API_KEY)
-        response = client.send(message)
+        response = _post_to_sendgrid(message)
         logger.info(
             "SendGrid email dispatched",
             extra={"status_code": response.status_code, "subject": subject},
@@ -49,6 +73,260 @@ def send_email(
         return False
 
 
+def _post_to_sendgrid(message: Mail):
+    """Send a Mail through the shared pooled integration session."""
+    return _post_payload(message.get())
+
+
+def queue_email(*, template: str, to_email: str, context: Optional[Dict[str, Any]] = None) -> bool:
+    """
+    Queue a templated email for batched delivery.
+
+    The message is stored and sent by ``notifications.tasks.flush_email_queue``
+    shortly after the surrounding transaction commits.
+    """
+    if not _is_enabled():
+        logger.warning("SendGrid API key is not configured; skipped email send.")
+        return False
+    if template not in EMAIL_TEMPLATES:
+        raise ValueError(f"Unknown email template: {template}")
+
+    EmailMessage.objects.create(template=template, to_email=to_email, context=context or {})
+    transaction.on_commit(_schedule_flush)
+    return True
+
+
+def _schedule_flush() -> None:
+    # Coalesce everything queued within one batch window into a single flush.
+    if cache.add(FLUSH_SCHEDULED_KEY, True, settings.EMAIL_BATCH_WINDOW_SECONDS):
+        from notifications.tasks import flush_email_queue
+
+        flush_email_queue.apply_async(countdown=settings.EMAIL_BATCH_WINDOW_SECONDS)
+
+
+def _retry_delay(attempts: int) -> timedelta:
+    return timedelta(seconds=min(RETRY_BACKOFF_BASE_SECONDS * (2 ** (attempts - 1)), RETRY_BACKOFF_CAP_SECONDS))
+
+
+def _sender() -> Dict[str, str]:
+    return {"email": settings.SENDGRID_FROM_EMAIL, "name": settings.SENDGRID_FROM_NAME}
+
+
+def _post_payload(payload: Dict[str, Any]):
+    return get_session().post(
+        SENDGRID_SEND_URL,
+        json=payload,
+        headers={"Authorization": f"Bearer {settings.SENDGRID_API_KEY}"},
+        timeout=15,
+    )
+
+
+def _build_requests(template: EmailTemplate, messages: List[EmailMessage]) -> List[Tuple[List[EmailMessage], Dict]]:
+    """Turn queued messages into SendGrid request bodies, each covering one or more messages."""
+    template_id = template.sendgrid_template_id
+    if template_id:
+        bodies = []
+        for start in range(0, len(messages), PERSONALIZATION_LIMIT):
+            chunk = messages[start:start + PERSONALIZATION_LIMIT]
+            personalizations = []
+            for message in chunk:
+                subject, _html = template.render(message.context)
+                personalizations.append(
+                    {
+                        "to": [{"email": message.to_email}],
+                        "dynamic_template_data": {**message.context, "subject": subject},
+                    }
+                )
+            bodies.append(
+                (chunk, {"from": _sender(), "template_id": template_id, "personalizations": personalizations})
+            )
+        return bodies
+
+    # Locally rendered content differs per recipient, so each message is its
+    # own request over the pooled session.
+    bodies = []
+    for message in messages:
+        subject, html = template.render(message.context)
+        bodies.append(
+            (
+                [message],
+                {
+                    "from": _sender(),
+                    "subject": subject,
+                    "personalizations": [{"to": [{"email": message.to_email}]}],
+                    "content": [{"type": "text/html", "value": html}],
+                },
+            )
+        )
+    return bodies
+
+
+def _mark_sent(messages: List[EmailMessage]) -> None:
+    EmailMessage.objects.filter(pk__in=[message.pk for message in messages]).update(
+        status=EmailMessage.Status.SENT,
+        attempts=F("attempts") + 1,
+        last_error="",
+        sent_at=timezone.now(),
+    )
+
+
+def _mark_failed(messages: List[EmailMessage], error: str) -> int:
+    """Schedule a retry with backoff, or give up after ``MAX_ATTEMPTS``. Returns the number given up."""
+    now = timezone.now()
+    abandoned = 0
+    for message in messages:
+        message.attempts += 1
+        message.last_error = error[:2000]
+        if message.attempts >= MAX_ATTEMPTS:
+            message.status = EmailMessage.Status.FAILED
+            abandoned += 1
+        else:
+            message.next_attempt_at = now + _retry_delay(message.attempts)
+    EmailMessage.objects.bulk_update(messages, ["attempts", "last_error", "status", "next_attempt_at"])
+    return abandoned
+
+
+def _mark_failed_permanently(messages: List[EmailMessage], error: str) -> int:
+    EmailMessage.objects.filter(pk__in=[message.pk for message in messages]).update(
+        status=EmailMessage.Status.FAILED, last_error=error
+    )
+    return len(messages)
+
+
+def _claim_due(limit: int) -> List[EmailMessage]:
+    """Lease up to ``limit`` due messages to this dispatch before anything is posted."""
+    now = timezone.now()
+    with transaction.atomic():
+        due = list(
+            EmailMessage.objects.select_for_update(skip_locked=True)
+            .filter(status=EmailMessage.Status.QUEUED, next_attempt_at__lte=now)
+            .order_by("id")[:limit]
+        )
+        EmailMessage.objects.filter(pk__in=[message.pk for message in due]).update(next_attempt_at=now + CLAIM_LEASE)
+    return due
+
+
+def dispatch_queued_emails(limit: int = DISPATCH_BATCH_SIZE, deadline: Optional[float] = None) -> Dict[str, int]:
+    """
+    Send up to ``limit`` due messages, grouped into as few SendGrid requests as
+    their templates allow.
+
+    Messages are claimed first, so an overlapping dispatch cannot send them
+    again. No new request starts after ``deadline`` (a ``time.monotonic()``
+    value); messages not reached are released for the next dispatch.
+    """
+    due = _claim_due(limit)
+    deferred: List[EmailMessage] = []
+    grouped: Dict[str, List[EmailMessage]] = defaultdict(list)
+    for message in due:
+        grouped[message.template].append(message)
+
+    totals = {"sent": 0, "retrying": 0, "failed": 0, "deferred": 0, "requests": 0}
+    for key, messages in grouped.items():
+        template = EMAIL_TEMPLATES.get(key)
+        if template is None:
+            totals["failed"] += _mark_failed_permanently(messages, f"Unknown email template: {key}")
+            continue
+        for chunk, payload in _build_requests(template, messages):
+            if deadline is not None and time.monotonic() >= deadline:
+                deferred.extend(chunk)
+                continue
+            started = time.perf_counter()
+            try:
+                response = _post_payload(payload)
+                ok = response.status_code in (200, 202)
+                error = "" if ok else f"SendGrid returned {response.status_code}: {response.text[:500]}"
+            except Exception as exc:
+                ok, error = False, str(exc)
+            delivery_metrics.record(
+                key,
+                time.perf_counter() - started,
+                sent=len(chunk) if ok else 0,
+                failed=0 if ok else len(chunk),
+            )
+            totals["requests"] += 1
+            if ok:
+                _mark_sent(chunk)
+                totals["sent"] += len(chunk)
+            else:
+                logger.warning("SendGrid batch for %s failed (%s messages): %s", key, len(chunk), error)
+                abandoned = _mark_failed(chunk, error)
+                totals["failed"] += abandoned
+                totals["retrying"] += len(chunk) - abandoned
+
+    if deferred:
+        EmailMessage.objects.filter(pk__in=[message.pk for message in deferred]).update(
+            next_attempt_at=timezone.now()
+        )
+        totals["deferred"] = len(deferred)
+    if due:
+        logger.info("Email dispatch finished", extra=totals)
+    return totals
+
+
+class DeliveryMetrics:
+    """Per-template delivery counters and SendGrid request latency for this process."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._templates: Dict[str, Dict[str, float]] = {}
+
+    def record(self, template: str, elapsed: float, *, sent: int, failed: int) -> None:
+        elapsed_ms = elapsed * 1000
+        with self._lock:
+            entry = self._templates.setdefault(
+                template, {"requests": 0, "sent": 0, "failed": 0, "total_ms": 0.0, "max_ms": 0.0}
+            )
+            entry["requests"] += 1
+            entry["sent"] += sent
+            entry["failed"] += failed
+            entry["total_ms"] += elapsed_ms
+            entry["max_ms"] = max(entry["max_ms"], elapsed_ms)
+
+    def reset(self) -> None:
+        with self._lock:
+            self._templates.clear()
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            templates = {
+                key: {
+                    "requests": int(entry["requests"]),
+                    "sent": int(entry["sent"]),
+                    "failed": int(entry["failed"]),
+                    "avg_ms": round(entry["total_ms"] / entry["requests"], 2),
+                    "max_ms": round(entry["max_ms"], 2),
+                }
+                for key, entry in self._templates.items()
+            }
+        return {"pid": os.getpid(), "templates": templates}
+
+
+delivery_metrics = DeliveryMetrics()
+
+
+def email_queue_stats() -> Dict[str, Any]:
+    """Queue depth and outcomes over the last day, shared by every process."""
+    since = timezone.now() - timedelta(days=1)
+    counts = dict(
+        EmailMessage.objects.filter(created_at__gte=since)
+        .order_by()
+        .values_list("status")
+        .annotate(total=Count("id"))
+    )
+    oldest = (
+        EmailMessage.objects.filter(status=EmailMessage.Status.QUEUED)
+        .order_by("created_at")
+        .values_list("created_at", flat=True)
+        .first()
+    )
+    return {
+        "queued": EmailMessage.objects.filter(status=EmailMessage.Status.QUEUED).count(),
+        "last_24h": {status: counts.get(status, 0) for status in EmailMessage.Status.values},
+        "oldest_queued_seconds": round((timezone.now() - oldest).total_seconds(), 1) if oldest else None,
+    }
+
+
 def send_onboarding_email(user) -> bool:
     """
     Welcome new operators with actionable next steps.
@@ -56,33 +334,8 @@ def send_onboarding_email(user) -> bool:
     if not getattr(user, "email", None):
         return False
 
-    first_name = user.first_name or user.username or "there"
-    subject = "Welcome to ReturnShield — your returns war room is live"
-    html_content = format_html(
-        """
-        <p>Hi {first_name},</p>
-        <p><strong>Welcome to ReturnShield.</strong> You now have the toolkit to
-        protect contribution margin from runaway returns.</p>
-        <p>Here’s how to get value in the next hour:</p>
-        <ol>
-            <li>Connect Shopify to pull 12 months of orders.</li>
-            <li>Switch on automated anomaly alerts for high-risk SKUs.</li>
-            <li>Invite your CX lead so they can deploy the ReturnShield playbooks.</li>
-        </ol>
-        <p>Recover lost revenue faster with these quick wins:</p>
-        <ul>
-            <li><strong>Exchange nudges</strong> convert 2.4× better than refunds.</li>
-            <li><strong>Return reason tagging</strong> spots sizing issues before they snowball.</li>
-            <li><strong>Smart policies</strong> autopilot incentives for VIP shoppers.</li>
-        </ul>
-        <p>Need a hand? Reply to this email and our concierge team will jump in.</p>
-        <p>Talk soon,<br/>ReturnShield Concierge</p>
-        """,
-        first_name=first_name,
+    return queue_email(
+        template=ONBOARDING.key,
+        to_email=user.email,
+        context={"first_name": user.first_name or user.username or "there"},
     )
-    return send_email(
-        to_emails=user.email,
-        subject=subject,
-        html_content=html_content,
-    )
-
@@ -0,0 +1,88 @@
+"""
+Transactional email templates.
+
+Each template can be delivered two ways:
+
+* as a SendGrid dynamic template, when ``settings.SENDGRID_TEMPLATE_IDS`` maps
+  its key to a template ID. SendGrid renders the message, so many recipients
+  fit in one API request (one personalization each).
+* rendered locally from the Django template strings below, compiled once per
+  process.
+"""
+from __future__ import annotations
+
+from dataclasses import dataclass
+from functools import cached_property
+from typing import Any, Dict, Optional, Tuple
+
+from django.conf import settings
+from django.template import Context, engines
+
+
+@dataclass(frozen=True)
+class EmailTemplate:
+    key: str
+    subject: str
+    html: str
+
+    @property
+    def sendgrid_template_id(self) -> Optional[str]:
+        return settings.SENDGRID_TEMPLATE_IDS.get(self.key) or None
+
+    @cached_property
+    def _compiled(self):
+        engine = engines["django"].engine
+        return engine.from_string(self.subject), engine.from_string(self.html)
+
+    def render(self, context: Dict[str, Any]) -> Tuple[str, str]:
+        subject, html = self._compiled
+        # Subjects are plain text, so only the HTML body is autoescaped.
+        return subject.render(Context(context, autoescape=False)).strip(), html.render(Context(context))
+
+
+ONBOARDING = EmailTemplate(
+    key="onboarding",
+    subject="Welcome to ReturnShield — your returns war room is live",
+    html="""
+        <p>Hi {{ first_name }},</p>
+        <p><strong>Welcome to ReturnShield.</strong> You now have the toolkit to
+        protect contribution margin from runaway returns.</p>
+        <p>Here’s how to get value in the next hour:</p>
+        <ol>
+            <li>Connect Shopify to pull 12 months of orders.</li>
+            <li>Switch on automated anomaly alerts for high-risk SKUs.</li>
+            <li>Invite your CX lead so they can deploy the ReturnShield playbooks.</li>
+        </ol>
+        <p>Recover lost revenue faster with these quick wins:</p>
+        <ul>
+            <li><strong>Exchange nudges</strong> convert 2.4× better than refunds.</li>
+            <li><strong>Return reason tagging</strong> spots sizing issues before they snowball.</li>
+            <li><strong>Smart policies</strong> autopilot incentives for VIP shoppers.</li>
+        </ul>
+        <p>Need a hand? Reply to this email and our concierge team will jump in.</p>
+        <p>Talk soon,<br/>ReturnShield Concierge</p>
+        """,
+)
+
+RETURN_CONFIRMATION = EmailTemplate(
+    key="return_confirmation",
+    subject="Return Confirmation - Order #{{ order_number }}",
+    html="""
+    <h1>Return Confirmed</h1>
+    <p>We have received your return request for Order #{{ order_number }}.</p>
+    <p><strong>Status:</strong> {{ status }}</p>
+    <p><strong>Refund Method:</strong> {{ refund_amount }} (Store Credit/Refund)</p>
+
+    <h2>Shipping Label</h2>
+    <p>Please download your shipping label below and attach it to your package:</p>
+    <p><a href="{{ label_url }}" style="background-color: #6366f1; color: white; padding: 10px 20px; text-decoration: none; border-radius: 5px;">Download Shipping Label</a></p>
+
+    <p>Or click here: {{ label_url }}</p>
+
+    <p>Tracking Number: {{ tracking_number }}</p>
+
+    <p>Thank you,<br>ReturnShield Team</p>
+    """,
+)
+
+EMAIL_TEMPLATES = {template.key: template for template in (ONBOARDING, RETURN_CONFIRMATION)}
@@ -1,3 +1,35 @@
 from django.db import models
+from django.utils import timezone
 
-# Create your models here.
+
+class EmailMessage(models.Model):
+    """
+    Outbound transactional email waiting for (or done with) delivery.
+
+    Messages are queued by ``notifications.email.queue_email`` and sent in
+    batches by ``notifications.tasks.flush_email_queue``.
+    """
+
+    class Status(models.TextChoices):
+        QUEUED = "queued", "Queued"
+        SENT = "sent", "Sent"
+        FAILED = "failed", "Failed"
+
+    template = models.CharField(max_length=64, help_text="Key in notifications.email_templates.EMAIL_TEMPLATES.")
+    to_email = models.EmailField()
+    context = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=16, choices=Status.choices, default=Status.QUEUED)
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ("id",)
+        indexes = [
+            models.Index(fields=["status", "next_attempt_at"], name="email_queue_due_idx"),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.template} to {self.to_email} ({self.status})"
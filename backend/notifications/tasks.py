@@ -0,0 +1,44 @@
+"""
+Email delivery tasks.
+"""
+import logging
+import time
+
+from celery import shared_task
+from django.core.cache import cache
+
+from notifications.email import DISPATCH_BATCH_SIZE, FLUSH_SCHEDULED_KEY, dispatch_queued_emails
+
+
+logger = logging.getLogger(__name__)
+
+LOCK_KEY = "notifications:email-flush-lock"
+LOCK_TIMEOUT = 10 * 60
+# Upper bounds per run so one flush cannot monopolise a worker. The time
+# budget leaves room for the last request (15s timeout) inside LOCK_TIMEOUT
+# and the claim lease; anything not reached is left for the next flush.
+MAX_BATCHES_PER_RUN = 20
+RUN_SECONDS = 5 * 60
+
+
+@shared_task(ignore_result=True)
+def flush_email_queue():
+    """
+    Send every due queued email in SendGrid batches.
+    Scheduled shortly after messages are queued and swept every minute by Celery Beat.
+    """
+    # Let the next queue_email schedule a fresh flush for messages that land
+    # after this one has read the queue.
+    cache.delete(FLUSH_SCHEDULED_KEY)
+    if not cache.add(LOCK_KEY, True, LOCK_TIMEOUT):
+        logger.info("Email flush already running; skipping")
+        return
+
+    deadline = time.monotonic() + RUN_SECONDS
+    try:
+        for _ in range(MAX_BATCHES_PER_RUN):
+            totals = dispatch_queued_emails(deadline=deadline)
+            if totals["deferred"] or totals["sent"] + totals["retrying"] + totals["failed"] < DISPATCH_BATCH_SIZE:
+                break
+    finally:
+        cache.delete(LOCK_KEY)
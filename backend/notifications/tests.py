@@ -3,7 +3,8 @@ from unittest import mock
 from django.contrib.auth import get_user_model
 from django.test import TestCase, override_settings
 
-from notifications.email import send_email, send_onboarding_email
+from notifications.email import dispatch_queued_emails, queue_email, send_email, send_onboarding_email
+from notifications.models import EmailMessage
 
 User = get_user_model()
 
@@ -14,10 +15,10 @@ User = get_user_model()
     SENDGRID_FROM_NAME="ReturnShield Concierge",
 )
 class NotificationsEmailTests(TestCase):
-    @mock.patch("notifications.email.SendGridAPIClient")
-    def test_send_email_invokes_sendgrid(self, mock_client_cls):
-        mock_client = mock_client_cls.return_value
-        mock_client.send.return_value.status_code = 202
+    @mock.patch("notifications.email.get_session")
+    def test_send_email_invokes_sendgrid(self, mock_session):
+        mock_client = mock_session.return_value
+        mock_client.post.return_value.status_code = 202
 
         result = send_email(
             to_emails="ops@returnshield.app",
@@ -26,7 +27,10 @@ class NotificationsEmailTests(TestCase):
         )
 
         self.assertTrue(result)
-        mock_client.send.assert_called_once()
+        mock_client.post.assert_called_once()
+        payload = mock_client.post.call_args.kwargs["json"]
+        self.assertEqual(payload["subject"], "Test")
+        self.assertEqual(payload["from"]["email"], "concierge@returnshield.app")
 
     def test_send_email_returns_false_when_disabled(self):
         with override_settings(SENDGRID_API_KEY=""):
@@ -37,8 +41,8 @@ class NotificationsEmailTests(TestCase):
             )
         self.assertFalse(result)
 
-    @mock.patch("notifications.email.send_email", return_value=True)
-    def test_send_onboarding_email_uses_generic_sender(self, mock_send_email):
+    @mock.patch("notifications.email.queue_email", return_value=True)
+    def test_send_onboarding_email_is_queued(self, mock_queue_email):
         user = User.objects.create_user(
             username="brand",
             email="brand@returnshield.app",
@@ -49,4 +53,64 @@ class NotificationsEmailTests(TestCase):
         result = send_onboarding_email(user)
 
         self.assertTrue(result)
-        mock_send_email.assert_called_once()
+        mock_queue_email.assert_called_once_with(
+            template="onboarding", to_email="brand@returnshield.app", context={"first_name": "Avery"}
+        )
+
+    @override_settings(SENDGRID_TEMPLATE_IDS={"return_confirmation": "d-return"})
+    @mock.patch("notifications.email.get_session")
+    def test_queued_emails_batched_into_one_request(self, mock_session):
+        mock_session.return_value.post.return_value.status_code = 202
+        for index in range(3):
+            queue_email(
+                template="return_confirmation",
+                to_email=f"shopper{index}@example.com",
+                context={"order_number": f"100{index}", "label_url": "https://labels.test/1.pdf"},
+            )
+
+        totals = dispatch_queued_emails()
+
+        self.assertEqual(totals["sent"], 3)
+        mock_session.return_value.post.assert_called_once()
+        payload = mock_session.return_value.post.call_args.kwargs["json"]
+        self.assertEqual(payload["template_id"], "d-return")
+        self.assertEqual(len(payload["personalizations"]), 3)
+        self.assertEqual(
+            payload["personalizations"][0]["dynamic_template_data"]["subject"],
+            "Return Confirmation - Order #1000",
+        )
+        self.assertFalse(EmailMessage.objects.exclude(status=EmailMessage.Status.SENT).exists())
+
+    @mock.patch("notifications.email.get_session")
+    def test_failed_send_is_retried_with_backoff(self, mock_session):
+        mock_session.return_value.post.return_value.status_code = 503
+        queue_email(template="onboarding", to_email="ops@returnshield.app", context={"first_name": "Ops"})
+
+        totals = dispatch_queued_emails()
+
+        self.assertEqual(totals["retrying"], 1)
+        message = EmailMessage.objects.get()
+        self.assertEqual(message.status, EmailMessage.Status.QUEUED)
+        self.assertEqual(message.attempts, 1)
+        self.assertGreater(message.next_attempt_at, message.created_at)
+        # Not due yet, so nothing is sent again.
+        self.assertEqual(dispatch_queued_emails()["requests"], 0)
+
+    @mock.patch("notifications.email.get_session")
+    def test_dispatch_claims_messages_and_releases_those_past_the_deadline(self, mock_session):
+        mock_session.return_value.post.return_value.status_code = 202
+        for index in range(2):
+            queue_email(template="onboarding", to_email=f"ops{index}@returnshield.app", context={"first_name": "Ops"})
+
+        def post(*args, **kwargs):
+            # An overlapping dispatch started mid-batch finds nothing to send.
+            self.assertEqual(dispatch_queued_emails(deadline=0)["requests"], 0)
+            return mock.Mock(status_code=202)
+
+        mock_session.return_value.post.side_effect = post
+        with mock.patch("notifications.email.time.monotonic", side_effect=[0, 10]):
+            totals = dispatch_queued_emails(deadline=5)
+
+        self.assertEqual((totals["sent"], totals["deferred"], totals["requests"]), (1, 1, 1))
+        self.assertEqual(EmailMessage.objects.filter(status=EmailMessage.Status.QUEUED).count(), 1)
+        self.assertEqual(dispatch_queued_emails()["sent"], 1)
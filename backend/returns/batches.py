@@ -0,0 +1,208 @@
+"""
+Bulk return label purchasing.
+
+A ``LabelBatch`` is created from the API and processed by
+``returns.tasks.run_label_batch``. Labels are bought with bounded concurrency
+against EasyPost's single-shipment API: worker threads only talk to
+EasyPost, while the task thread owns every database write. Each item's
+outcome is recorded as soon as it is known, so labels already paid for are
+never bought again; progress counters, label storage and confirmation
+emails are flushed in batches. Failed items are recorded with their error
+and can be retried without re-buying labels that succeeded.
+
+A batch whose worker died (hard time limit, OOM, deploy) stays ``running``
+until it is older than the task time limit plus ``STALE_GRACE_SECONDS``;
+after that it is reclaimed by the next run, the retry endpoint or the
+``reclaim_stale_label_batches`` sweep.
+"""
+from __future__ import annotations
+
+import logging
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import timedelta
+from typing import Iterable, List, Optional
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F, Q
+from django.utils import timezone
+
+from .models import LabelBatch, LabelBatchItem, ReturnRequest
+from .labels import schedule_label_store
+from .shipping import get_easypost_client, get_parcel_id, get_warehouse_address_id, purchase_label
+
+logger = logging.getLogger(__name__)
+
+# Progress becomes visible (and emails go out) every this many labels.
+PROGRESS_FLUSH_EVERY = 25
+# A running batch whose task would have hit its hard time limit this long ago
+# has lost its worker.
+STALE_GRACE_SECONDS = 5 * 60
+
+
+def _stale_before():
+    return timezone.now() - timedelta(seconds=settings.CELERY_TASK_TIME_LIMIT + STALE_GRACE_SECONDS)
+
+
+def is_stale(batch: LabelBatch) -> bool:
+    return batch.status == 'running' and batch.started_at is not None and batch.started_at < _stale_before()
+
+
+def create_label_batch(user, return_ids: Iterable[int]) -> LabelBatch:
+    """Create a batch for the merchant's returns and enqueue it once committed."""
+    returns = list(ReturnRequest.objects.filter(user=user, pk__in=set(return_ids)).only("pk", "shipping_label_url"))
+    if not returns:
+        raise ValueError("No matching returns found.")
+    batch = LabelBatch.objects.create(user=user, total=len(returns))
+    items = [
+        LabelBatchItem(
+            batch=batch,
+            return_request=return_request,
+            # Returns that already have a label are not bought twice.
+            status='skipped' if return_request.shipping_label_url else 'pending',
+        )
+        for return_request in returns
+    ]
+    LabelBatchItem.objects.bulk_create(items)
+    skipped = sum(1 for item in items if item.status == 'skipped')
+    if skipped:
+        LabelBatch.objects.filter(pk=batch.pk).update(succeeded=skipped)
+        batch.succeeded = skipped
+    _enqueue(batch)
+    return batch
+
+
+def retry_failed_items(batch: LabelBatch) -> int:
+    """
+    Reset failed items to pending and re-run the batch. Returns the number reset.
+
+    A stale ``running`` batch is re-run as well, so its unfinished items complete.
+    """
+    stale = is_stale(batch)
+    if batch.status == 'pending' or (batch.status == 'running' and not stale):
+        raise ValueError("Batch is still in progress.")
+    with transaction.atomic():
+        reset = batch.items.filter(status='failed').update(status='pending', error='')
+        if reset or stale:
+            # Counters are recounted from the items when the batch is claimed.
+            LabelBatch.objects.filter(pk=batch.pk).update(status='pending', finished_at=None)
+    if reset or stale:
+        _enqueue(batch)
+    return reset
+
+
+def reclaim_stale_batches() -> List[int]:
+    """Re-enqueue running batches whose worker died. Returns their IDs."""
+    stale_ids = list(
+        LabelBatch.objects.filter(status='running', started_at__lt=_stale_before()).values_list('pk', flat=True)
+    )
+    for batch_id in stale_ids:
+        logger.warning("Label batch %s has been running since before the time limit; reclaiming", batch_id)
+        _enqueue(LabelBatch(pk=batch_id))
+    return stale_ids
+
+
+def _enqueue(batch: LabelBatch) -> None:
+    from .tasks import run_label_batch
+
+    transaction.on_commit(lambda: run_label_batch.delay(batch.pk))
+
+
+def _record(item: LabelBatchItem) -> None:
+    """Persist one item's outcome (and its label) before the next result is handled."""
+    with transaction.atomic():
+        item.save(update_fields=['status', 'error', 'attempts'])
+        if item.status == 'purchased':
+            item.return_request.save(
+                update_fields=['shipping_label_url', 'tracking_number', 'easypost_shipment_id']
+            )
+
+
+def _recount(batch_id: int) -> None:
+    # After a reclaim the counters may lag items recorded by the dead worker.
+    counts = LabelBatchItem.objects.filter(batch_id=batch_id).aggregate(
+        succeeded=Count('pk', filter=Q(status__in=['purchased', 'skipped'])),
+        failed=Count('pk', filter=Q(status='failed')),
+    )
+    LabelBatch.objects.filter(pk=batch_id).update(**counts)
+
+
+def _flush(batch_id: int, done: List[LabelBatchItem]) -> None:
+    if not done:
+        return
+    purchased = [item for item in done if item.status == 'purchased']
+    with transaction.atomic():
+        LabelBatch.objects.filter(pk=batch_id).update(
+            succeeded=F('succeeded') + len(purchased),
+            failed=F('failed') + len(done) - len(purchased),
+        )
+    schedule_label_store([item.return_request_id for item in purchased])
+
+    from returns.email import send_return_confirmation_email
+
+    for item in purchased:
+        return_request = item.return_request
+        send_return_confirmation_email(return_request.order.customer_email, return_request)
+
+
+def process_label_batch(batch_id: int) -> Optional[LabelBatch]:
+    """
+    Buy labels for every pending item of the batch. Returns ``None`` if it is
+    already running and not stale.
+    """
+    claimed = LabelBatch.objects.filter(
+        Q(status='pending') | Q(status='running', started_at__lt=_stale_before()), pk=batch_id
+    ).update(status='running', started_at=timezone.now())
+    if not claimed:
+        return None
+    _recount(batch_id)
+    items = list(
+        LabelBatchItem.objects.filter(batch_id=batch_id, status='pending').select_related(
+            'return_request__order'
+        )
+    )
+
+    if items:
+        client = get_easypost_client()
+        # Warm the shared IDs once instead of racing to create them from every thread.
+        get_warehouse_address_id(client)
+        get_parcel_id(client)
+
+        done: List[LabelBatchItem] = []
+        workers = max(1, min(settings.EASYPOST_BATCH_CONCURRENCY, len(items)))
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='label-batch') as pool:
+            futures = {
+                pool.submit(purchase_label, client, item.return_request.order): item for item in items
+            }
+            for future in as_completed(futures):
+                item = futures[future]
+                item.attempts += 1
+                try:
+                    label_url, tracking_number, shipment_id = future.result()
+                except Exception as exc:
+                    logger.warning("Label purchase failed for return %s: %s", item.return_request_id, exc)
+                    item.status = 'failed'
+                    item.error = str(exc)[:2000]
+                else:
+                    item.status = 'purchased'
+                    item.error = ''
+                    item.return_request.shipping_label_url = label_url
+                    item.return_request.tracking_number = tracking_number
+                    item.return_request.easypost_shipment_id = shipment_id
+                _record(item)
+                done.append(item)
+                if len(done) >= PROGRESS_FLUSH_EVERY:
+                    _flush(batch_id, done)
+                    done = []
+        _flush(batch_id, done)
+
+    batch = LabelBatch.objects.get(pk=batch_id)
+    if batch.failed == 0:
+        batch.status = 'completed'
+    elif batch.succeeded == 0:
+        batch.status = 'failed'
+    else:
+        batch.status = 'completed_with_errors'
+    batch.finished_at = timezone.now()
+    batch.save(update_fields=['status', 'finished_at'])
+    return batch
@@ -0,0 +1,208 @@
+"""
+Benchmarks for the insight builders and analytics endpoints.
+
+Each benchmark runs against a synthetic dataset (see ``returns.synthetic``)
+of a given number of returns and records wall time, peak Python memory and
+query count. Results are compared with the committed baseline
+(``benchmarks/baseline.json``) so regressions show up as deltas. Run them
+with ``manage.py run_benchmarks``.
+"""
+from __future__ import annotations
+
+import json
+import math
+import platform
+import time
+import tracemalloc
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+from django.conf import settings
+from django.db import connection
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from analytics.views import CohortAnalysisView, ProfitabilityImpactView, ReturnReasonAnalyticsView
+from core.query_budget import QueryCounter
+
+from .models import ReturnRequest
+from .synthetic import DatasetSpec, generate_dataset, merchant_queryset
+from .utils import build_exchange_coach_actions, build_returnless_insights, build_vip_resolution_queue
+
+BASELINE_PATH = Path(settings.BASE_DIR) / "benchmarks" / "baseline.json"
+SIZES = {"10k": 10_000, "100k": 100_000, "1m": 1_000_000}
+DATASET_PREFIX = "benchmark"
+# Benchmark datasets use a high return rate so a million returns does not
+# need five million orders.
+DATASET_RETURN_RATE = 0.5
+DATASET_MERCHANTS = 10
+METRICS = ("wall_ms", "peak_mb", "queries")
+# Relative changes below these absolute values are noise, not regressions.
+NOISE_FLOOR = {"wall_ms": 5.0, "peak_mb": 1.0}
+
+
+@dataclass
+class Benchmark:
+    name: str
+    run: Callable[[Any], Any]
+
+
+def _view(view_class) -> Callable[[Any], Any]:
+    factory = APIRequestFactory()
+
+    def run(merchant):
+        request = factory.get("/")
+        force_authenticate(request, user=merchant)
+        # Throttling is not what is being measured and needs a shared cache.
+        response = view_class.as_view(throttle_classes=[])(request)
+        response.render()
+        return response
+
+    return run
+
+
+BENCHMARKS = [
+    Benchmark("returnless_insights", lambda merchant: build_returnless_insights()),
+    Benchmark("exchange_coach_actions", lambda merchant: build_exchange_coach_actions()),
+    Benchmark("vip_resolution_queue", lambda merchant: build_vip_resolution_queue()),
+    Benchmark("analytics_reasons", _view(ReturnReasonAnalyticsView)),
+    Benchmark("analytics_cohorts", _view(CohortAnalysisView)),
+    Benchmark("analytics_profitability", _view(ProfitabilityImpactView)),
+]
+
+
+def seed_dataset(returns: int, seed: int = 0, progress: Optional[Callable[[str], None]] = None) -> int:
+    """Top the benchmark dataset up to ``returns`` returns. Returns the number now present."""
+    existing = ReturnRequest.objects.count()
+    missing = returns - existing
+    if missing > 0:
+        orders = math.ceil(missing / DATASET_RETURN_RATE / DATASET_MERCHANTS)
+        generate_dataset(
+            DatasetSpec(
+                merchants=DATASET_MERCHANTS,
+                orders_per_merchant=orders,
+                return_rate=DATASET_RETURN_RATE,
+                prefix=DATASET_PREFIX,
+                # A different seed per top-up keeps the added rows distinct.
+                seed=seed + existing,
+            ),
+            progress=progress,
+        )
+    return ReturnRequest.objects.count()
+
+
+def measure(benchmark: Benchmark, merchant, repeat: int = 3) -> Dict[str, float]:
+    """Best wall time of ``repeat`` runs, then one traced run for peak memory."""
+    counter = QueryCounter()
+    timings: List[float] = []
+    for _ in range(repeat):
+        counter.count = 0
+        with connection.execute_wrapper(counter):
+            started = time.perf_counter()
+            benchmark.run(merchant)
+            timings.append(time.perf_counter() - started)
+    queries = counter.count
+
+    # tracemalloc slows execution down, so memory is measured separately.
+    tracemalloc.start()
+    try:
+        benchmark.run(merchant)
+        _current, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        "wall_ms": round(min(timings) * 1000, 2),
+        "peak_mb": round(peak / (1024 * 1024), 2),
+        "queries": queries,
+    }
+
+
+def run_benchmarks(
+    sizes: List[str],
+    names: Optional[List[str]] = None,
+    repeat: int = 3,
+    progress: Optional[Callable[[str], None]] = None,
+) -> Dict[str, Any]:
+    """Seed each dataset size in turn (smallest first) and measure every selected benchmark."""
+    selected = [benchmark for benchmark in BENCHMARKS if not names or benchmark.name in names]
+    results: Dict[str, Dict[str, Dict[str, float]]] = {}
+    for size in sorted(sizes, key=SIZES.__getitem__):
+        seed_dataset(SIZES[size], progress=progress)
+        merchant = merchant_queryset(DATASET_PREFIX).order_by("pk").first()
+        results[size] = {}
+        for benchmark in selected:
+            results[size][benchmark.name] = measure(benchmark, merchant, repeat=repeat)
+            if progress:
+                progress(f"{size} {benchmark.name}: {results[size][benchmark.name]}")
+    return {
+        "environment": {
+            "python": platform.python_version(),
+            "database": connection.vendor,
+            "repeat": repeat,
+        },
+        "results": results,
+    }
+
+
+def load_baseline(path: Path = BASELINE_PATH) -> Optional[Dict[str, Any]]:
+    if not path.exists():
+        return None
+    return json.loads(path.read_text())
+
+
+def save_baseline(report: Dict[str, Any], path: Path = BASELINE_PATH) -> None:
+    """Merge ``report`` into the baseline, keeping sizes that were not re-run."""
+    baseline = load_baseline(path) or {"results": {}}
+    baseline["environment"] = report["environment"]
+    for size, benchmarks in report["results"].items():
+        baseline["results"].setdefault(size, {}).update(benchmarks)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(baseline, indent=2, sort_keys=True) + "\n")
+
+
+def compare(report: Dict[str, Any], baseline: Optional[Dict[str, Any]], threshold: float = 0.2) -> List[Dict[str, Any]]:
+    """
+    Rows of current vs baseline values per size, benchmark and metric.
+
+    A metric regresses when it grows by more than ``threshold`` (a fraction)
+    over the baseline; any extra query counts as a regression.
+    """
+    rows = []
+    baseline_results = (baseline or {}).get("results", {})
+    for size, benchmarks in report["results"].items():
+        for name, metrics in benchmarks.items():
+            previous = baseline_results.get(size, {}).get(name, {})
+            for metric in METRICS:
+                current = metrics[metric]
+                before = previous.get(metric)
+                delta = None if not before else (current - before) / before
+                if metric == "queries":
+                    regressed = before is not None and current > before
+                else:
+                    regressed = delta is not None and delta > threshold and current > NOISE_FLOOR[metric]
+                rows.append(
+                    {
+                        "size": size,
+                        "benchmark": name,
+                        "metric": metric,
+                        "baseline": before,
+                        "current": current,
+                        "delta": delta,
+                        "regressed": regressed,
+                    }
+                )
+    return rows
+
+
+def format_report(rows: List[Dict[str, Any]]) -> str:
+    lines = [f"{'size':<6} {'benchmark':<26} {'metric':<8} {'baseline':>12} {'current':>12} {'delta':>9}"]
+    for row in rows:
+        baseline = "-" if row["baseline"] is None else f"{row['baseline']:g}"
+        delta = "-" if row["delta"] is None else f"{row['delta']:+.1%}"
+        flag = "  REGRESSION" if row["regressed"] else ""
+        lines.append(
+            f"{row['size']:<6} {row['benchmark']:<26} {row['metric']:<8} "
+            f"{baseline:>12} {row['current']:>12g} {delta:>9}{flag}"
+        )
+    return "\n".join(lines)
@@ -0,0 +1,197 @@
+"""
+Return label store.
+
+Carrier label URLs are slow, expire, and were hit again every time a shopper
+re-opened a confirmation email. Labels are instead downloaded once into the
+``labels`` storage (see ``settings.STORAGES``) and served by
+``LabelDownloadView`` with long-lived caching headers. Other formats are
+converted on first request through EasyPost's label endpoint and stored
+alongside the original, so every later download is served locally.
+"""
+from __future__ import annotations
+
+import hashlib
+import logging
+from typing import Optional
+
+from django.conf import settings
+from django.core import signing
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import storages
+from django.db import IntegrityError, transaction
+from django.urls import reverse
+
+from core.http import get_session
+
+from .models import LabelFile, ReturnRequest
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPES = {
+    "pdf": "application/pdf",
+    "png": "image/png",
+    "zpl": "application/zpl",
+}
+# Attribute of EasyPost's PostageLabel holding each format's URL.
+EASYPOST_LABEL_ATTRIBUTES = {
+    "pdf": "label_pdf_url",
+    "png": "label_url",
+    "zpl": "label_zpl_url",
+}
+TOKEN_SALT = "returns.label"
+# Stored labels are immutable; a new label gets a new path and digest.
+LABEL_CACHE_CONTROL = "private, max-age=31536000, immutable"
+META_CACHE_TIMEOUT = 24 * 60 * 60
+DOWNLOAD_TIMEOUT = 20
+
+
+class LabelUnavailable(Exception):
+    """The return has no label, or it cannot be produced in the requested format."""
+
+
+def label_storage():
+    return storages["labels"]
+
+
+def label_token(return_request: ReturnRequest) -> str:
+    return signing.dumps(return_request.pk, salt=TOKEN_SALT)
+
+
+def return_id_from_token(token: str) -> Optional[int]:
+    try:
+        return int(signing.loads(token, salt=TOKEN_SALT))
+    except (signing.BadSignature, TypeError, ValueError):
+        return None
+
+
+def label_download_url(return_request: ReturnRequest, file_format: Optional[str] = None) -> Optional[str]:
+    """Public, unguessable URL of the re-hosted label, or ``None`` without a label."""
+    if not return_request.shipping_label_url:
+        return None
+    token = label_token(return_request)
+    if file_format:
+        path = reverse("returns:label-download-format", args=[token, file_format])
+    else:
+        path = reverse("returns:label-download", args=[token])
+    return f"{settings.BACKEND_URL}{path}"
+
+
+def _meta_cache_key(return_id: int, file_format: str) -> str:
+    return f"returns:label-file:{return_id}:{file_format}"
+
+
+def _detect_format(content_type: str, url: str) -> str:
+    content_type = content_type.split(";")[0].strip().lower()
+    for file_format, known in CONTENT_TYPES.items():
+        if content_type == known:
+            return file_format
+    suffix = url.split("?")[0].rsplit(".", 1)[-1].lower()
+    if suffix in CONTENT_TYPES:
+        return suffix
+    if "zpl" in content_type:
+        return "zpl"
+    raise LabelUnavailable(f"Unrecognised label content type {content_type!r}")
+
+
+def _download(url: str) -> tuple[bytes, str]:
+    response = get_session().get(url, timeout=DOWNLOAD_TIMEOUT)
+    response.raise_for_status()
+    return response.content, response.headers.get("Content-Type", "")
+
+
+def _save(return_request: ReturnRequest, file_format: str, content: bytes, source_url: str) -> LabelFile:
+    digest = hashlib.sha256(content).hexdigest()
+    path = label_storage().save(f"{return_request.pk}/{digest[:16]}.{file_format}", ContentFile(content))
+    try:
+        return LabelFile.objects.create(
+            return_request=return_request,
+            file_format=file_format,
+            path=path,
+            content_type=CONTENT_TYPES[file_format],
+            sha256=digest,
+            size=len(content),
+            source_url=source_url,
+        )
+    except IntegrityError:
+        # Another request stored the same format first; keep theirs.
+        label_storage().delete(path)
+        return LabelFile.objects.get(return_request=return_request, file_format=file_format)
+
+
+def store_original(return_request: ReturnRequest) -> LabelFile:
+    """Download the carrier's label once and keep it in the label store."""
+    existing = return_request.label_files.order_by("pk").first()
+    if existing is not None:
+        return existing
+    if not return_request.shipping_label_url:
+        raise LabelUnavailable("Return has no label.")
+
+    content, content_type = _download(return_request.shipping_label_url)
+    file_format = _detect_format(content_type, return_request.shipping_label_url)
+    return _save(return_request, file_format, content, return_request.shipping_label_url)
+
+
+def _convert(return_request: ReturnRequest, file_format: str) -> LabelFile:
+    if not (settings.EASYPOST_API_KEY and return_request.easypost_shipment_id):
+        raise LabelUnavailable(f"Label is not available as {file_format}.")
+
+    from .shipping import get_easypost_client
+
+    shipment = get_easypost_client().shipment.label(
+        return_request.easypost_shipment_id, file_format=file_format.upper()
+    )
+    url = getattr(shipment.postage_label, EASYPOST_LABEL_ATTRIBUTES[file_format], None)
+    if not url:
+        raise LabelUnavailable(f"EasyPost did not return a {file_format} label.")
+    content, _content_type = _download(url)
+    return _save(return_request, file_format, content, url)
+
+
+def get_label_file(return_request: ReturnRequest, file_format: Optional[str] = None) -> LabelFile:
+    """
+    Return the stored label in ``file_format`` (default: the original),
+    downloading or converting it the first time it is asked for.
+    """
+    if file_format is not None and file_format not in CONTENT_TYPES:
+        raise LabelUnavailable(f"Unsupported label format {file_format!r}.")
+
+    original = store_original(return_request)
+    if file_format is None or file_format == original.file_format:
+        return original
+
+    label_file = LabelFile.objects.filter(return_request=return_request, file_format=file_format).first()
+    return label_file or _convert(return_request, file_format)
+
+
+def get_label_meta(return_id: int, file_format: Optional[str]) -> dict:
+    """
+    Cached description (path, content type, digest) of a stored label, so
+    repeat downloads cost one cache read plus a storage read.
+    """
+    key = _meta_cache_key(return_id, file_format or "original")
+    meta = cache.get(key)
+    if meta is None:
+        try:
+            return_request = ReturnRequest.objects.get(pk=return_id)
+        except ReturnRequest.DoesNotExist:
+            raise LabelUnavailable("Return not found.")
+        label_file = get_label_file(return_request, file_format)
+        meta = {
+            "path": label_file.path,
+            "content_type": label_file.content_type,
+            "sha256": label_file.sha256,
+            "file_format": label_file.file_format,
+            "size": label_file.size,
+        }
+        cache.set(key, meta, META_CACHE_TIMEOUT)
+    return meta
+
+
+def schedule_label_store(return_ids) -> None:
+    """Pre-store freshly purchased labels in the background once the transaction commits."""
+    from .tasks import store_return_labels
+
+    return_ids = list(return_ids)
+    if return_ids:
+        transaction.on_commit(lambda: store_return_labels.delay(return_ids))
@@ -0,0 +1,89 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from returns.synthetic import DatasetSpec, generate_dataset, merchant_queryset
+
+
+def _rate(value):
+    rate = float(value)
+    if not 0 <= rate <= 1:
+        raise ValueError(value)
+    return rate
+
+
+class Command(BaseCommand):
+    help = "Generate synthetic merchants, orders and returns for load and performance testing."
+
+    def add_arguments(self, parser):
+        defaults = DatasetSpec()
+        parser.add_argument("--merchants", type=int, default=defaults.merchants, help="Merchants to create.")
+        parser.add_argument(
+            "--orders", type=int, default=defaults.orders_per_merchant, help="Orders per merchant."
+        )
+        parser.add_argument("--skus", type=int, default=defaults.skus, help="SKUs in the shared catalog.")
+        parser.add_argument(
+            "--sku-skew",
+            type=float,
+            default=defaults.sku_skew,
+            help="Zipf exponent of SKU popularity (0 = uniform).",
+        )
+        parser.add_argument(
+            "--max-line-items", type=int, default=defaults.max_line_items, help="Maximum line items per order."
+        )
+        parser.add_argument(
+            "--return-rate", type=_rate, default=defaults.return_rate, help="Share of orders with a return."
+        )
+        parser.add_argument(
+            "--refund-rate",
+            type=_rate,
+            default=defaults.refund_rate,
+            help="Share of returns resolved as refunds instead of exchanges.",
+        )
+        parser.add_argument("--gift-rate", type=_rate, default=defaults.gift_rate, help="Share of gift returns.")
+        parser.add_argument(
+            "--repeat-customer-rate",
+            type=_rate,
+            default=defaults.repeat_customer_rate,
+            help="Chance an order comes from an existing customer.",
+        )
+        parser.add_argument("--days", type=int, default=defaults.days, help="Spread orders over this many days.")
+        parser.add_argument("--seed", type=int, default=defaults.seed, help="Random seed.")
+        parser.add_argument(
+            "--prefix", default=defaults.prefix, help="Username prefix identifying synthetic merchants."
+        )
+        parser.add_argument("--batch-size", type=int, default=defaults.batch_size, help="Rows per bulk insert.")
+        parser.add_argument(
+            "--clear", action="store_true", help="Delete existing synthetic merchants (and their data) first."
+        )
+
+    def handle(self, *args, **options):
+        if options["merchants"] < 1 or options["orders"] < 0 or options["skus"] < 1 or options["max_line_items"] < 1:
+            raise CommandError("--merchants, --skus and --max-line-items must be at least 1.")
+        if options["batch_size"] < 1 or options["days"] < 1:
+            raise CommandError("--batch-size and --days must be at least 1.")
+
+        if options["clear"]:
+            deleted, _ = merchant_queryset(options["prefix"]).delete()
+            self.stdout.write(f"Deleted {deleted} existing synthetic rows.")
+
+        spec = DatasetSpec(
+            merchants=options["merchants"],
+            orders_per_merchant=options["orders"],
+            skus=options["skus"],
+            sku_skew=options["sku_skew"],
+            max_line_items=options["max_line_items"],
+            return_rate=options["return_rate"],
+            refund_rate=options["refund_rate"],
+            gift_rate=options["gift_rate"],
+            repeat_customer_rate=options["repeat_customer_rate"],
+            days=options["days"],
+            seed=options["seed"],
+            prefix=options["prefix"],
+            batch_size=options["batch_size"],
+        )
+        progress = self.stdout.write if options["verbosity"] > 1 else None
+        totals = generate_dataset(spec, progress=progress)
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Created {totals['merchants']} merchants, {totals['orders']} orders and {totals['returns']} returns."
+            )
+        )
@@ -0,0 +1,82 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from returns.benchmarks import (
+    BASELINE_PATH,
+    BENCHMARKS,
+    SIZES,
+    compare,
+    format_report,
+    load_baseline,
+    run_benchmarks,
+    save_baseline,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark the returns insight builders and analytics views against synthetic datasets "
+        "and compare the results with the committed baseline."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--sizes", default="10k,100k", help=f"Comma-separated dataset sizes ({', '.join(SIZES)})."
+        )
+        parser.add_argument(
+            "--only", default="", help="Comma-separated benchmark names (default: all)."
+        )
+        parser.add_argument("--repeat", type=int, default=3, help="Timed runs per benchmark; the best is kept.")
+        parser.add_argument(
+            "--threshold",
+            type=float,
+            default=0.2,
+            help="Relative growth in wall time or memory reported as a regression.",
+        )
+        parser.add_argument("--output", help="Also write the raw results to this JSON file.")
+        parser.add_argument("--save-baseline", action="store_true", help=f"Merge the results into {BASELINE_PATH}.")
+        parser.add_argument(
+            "--fail-on-regression", action="store_true", help="Exit with an error if any metric regressed."
+        )
+        parser.add_argument(
+            "--keepdb",
+            action="store_true",
+            help="Keep the benchmark database (and its seeded data) for the next run.",
+        )
+
+    def handle(self, *args, **options):
+        sizes = [size.strip().lower() for size in options["sizes"].split(",") if size.strip()]
+        unknown = set(sizes) - set(SIZES)
+        if unknown:
+            raise CommandError(f"Unknown sizes: {', '.join(sorted(unknown))}")
+        names = [name.strip() for name in options["only"].split(",") if name.strip()]
+        unknown = set(names) - {benchmark.name for benchmark in BENCHMARKS}
+        if unknown:
+            raise CommandError(f"Unknown benchmarks: {', '.join(sorted(unknown))}")
+
+        progress = self.stdout.write if options["verbosity"] > 1 else None
+        # Benchmarks read every return in the database, so they run in a
+        # separate database that only holds the synthetic dataset.
+        old_name = connection.creation.create_test_db(
+            verbosity=options["verbosity"], autoclobber=True, keepdb=options["keepdb"]
+        )
+        try:
+            report = run_benchmarks(sizes, names=names, repeat=options["repeat"], progress=progress)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=options["verbosity"], keepdb=options["keepdb"])
+
+        rows = compare(report, load_baseline(), threshold=options["threshold"])
+        self.stdout.write(format_report(rows))
+
+        if options["output"]:
+            with open(options["output"], "w") as handle:
+                json.dump(report, handle, indent=2, sort_keys=True)
+        if options["save_baseline"]:
+            save_baseline(report)
+            self.stdout.write(self.style.SUCCESS(f"Baseline updated: {BASELINE_PATH}"))
+
+        regressions = [row for row in rows if row["regressed"]]
+        if regressions and options["fail_on_regression"]:
+            raise CommandError(f"{len(regressions)} benchmark metrics regressed.")
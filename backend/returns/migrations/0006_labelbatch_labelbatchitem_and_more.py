@@ -0,0 +1,53 @@
+# Generated by Django 5.2.8 on 2026-10-19 16:22
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('returns', '0005_returnrequest_automation_rule_applied_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LabelBatch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('running', 'Running'), ('completed', 'Completed'), ('completed_with_errors', 'Completed with errors'), ('failed', 'Failed')], default='pending', max_length=32)),
+                ('total', models.PositiveIntegerField(default=0)),
+                ('succeeded', models.PositiveIntegerField(default=0)),
+                ('failed', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='label_batches', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='LabelBatchItem',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('purchased', 'Purchased'), ('skipped', 'Skipped'), ('failed', 'Failed')], default='pending', max_length=16)),
+                ('error', models.TextField(blank=True)),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('batch', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='items', to='returns.labelbatch')),
+                ('return_request', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='label_batch_items', to='returns.returnrequest')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='labelbatch',
+            index=models.Index(fields=['user', 'created_at'], name='returns_lab_user_id_fc7773_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='labelbatchitem',
+            index=models.Index(fields=['batch', 'status'], name='returns_lab_batch_i_10a186_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='labelbatchitem',
+            constraint=models.UniqueConstraint(fields=('batch', 'return_request'), name='unique_label_batch_item'),
+        ),
+    ]
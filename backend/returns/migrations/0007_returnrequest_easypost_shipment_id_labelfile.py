@@ -0,0 +1,36 @@
+# Generated by Django 5.2.8 on 2026-10-19 16:24
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('returns', '0006_labelbatch_labelbatchitem_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='returnrequest',
+            name='easypost_shipment_id',
+            field=models.CharField(blank=True, max_length=64),
+        ),
+        migrations.CreateModel(
+            name='LabelFile',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('file_format', models.CharField(choices=[('pdf', 'PDF'), ('png', 'PNG'), ('zpl', 'ZPL')], max_length=8)),
+                ('path', models.CharField(help_text="Name within the 'labels' storage", max_length=255)),
+                ('content_type', models.CharField(max_length=100)),
+                ('sha256', models.CharField(max_length=64)),
+                ('size', models.PositiveIntegerField(default=0)),
+                ('source_url', models.URLField(blank=True, max_length=1000)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('return_request', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='label_files', to='returns.returnrequest')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('return_request', 'file_format'), name='unique_label_file_format')],
+            },
+        ),
+    ]
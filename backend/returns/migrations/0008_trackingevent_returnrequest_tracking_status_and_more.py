@@ -0,0 +1,47 @@
+# Generated by Django 5.2.8 on 2026-10-19 16:28
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('automation', '0001_initial'),
+        ('returns', '0007_returnrequest_easypost_shipment_id_labelfile'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TrackingEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('event_id', models.CharField(max_length=255, unique=True)),
+                ('tracking_code', models.CharField(max_length=100)),
+                ('status', models.CharField(max_length=32)),
+                ('carrier_updated_at', models.DateTimeField(help_text='When the carrier reported this status')),
+                ('payload', models.JSONField(default=dict)),
+                ('received_at', models.DateTimeField(auto_now_add=True)),
+                ('processed_at', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='returnrequest',
+            name='tracking_status',
+            field=models.CharField(blank=True, choices=[('unknown', 'Unknown'), ('pre_transit', 'Pre-transit'), ('in_transit', 'In transit'), ('out_for_delivery', 'Out for delivery'), ('available_for_pickup', 'Available for pickup'), ('delivered', 'Delivered'), ('return_to_sender', 'Return to sender'), ('failure', 'Failure'), ('cancelled', 'Cancelled'), ('error', 'Error')], max_length=32),
+        ),
+        migrations.AddField(
+            model_name='returnrequest',
+            name='tracking_updated_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='returnrequest',
+            index=models.Index(fields=['tracking_number'], name='returns_ret_trackin_6caa0b_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='trackingevent',
+            index=models.Index(fields=['processed_at', 'received_at'], name='returns_tra_process_0cf77c_idx'),
+        ),
+    ]
@@ -50,6 +50,20 @@ class ReturnRequest(models.Model):
         ('completed', 'Completed'),
     ]
 
+    # EasyPost tracker statuses, see returns.tracking for the transitions.
+    TRACKING_STATUS_CHOICES = [
+        ('unknown', 'Unknown'),
+        ('pre_transit', 'Pre-transit'),
+        ('in_transit', 'In transit'),
+        ('out_for_delivery', 'Out for delivery'),
+        ('available_for_pickup', 'Available for pickup'),
+        ('delivered', 'Delivered'),
+        ('return_to_sender', 'Return to sender'),
+        ('failure', 'Failure'),
+        ('cancelled', 'Cancelled'),
+        ('error', 'Error'),
+    ]
+
     order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='returns')
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
 
@@ -83,6 +97,9 @@ class ReturnRequest(models.Model):
     # Shipping
     shipping_label_url = models.URLField(blank=True, null=True)
     tracking_number = models.CharField(max_length=100, blank=True, null=True)
+    easypost_shipment_id = models.CharField(max_length=64, blank=True)
+    tracking_status = models.CharField(max_length=32, choices=TRACKING_STATUS_CHOICES, blank=True)
+    tracking_updated_at = models.DateTimeField(null=True, blank=True)
 
     # Items being returned
     items = models.JSONField(default=list, help_text="List of items being returned")
@@ -91,7 +108,122 @@ class ReturnRequest(models.Model):
         indexes = [
             models.Index(fields=['user', 'status']),
             models.Index(fields=['created_at']),
+            models.Index(fields=['tracking_number']),
         ]
 
     def __str__(self):
         return f"Return for Order {self.order.external_id}"
+
+
+class TrackingEvent(models.Model):
+    """
+    EasyPost tracker webhook events, stored once per event id.
+
+    The webhook only records events; returns.tracking applies them to
+    returns in batches.
+    """
+
+    event_id = models.CharField(max_length=255, unique=True)
+    tracking_code = models.CharField(max_length=100)
+    status = models.CharField(max_length=32)
+    carrier_updated_at = models.DateTimeField(help_text="When the carrier reported this status")
+    payload = models.JSONField(default=dict)
+    received_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['processed_at', 'received_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.event_id} ({self.tracking_code}: {self.status})"
+
+
+class LabelBatch(models.Model):
+    """Bulk label purchase for many return requests, run by returns.tasks.run_label_batch."""
+
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('completed', 'Completed'),
+        ('completed_with_errors', 'Completed with errors'),
+        ('failed', 'Failed'),
+    ]
+
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='label_batches')
+    status = models.CharField(max_length=32, choices=STATUS_CHOICES, default='pending')
+    total = models.PositiveIntegerField(default=0)
+    succeeded = models.PositiveIntegerField(default=0)
+    failed = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'created_at']),
+        ]
+
+    def __str__(self):
+        return f"Label batch {self.pk} ({self.status})"
+
+
+class LabelBatchItem(models.Model):
+    """One return request within a LabelBatch."""
+
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('purchased', 'Purchased'),
+        ('skipped', 'Skipped'),
+        ('failed', 'Failed'),
+    ]
+
+    batch = models.ForeignKey(LabelBatch, on_delete=models.CASCADE, related_name='items')
+    return_request = models.ForeignKey(ReturnRequest, on_delete=models.CASCADE, related_name='label_batch_items')
+    status = models.CharField(max_length=16, choices=STATUS_CHOICES, default='pending')
+    error = models.TextField(blank=True)
+    attempts = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['batch', 'return_request'], name='unique_label_batch_item'),
+        ]
+        indexes = [
+            models.Index(fields=['batch', 'status']),
+        ]
+
+    def __str__(self):
+        return f"{self.return_request_id} in batch {self.batch_id} ({self.status})"
+
+
+class LabelFile(models.Model):
+    """
+    A return label re-hosted from the label store, one row per format.
+
+    The carrier's original is downloaded once; other formats are converted
+    on first request and kept, so repeat downloads never reach the carrier.
+    """
+
+    FORMAT_CHOICES = [
+        ('pdf', 'PDF'),
+        ('png', 'PNG'),
+        ('zpl', 'ZPL'),
+    ]
+
+    return_request = models.ForeignKey(ReturnRequest, on_delete=models.CASCADE, related_name='label_files')
+    file_format = models.CharField(max_length=8, choices=FORMAT_CHOICES)
+    path = models.CharField(max_length=255, help_text="Name within the 'labels' storage")
+    content_type = models.CharField(max_length=100)
+    sha256 = models.CharField(max_length=64)
+    size = models.PositiveIntegerField(default=0)
+    source_url = models.URLField(max_length=1000, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['return_request', 'file_format'], name='unique_label_file_format'),
+        ]
+
+    def __str__(self):
+        return f"{self.file_format} label for return {self.return_request_id}"
@@ -1,5 +1,7 @@
 from rest_framework import serializers
 
+from .models import LabelBatch, LabelBatchItem
+
 
 class ExchangeAutomationInputSerializer(serializers.Serializer):
     return_rate = serializers.FloatField(min_value=0, max_value=100)
@@ -10,3 +12,43 @@ class ExchangeAutomationInputSerializer(serializers.Serializer):
         max_length=255, required=False, allow_blank=True, default=""
     )
 
+
+
+class LabelBatchCreateSerializer(serializers.Serializer):
+    return_ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1), allow_empty=False, max_length=1000
+    )
+
+
+class LabelBatchItemSerializer(serializers.ModelSerializer):
+    label_url = serializers.URLField(source="return_request.shipping_label_url", read_only=True)
+    tracking_number = serializers.CharField(source="return_request.tracking_number", read_only=True)
+
+    class Meta:
+        model = LabelBatchItem
+        fields = ["return_request", "status", "error", "attempts", "label_url", "tracking_number"]
+        read_only_fields = fields
+
+
+class LabelBatchSerializer(serializers.ModelSerializer):
+    progress = serializers.SerializerMethodField()
+
+    class Meta:
+        model = LabelBatch
+        fields = [
+            "id",
+            "status",
+            "total",
+            "succeeded",
+            "failed",
+            "progress",
+            "created_at",
+            "started_at",
+            "finished_at",
+        ]
+        read_only_fields = fields
+
+    def get_progress(self, batch):
+        if not batch.total:
+            return 1.0
+        return round((batch.succeeded + batch.failed) / batch.total, 4)
@@ -1,8 +1,168 @@
+import hashlib
+import json
+import logging
+from decimal import Decimal
+from typing import Any, Dict, NamedTuple, Optional, Sequence
+
 import easypost
 from django.conf import settings
+from django.core.cache import cache
+
+from core.http import get_session
+
+logger = logging.getLogger(__name__)
+
+# Warehouse address and parcel IDs never change for given inputs.
+EASYPOST_ID_CACHE_TIMEOUT = 30 * 24 * 60 * 60
+
+_client = None
+_client_config = None
+
+
+def get_easypost_client():
+    """Return a process-wide EasyPost client that uses the shared integration session."""
+    global _client, _client_config
+    config = (settings.EASYPOST_API_KEY, settings.EASYPOST_API_BASE)
+    if _client is None or _client_config != config:
+        _client = easypost.EasyPostClient(settings.EASYPOST_API_KEY, api_base=settings.EASYPOST_API_BASE)
+        # Route EasyPost through the pooled session (keep-alive, retries, breaker).
+        # The SDK has no public hook for this, so easypost is pinned to an exact
+        # version and ReturnLabelTests covers the private attribute.
+        _client._requests_session = get_session()
+        _client_config = config
+    return _client
+
+
+def _cache_scope() -> str:
+    # EasyPost objects belong to one account/mode, so test and production keys
+    # must never share cached IDs.
+    return hashlib.sha256(settings.EASYPOST_API_KEY.encode()).hexdigest()[:12]
+
+
+def _fingerprint(data) -> str:
+    return hashlib.sha256(json.dumps(data, sort_keys=True).encode()).hexdigest()[:12]
+
+
+def _warehouse_cache_key() -> str:
+    return f"easypost:{_cache_scope()}:warehouse-address:{_fingerprint(settings.EASYPOST_FROM_ADDRESS)}"
+
+
+def _parcel_cache_key(preset: str) -> str:
+    dimensions = settings.EASYPOST_PARCEL_PRESETS[preset]
+    return f"easypost:{_cache_scope()}:parcel:{preset}:{_fingerprint(dimensions)}"
+
+
+def get_warehouse_address_id(client) -> str:
+    """EasyPost ID of the verified warehouse address, created once and cached."""
+    key = _warehouse_cache_key()
+    address_id = cache.get(key)
+    if address_id is None:
+        address = client.address.create(verify=True, **settings.EASYPOST_FROM_ADDRESS)
+        address_id = address.id
+        cache.set(key, address_id, EASYPOST_ID_CACHE_TIMEOUT)
+    return address_id
+
+
+def get_parcel_id(client, preset: Optional[str] = None) -> str:
+    """EasyPost ID of a predefined parcel from ``EASYPOST_PARCEL_PRESETS``, created once and cached."""
+    preset = preset or settings.EASYPOST_DEFAULT_PARCEL
+    key = _parcel_cache_key(preset)
+    parcel_id = cache.get(key)
+    if parcel_id is None:
+        parcel = client.parcel.create(**settings.EASYPOST_PARCEL_PRESETS[preset])
+        parcel_id = parcel.id
+        cache.set(key, parcel_id, EASYPOST_ID_CACHE_TIMEOUT)
+    return parcel_id
+
+
+def forget_cached_ids() -> None:
+    cache.delete_many([_warehouse_cache_key(), _parcel_cache_key(settings.EASYPOST_DEFAULT_PARCEL)])
+
+
+def customer_address(order) -> Dict[str, Any]:
+    """Build EasyPost address fields from the order's synced shipping address."""
+    address = order.shipping_address or {}
+    name = address.get("name") or " ".join(
+        part for part in (address.get("first_name"), address.get("last_name")) if part
+    )
+    fields = {
+        "name": name or order.customer_email,
+        "street1": address.get("street1") or address.get("address1", ""),
+        "street2": address.get("street2") or address.get("address2", ""),
+        "city": address.get("city", ""),
+        "state": address.get("state") or address.get("province_code") or address.get("province", ""),
+        "zip": address.get("zip", ""),
+        "country": address.get("country_code") or address.get("country") or "US",
+        "phone": address.get("phone", ""),
+        "email": order.customer_email,
+    }
+    return {key: value for key, value in fields.items() if value}
+
+
+def _rate_amount(rate) -> Decimal:
+    return Decimal(str(rate.rate))
+
+
+def select_rate(rates: Sequence[Any], preferences: Optional[Sequence[str]] = None, tolerance: Optional[float] = None):
+    """
+    Pick a rate locally and deterministically.
+
+    Rates from carriers outside ``preferences`` are ignored (unless no
+    preferred carrier quoted). Among rates within ``tolerance`` of the
+    cheapest, the most preferred carrier wins, then the lowest price, the
+    fastest delivery and finally carrier/service name.
+    """
+    preferences = list(settings.EASYPOST_CARRIER_PREFERENCES if preferences is None else preferences)
+    tolerance = settings.EASYPOST_RATE_TOLERANCE if tolerance is None else tolerance
+    if not rates:
+        return None
+
+    rank = {carrier.lower(): index for index, carrier in enumerate(preferences)}
+    candidates = [rate for rate in rates if not rank or rate.carrier.lower() in rank] or list(rates)
+    cheapest = min(_rate_amount(rate) for rate in candidates)
+    ceiling = cheapest * (1 + Decimal(str(tolerance)))
+    affordable = [rate for rate in candidates if _rate_amount(rate) <= ceiling]
+
+    return min(
+        affordable,
+        key=lambda rate: (
+            rank.get(rate.carrier.lower(), len(rank)),
+            _rate_amount(rate),
+            getattr(rate, "delivery_days", None) or 999,
+            rate.carrier,
+            rate.service,
+        ),
+    )
+
+
+class PurchasedLabel(NamedTuple):
+    label_url: str
+    tracking_number: str
+    shipment_id: str
+
+
+def purchase_label(client, order) -> PurchasedLabel:
+    """
+    Buy a return label for ``order``.
+
+    Only talks to EasyPost (no database access), so batch jobs can call it
+    from worker threads. Raises on any EasyPost or rate selection error.
+    """
+    # The warehouse address and parcel are referenced by cached IDs and the
+    # customer address is sent inline, so only the shipment is created.
+    shipment = client.shipment.create(
+        to_address={"id": get_warehouse_address_id(client)},
+        from_address=customer_address(order),
+        parcel={"id": get_parcel_id(client)},
+        is_return=True
+    )
+
+    rate = select_rate(shipment.rates)
+    if rate is None:
+        raise ValueError(f"No rates returned for shipment {shipment.id}")
+    shipment = client.shipment.buy(shipment.id, rate=rate)
+    return PurchasedLabel(shipment.postage_label.label_url, shipment.tracking_code, shipment.id)
 
-# Initialize EasyPost
-easypost.api_key = settings.EASYPOST_API_KEY
 
 def generate_return_label(return_request):
     """
@@ -16,65 +176,30 @@ def generate_return_label(return_request):
             "tracking_number": "TEST-TRACKING-123"
         }
 
+    client = get_easypost_client()
     try:
-        # Create From Address (Customer)
-        # In a real app, we'd parse this from the order's shipping_address
-        from_address = easypost.Address.create(
-            name=return_request.order.customer_email,
-            street1="123 Customer St", # Placeholder
-            city="San Francisco",
-            state="CA",
-            zip="94105",
-            phone="415-123-4567"
-        )
-
-        # Create To Address (Warehouse)
-        to_address = easypost.Address.create(**settings.EASYPOST_FROM_ADDRESS)
-
-        # Create Parcel (Placeholder weight/dims)
-        parcel = easypost.Parcel.create(
-            length=10,
-            width=8,
-            height=4,
-            weight=16 # 1 lb
-        )
-
-        # Create Shipment
-        shipment = easypost.Shipment.create(
-            to_address=to_address,
-            from_address=from_address,
-            parcel=parcel,
-            is_return=True
-        )
-
-        # Buy the lowest rate
-        shipment.buy(rate=shipment.lowest_rate())
-
-        label_url = shipment.postage_label.label_url
-        tracking_number = shipment.tracking_code
+        label_url, tracking_number, shipment_id = purchase_label(client, return_request.order)
 
         # Send confirmation email
         from returns.email import send_return_confirmation_email
-        # We need to pass the return_request object to the email function
-        # The return_request object should have the updated label_url and tracking_number
-        # But here we are just returning them. 
-        # Ideally, we should update the return_request object here or pass the values to the email function.
-        # Looking at returns/email.py, it expects a return_request object and accesses .shipping_label_url and .tracking_number
-        
-        # Let's attach these temporarily to the return_request object so the email function works
-        # This assumes return_request is a mutable Django model instance
+
+        # The email reads the label from the return request, which the caller saves.
         return_request.shipping_label_url = label_url
         return_request.tracking_number = tracking_number
-        
+        return_request.easypost_shipment_id = shipment_id
+
         send_return_confirmation_email(return_request.order.customer_email, return_request)
 
         return {
             "label_url": label_url,
-            "tracking_number": tracking_number
+            "tracking_number": tracking_number,
+            "shipment_id": shipment_id,
         }
 
     except Exception as e:
-        print(f"Error generating label: {e}")
+        logger.exception("Error generating label for return %s: %s", return_request.pk, e)
+        # Cached IDs may be stale (e.g. objects from another account); refetch next time.
+        forget_cached_ids()
         # Fallback for error cases
         return {
             "label_url": None,
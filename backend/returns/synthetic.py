@@ -0,0 +1,255 @@
+"""
+Synthetic merchant data for load and performance testing.
+
+``generate_dataset`` writes merchants, their orders and returns with bulk
+inserts, streaming one batch of orders at a time so millions of rows can be
+generated without holding them in memory. Output is deterministic for a
+given ``DatasetSpec`` (including its seed). Used by the
+``generate_synthetic_data`` management command and the benchmark harness.
+"""
+from __future__ import annotations
+
+import itertools
+import random
+from dataclasses import dataclass
+from datetime import timedelta
+from decimal import Decimal
+from typing import Callable, Dict, List, Optional
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Order, ReturnRequest
+
+# (city, province, province_code, zip prefix)
+CITIES = [
+    ("New York", "New York", "NY", "100"),
+    ("Brooklyn", "New York", "NY", "112"),
+    ("Los Angeles", "California", "CA", "900"),
+    ("San Francisco", "California", "CA", "941"),
+    ("Chicago", "Illinois", "IL", "606"),
+    ("Houston", "Texas", "TX", "770"),
+    ("Austin", "Texas", "TX", "787"),
+    ("Phoenix", "Arizona", "AZ", "850"),
+    ("Philadelphia", "Pennsylvania", "PA", "191"),
+    ("Seattle", "Washington", "WA", "981"),
+    ("Denver", "Colorado", "CO", "802"),
+    ("Miami", "Florida", "FL", "331"),
+    ("Atlanta", "Georgia", "GA", "303"),
+    ("Boston", "Massachusetts", "MA", "021"),
+    ("Portland", "Oregon", "OR", "972"),
+    ("Minneapolis", "Minnesota", "MN", "554"),
+]
+STREETS = ["Main St", "Oak Ave", "Maple Dr", "Market St", "Cedar Ln", "Pine St", "Elm St", "Lake Rd"]
+FIRST_NAMES = ["Avery", "Jordan", "Riley", "Morgan", "Casey", "Taylor", "Quinn", "Jamie", "Rowan", "Sam"]
+LAST_NAMES = ["Nguyen", "Garcia", "Smith", "Patel", "Kim", "Johnson", "Brown", "Lopez", "Chen", "Davis"]
+PRODUCTS = ["Tee", "Hoodie", "Jeans", "Sneakers", "Jacket", "Dress", "Backpack", "Cap", "Socks", "Boots"]
+SIZES = ["XS", "S", "M", "L", "XL"]
+RETURN_REASONS = [
+    ("Too small", 30),
+    ("Too big", 25),
+    ("Not as described", 15),
+    ("Changed my mind", 12),
+    ("Damaged in transit", 8),
+    ("Arrived late", 5),
+    ("Wrong item", 5),
+]
+PLATFORMS = [("shopify", 80), ("bigcommerce", 12), ("woocommerce", 8)]
+DEFAULT_RETURN_STATUSES = {"completed": 0.6, "approved": 0.15, "pending": 0.2, "rejected": 0.05}
+
+
+@dataclass
+class DatasetSpec:
+    merchants: int = 5
+    orders_per_merchant: int = 1000
+    skus: int = 200
+    # Zipf exponent of SKU popularity; 0 is uniform, higher concentrates
+    # orders (and returns) on a few best sellers.
+    sku_skew: float = 1.1
+    max_line_items: int = 4
+    # Share of orders with a return, and of returns resolved as a refund
+    # rather than an exchange.
+    return_rate: float = 0.2
+    refund_rate: float = 0.6
+    gift_rate: float = 0.05
+    # Chance that an order is placed by a customer who already ordered.
+    repeat_customer_rate: float = 0.3
+    days: int = 365
+    seed: int = 0
+    prefix: str = "synthetic"
+    batch_size: int = 5000
+    return_statuses: Optional[Dict[str, float]] = None
+
+
+def _cumulative(weights) -> List[float]:
+    return list(itertools.accumulate(weights))
+
+
+class _Generator:
+    def __init__(self, spec: DatasetSpec):
+        self.spec = spec
+        self.rng = random.Random(spec.seed)
+        self.now = timezone.now()
+        self.catalog = [
+            {
+                "sku": f"SKU-{index:05d}",
+                "name": f"{PRODUCTS[index % len(PRODUCTS)]} {SIZES[index % len(SIZES)]} #{index}",
+                "price": Decimal(self.rng.randrange(900, 19900)) / 100,
+            }
+            for index in range(spec.skus)
+        ]
+        self.sku_weights = _cumulative(1 / (rank ** spec.sku_skew) for rank in range(1, spec.skus + 1))
+        # Fewer line items are more common: weight 1/n for n items.
+        self.line_item_weights = _cumulative(1 / count for count in range(1, spec.max_line_items + 1))
+        self.reasons, reason_weights = zip(*RETURN_REASONS)
+        self.reason_weights = _cumulative(reason_weights)
+        self.platforms, platform_weights = zip(*PLATFORMS)
+        self.platform_weights = _cumulative(platform_weights)
+        statuses = spec.return_statuses or DEFAULT_RETURN_STATUSES
+        self.statuses = list(statuses)
+        self.status_weights = _cumulative(statuses.values())
+        self.line_item_ids = itertools.count(1)
+
+    def pick(self, population, cum_weights):
+        return self.rng.choices(population, cum_weights=cum_weights)[0]
+
+    def address(self, name: str) -> Dict[str, str]:
+        city, province, province_code, zip_prefix = self.rng.choice(CITIES)
+        return {
+            "name": name,
+            "phone": f"555-{self.rng.randrange(100, 1000)}-{self.rng.randrange(1000, 10000)}",
+            "address1": f"{self.rng.randrange(1, 9999)} {self.rng.choice(STREETS)}",
+            "address2": self.rng.choice(["", "", "", f"Apt {self.rng.randrange(1, 40)}"]),
+            "city": city,
+            "province": province,
+            "province_code": province_code,
+            "country": "United States",
+            "country_code": "US",
+            "zip": f"{zip_prefix}{self.rng.randrange(0, 100):02d}",
+        }
+
+    def line_items(self) -> List[Dict]:
+        count = self.pick(range(1, self.spec.max_line_items + 1), self.line_item_weights)
+        items = []
+        for product in self.rng.choices(self.catalog, cum_weights=self.sku_weights, k=count):
+            items.append(
+                {
+                    "id": str(next(self.line_item_ids)),
+                    "sku": product["sku"],
+                    "name": product["name"],
+                    "price": str(product["price"]),
+                    "quantity": self.rng.choice([1, 1, 1, 2]),
+                    "variant_id": None,
+                }
+            )
+        return items
+
+    def order(self, merchant, number: int, customers: List[tuple]) -> Order:
+        if customers and self.rng.random() < self.spec.repeat_customer_rate:
+            email, name, address = self.rng.choice(customers)
+        else:
+            name = f"{self.rng.choice(FIRST_NAMES)} {self.rng.choice(LAST_NAMES)}"
+            email = f"customer{len(customers) + 1}@{merchant.username}.example.com"
+            address = self.address(name)
+            customers.append((email, name, address))
+        line_items = self.line_items()
+        total = sum(Decimal(item["price"]) * item["quantity"] for item in line_items)
+        return Order(
+            user=merchant,
+            external_id=f"{merchant.username}-{number}",
+            platform=self.pick(self.platforms, self.platform_weights),
+            customer_email=email,
+            total=total,
+            created_at=self.now - timedelta(seconds=self.rng.randrange(self.spec.days * 86400)),
+            line_items=line_items,
+            shipping_address=address,
+            raw_data={"synthetic": True},
+        )
+
+    def return_request(self, order: Order) -> ReturnRequest:
+        returned = self.rng.sample(order.line_items, self.rng.randint(1, len(order.line_items)))
+        items = [
+            {
+                "line_item_id": item["id"],
+                "sku": item["sku"],
+                "price": item["price"],
+                "quantity": self.rng.randint(1, item["quantity"]),
+            }
+            for item in returned
+        ]
+        is_gift = self.rng.random() < self.spec.gift_rate
+        resolution = "REFUND" if self.rng.random() < self.spec.refund_rate else "EXCHANGE"
+        reason = f"{self.pick(self.reasons, self.reason_weights)} [{resolution}]"
+        if is_gift:
+            reason += " [GIFT RETURN]"
+        return ReturnRequest(
+            order=order,
+            user=order.user,
+            reason=reason,
+            status=self.pick(self.statuses, self.status_weights),
+            items=items,
+            refund_amount=sum(Decimal(item["price"]) * item["quantity"] for item in items),
+            restock=self.rng.random() < 0.5,
+            is_gift=is_gift,
+            recipient_email=f"gift{order.external_id}@example.com" if is_gift else None,
+        )
+
+
+def merchant_queryset(prefix: str = "synthetic"):
+    return get_user_model().objects.filter(username__startswith=f"{prefix}-merchant-")
+
+
+def generate_dataset(spec: DatasetSpec, progress: Optional[Callable[[str], None]] = None) -> Dict[str, int]:
+    """Create ``spec.merchants`` merchants with their orders and returns. Returns row counts."""
+    generator = _Generator(spec)
+    User = get_user_model()
+    password = make_password(None)
+    existing = merchant_queryset(spec.prefix).values_list("username", flat=True)
+    start = max((int(name.rsplit("-", 1)[1]) for name in existing if name.rsplit("-", 1)[1].isdigit()), default=0)
+    merchants = User.objects.bulk_create(
+        [
+            User(
+                username=f"{spec.prefix}-merchant-{index}",
+                email=f"{spec.prefix}-merchant-{index}@example.com",
+                password=password,
+                company_name=f"Synthetic Store {index}",
+                store_platform=User.StorePlatform.SHOPIFY,
+                has_shopify_store=True,
+                onboarding_stage="complete",
+            )
+            for index in range(start + 1, start + spec.merchants + 1)
+        ]
+    )
+    if any(merchant.pk is None for merchant in merchants):
+        # Backends without RETURNING on bulk inserts.
+        merchants = list(merchant_queryset(spec.prefix).filter(username__in=[m.username for m in merchants]))
+
+    totals = {"merchants": len(merchants), "orders": 0, "returns": 0}
+    for merchant in merchants:
+        customers: List[tuple] = []
+        for batch_start in range(0, spec.orders_per_merchant, spec.batch_size):
+            batch_end = min(batch_start + spec.batch_size, spec.orders_per_merchant)
+            orders = [generator.order(merchant, number, customers) for number in range(batch_start + 1, batch_end + 1)]
+            with transaction.atomic():
+                orders = Order.objects.bulk_create(orders)
+                if any(order.pk is None for order in orders):
+                    by_external_id = dict(
+                        Order.objects.filter(
+                            user=merchant, external_id__in=[order.external_id for order in orders]
+                        ).values_list("external_id", "pk")
+                    )
+                    for order in orders:
+                        order.pk = by_external_id[order.external_id]
+                returns = [
+                    generator.return_request(order)
+                    for order in orders
+                    if generator.rng.random() < spec.return_rate
+                ]
+                ReturnRequest.objects.bulk_create(returns)
+            totals["orders"] += len(orders)
+            totals["returns"] += len(returns)
+            if progress:
+                progress(f"{merchant.username}: {batch_end}/{spec.orders_per_merchant} orders")
+    return totals
@@ -0,0 +1,93 @@
+"""
+Return label background tasks.
+"""
+import logging
+
+import requests
+from celery import shared_task
+from django.core.cache import cache
+
+from returns.batches import process_label_batch, reclaim_stale_batches
+
+
+logger = logging.getLogger(__name__)
+
+TRACKING_LOCK_KEY = "returns:tracking:lock"
+TRACKING_LOCK_TIMEOUT = 5 * 60
+
+
+@shared_task(ignore_result=True)
+def run_label_batch(batch_id):
+    """
+    Buy labels for a LabelBatch.
+
+    Args:
+        batch_id: ID of the LabelBatch record
+    """
+    batch = process_label_batch(batch_id)
+    if batch is None:
+        logger.info(f"Label batch {batch_id} is not pending; skipping")
+        return
+    logger.info(
+        f"Label batch {batch_id} finished: {batch.succeeded}/{batch.total} labels, {batch.failed} failed"
+    )
+
+
+@shared_task(ignore_result=True)
+def reclaim_stale_label_batches():
+    """
+    Periodic sweep that re-runs label batches left ``running`` by a worker
+    that died (hard time limit, OOM, deploy).
+    """
+    reclaimed = reclaim_stale_batches()
+    if reclaimed:
+        logger.warning(f"Reclaimed stale label batches: {reclaimed}")
+    return len(reclaimed)
+
+
+@shared_task(ignore_result=True)
+def store_return_labels(return_ids):
+    """
+    Copy newly purchased labels into the label store so the first shopper
+    download does not wait on the carrier.
+
+    Args:
+        return_ids: IDs of ReturnRequest records with a purchased label
+    """
+    from returns.labels import LabelUnavailable, store_original
+    from returns.models import ReturnRequest
+
+    for return_request in ReturnRequest.objects.filter(pk__in=return_ids).exclude(shipping_label_url=''):
+        try:
+            store_original(return_request)
+        except (LabelUnavailable, requests.RequestException) as exc:
+            # The download view retries on first request.
+            logger.warning(f"Could not store label for return {return_request.pk}: {exc}")
+
+
+@shared_task(ignore_result=True)
+def apply_tracking_updates():
+    """
+    Apply pending EasyPost tracking events to their returns.
+    Scheduled shortly after events arrive and swept every minute by Celery Beat.
+    """
+    from returns.tracking import APPLY_BATCH_SIZE, APPLY_SCHEDULED_KEY, apply_tracking_events
+
+    # Events arriving after this point schedule a fresh run.
+    cache.delete(APPLY_SCHEDULED_KEY)
+    if not cache.add(TRACKING_LOCK_KEY, True, TRACKING_LOCK_TIMEOUT):
+        logger.info("Tracking update already running; skipping")
+        return
+
+    try:
+        while True:
+            totals = apply_tracking_events()
+            if totals["events"]:
+                logger.info(
+                    f"Applied {totals['events']} tracking events: "
+                    f"{totals['updated']} returns updated, {totals['completed']} completed"
+                )
+            if totals["events"] < APPLY_BATCH_SIZE:
+                break
+    finally:
+        cache.delete(TRACKING_LOCK_KEY)
@@ -0,0 +1,69 @@
+"""
+Local stand-in for the EasyPost API.
+
+``EasyPostStub`` implements the endpoints used for return labels (address,
+parcel and shipment creation, shipment purchase) on a loopback port::
+
+    with EasyPostStub(fail_zips={"00000"}) as stub, override_settings(EASYPOST_API_BASE=stub.base_url):
+        process_label_batch(batch.pk)
+    stub.purchased  # shipment IDs bought
+
+Shipments whose customer (``from_address``) ZIP is in ``fail_zips`` are
+rejected with a 422, which is how partial batch failures are exercised.
+"""
+from __future__ import annotations
+
+import itertools
+import re
+from typing import Any, Dict, Iterable, List, Mapping, Optional
+
+from core.testing import LoopbackStub
+
+_BUY_PATH = re.compile(r"^/v2/shipments/(?P<id>[^/]+)/buy$")
+
+
+class EasyPostStub(LoopbackStub):
+    def __init__(self, *, fail_zips: Optional[Iterable[str]] = None, rates: Optional[List[Dict[str, Any]]] = None):
+        super().__init__()
+        self.fail_zips = set(fail_zips or ())
+        self.rates = rates or [
+            {"carrier": "USPS", "service": "Priority", "rate": "7.10", "delivery_days": 2},
+            {"carrier": "UPS", "service": "Ground", "rate": "8.25", "delivery_days": 4},
+        ]
+        self.requests: List[str] = []
+        self.purchased: List[str] = []
+        self._ids = itertools.count(1)
+
+    def _next_id(self, prefix: str) -> str:
+        with self._lock:
+            return f"{prefix}_{next(self._ids)}"
+
+    def handle(self, path: str, headers: Mapping[str, str], body: Dict[str, Any]):
+        with self._lock:
+            self.requests.append(path)
+        if path == "/v2/addresses":
+            return 201, {"object": "Address", "id": self._next_id("adr"), **body.get("address", {})}
+        if path == "/v2/parcels":
+            return 201, {"object": "Parcel", "id": self._next_id("prcl"), **body.get("parcel", {})}
+        if path == "/v2/shipments":
+            shipment = body.get("shipment", {})
+            if (shipment.get("from_address") or {}).get("zip") in self.fail_zips:
+                return 422, {"error": {"code": "ADDRESS.VERIFY.FAILURE", "message": "Address not found", "errors": []}}
+            shipment_id = self._next_id("shp")
+            rates = [
+                {"object": "Rate", "id": self._next_id("rate"), "shipment_id": shipment_id, **rate}
+                for rate in self.rates
+            ]
+            return 201, {"object": "Shipment", "id": shipment_id, "rates": rates}
+        match = _BUY_PATH.match(path)
+        if match:
+            shipment_id = match.group("id")
+            with self._lock:
+                self.purchased.append(shipment_id)
+            return 200, {
+                "object": "Shipment",
+                "id": shipment_id,
+                "tracking_code": f"TRK{shipment_id.split('_')[1].zfill(8)}",
+                "postage_label": {"object": "PostageLabel", "label_url": f"https://labels.test/{shipment_id}.pdf"},
+            }
+        return 404, {"error": {"code": "NOT_FOUND", "message": "Not found", "errors": []}}
@@ -1,8 +1,37 @@
+import hashlib
+import io
+import hmac
+import json
+import tempfile
+from datetime import timedelta
+from decimal import Decimal
+from types import SimpleNamespace
+from unittest import mock
+
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils import timezone
 from rest_framework import status
 from rest_framework.test import APITestCase
 
+from core.http import get_session, reset_breakers
+from returns.batches import create_label_batch, process_label_batch
+from returns.benchmarks import BENCHMARKS, compare, measure
+from returns.labels import label_download_url
+from returns.models import LabelBatch, LabelFile, Order, ReturnRequest, TrackingEvent
+from returns.shipping import (
+    generate_return_label,
+    get_easypost_client,
+    get_warehouse_address_id,
+    select_rate,
+)
+from returns.testing import EasyPostStub
+from returns.tracking import apply_tracking_events
 from returns.utils import (
     build_exchange_coach_actions,
     build_exchange_playbook,
@@ -114,3 +143,491 @@ class VIPResolutionTests(APITestCase):
     def test_vip_queue_utils(self):
         report = build_vip_resolution_queue()
         self.assertGreater(report["summary"]["open_tickets"], 0)
+
+
+@override_settings(
+    EASYPOST_API_KEY="EZTK_test",
+    EASYPOST_CARRIER_PREFERENCES=["UPS", "USPS"],
+    EASYPOST_RATE_TOLERANCE=0.1,
+)
+class ReturnLabelTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        user = User.objects.create_user(
+            username="labels", email="labels@returnshield.app", password="StrongPass123!"
+        )
+        self.order = Order.objects.create(
+            user=user,
+            external_id="5001",
+            platform="shopify",
+            customer_email="shopper@example.com",
+            total=Decimal("80.00"),
+            created_at=timezone.now(),
+            shipping_address={
+                "name": "Sam Shopper",
+                "address1": "1 Market St",
+                "city": "San Francisco",
+                "province": "California",
+                "province_code": "CA",
+                "country_code": "US",
+                "zip": "94105",
+            },
+        )
+
+    @staticmethod
+    def _rate(carrier, service, amount, days=3):
+        return SimpleNamespace(
+            id=f"rate_{carrier}_{service}", carrier=carrier, service=service, rate=amount, delivery_days=days
+        )
+
+    def test_select_rate_prefers_carrier_within_tolerance(self):
+        rates = [
+            self._rate("USPS", "Priority", "7.00"),
+            self._rate("UPS", "Ground", "7.50"),
+            self._rate("FedEx", "Ground", "5.00"),
+        ]
+        # FedEx is not an allowed carrier; UPS is within 10% of the cheapest USPS rate.
+        self.assertEqual(select_rate(rates).id, "rate_UPS_Ground")
+        self.assertEqual(select_rate(rates, tolerance=0).id, "rate_USPS_Priority")
+        self.assertEqual(select_rate(rates, preferences=[]).id, "rate_FedEx_Ground")
+
+    def test_label_reuses_cached_warehouse_and_parcel_ids(self):
+        client = mock.Mock()
+        client.address.create.return_value = SimpleNamespace(id="adr_warehouse")
+        client.parcel.create.return_value = SimpleNamespace(id="prcl_default")
+        client.shipment.create.return_value = SimpleNamespace(
+            id="shp_1", rates=[self._rate("USPS", "Priority", "7.00")]
+        )
+        client.shipment.buy.return_value = SimpleNamespace(
+            id="shp_1", postage_label=SimpleNamespace(label_url="https://labels.test/1.pdf"), tracking_code="9400"
+        )
+
+        with mock.patch("returns.shipping.get_easypost_client", return_value=client), mock.patch(
+            "returns.email.send_return_confirmation_email"
+        ):
+            for _ in range(2):
+                return_request = ReturnRequest.objects.create(order=self.order, user=self.order.user, reason="Too big")
+                result = generate_return_label(return_request)
+
+        self.assertEqual(
+            result, {"label_url": "https://labels.test/1.pdf", "tracking_number": "9400", "shipment_id": "shp_1"}
+        )
+        client.address.create.assert_called_once()
+        client.parcel.create.assert_called_once()
+        shipment_kwargs = client.shipment.create.call_args.kwargs
+        self.assertEqual(shipment_kwargs["to_address"], {"id": "adr_warehouse"})
+        self.assertEqual(shipment_kwargs["parcel"], {"id": "prcl_default"})
+        self.assertEqual(shipment_kwargs["from_address"]["street1"], "1 Market St")
+        self.assertEqual(shipment_kwargs["from_address"]["state"], "CA")
+        client.shipment.buy.assert_called_with("shp_1", rate=client.shipment.create.return_value.rates[0])
+
+    @override_settings(EASYPOST_API_KEY="EZTK_stub")
+    def test_easypost_sdk_sends_requests_through_shared_session(self):
+        # get_easypost_client() swaps the SDK's private _requests_session;
+        # this fails if an easypost upgrade stops sending requests through it.
+        session = get_session()
+        with EasyPostStub() as stub, override_settings(EASYPOST_API_BASE=stub.base_url), mock.patch.object(
+            session, "request", wraps=session.request
+        ) as session_request:
+            client = get_easypost_client()
+            self.assertIs(client._requests_session, session)
+            get_warehouse_address_id(client)
+
+        self.assertEqual(stub.requests, ["/v2/addresses"])
+        session_request.assert_called_once()
+
+
+@override_settings(EASYPOST_API_KEY="EZTK_stub", EASYPOST_BATCH_CONCURRENCY=4)
+class LabelBatchTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        reset_breakers()
+        self.merchant = User.objects.create_user(
+            username="bulk", email="bulk@returnshield.app", password="StrongPass123!"
+        )
+        self.returns = []
+        for index, zip_code in enumerate(["94105", "00000", "10001"]):
+            order = Order.objects.create(
+                user=self.merchant,
+                external_id=f"70{index}",
+                platform="shopify",
+                customer_email=f"shopper{index}@example.com",
+                total=Decimal("40.00"),
+                created_at=timezone.now(),
+                shipping_address={"address1": "1 Main St", "city": "Town", "province_code": "NY", "zip": zip_code},
+            )
+            self.returns.append(ReturnRequest.objects.create(order=order, user=self.merchant, reason="Too small"))
+        self.client.force_authenticate(self.merchant)
+
+    @mock.patch("returns.email.send_return_confirmation_email")
+    def test_batch_buys_labels_and_records_partial_failures(self, mock_email):
+        with mock.patch("returns.tasks.run_label_batch.delay") as mock_delay, self.captureOnCommitCallbacks(
+            execute=True
+        ):
+            response = self.client.post(
+                reverse("returns:label-batches"),
+                {"return_ids": [r.pk for r in self.returns]},
+                format="json",
+            )
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        batch_id = response.data["id"]
+        mock_delay.assert_called_once_with(batch_id)
+
+        with EasyPostStub(fail_zips={"00000"}) as stub, override_settings(EASYPOST_API_BASE=stub.base_url):
+            process_label_batch(batch_id)
+
+        self.assertEqual(len(stub.purchased), 2)
+        # Warehouse address and parcel are created once for the whole batch.
+        self.assertEqual(stub.requests.count("/v2/addresses"), 1)
+        self.assertEqual(stub.requests.count("/v2/parcels"), 1)
+
+        detail = self.client.get(reverse("returns:label-batch", args=[batch_id])).data
+        self.assertEqual(detail["status"], "completed_with_errors")
+        self.assertEqual((detail["succeeded"], detail["failed"], detail["progress"]), (2, 1, 1.0))
+        failed = [item for item in detail["items"] if item["status"] == "failed"]
+        self.assertEqual([item["return_request"] for item in failed], [self.returns[1].pk])
+        self.returns[0].refresh_from_db()
+        self.assertTrue(self.returns[0].shipping_label_url.startswith("https://labels.test/"))
+        self.assertEqual(mock_email.call_count, 2)
+
+        with mock.patch("returns.tasks.run_label_batch.delay"):
+            retry = self.client.post(reverse("returns:label-batch-retry", args=[batch_id]))
+        self.assertEqual(retry.data["retrying"], 1)
+        self.assertEqual(retry.data["status"], "pending")
+
+
+    @mock.patch("returns.email.send_return_confirmation_email")
+    @mock.patch("returns.batches.get_parcel_id")
+    @mock.patch("returns.batches.get_warehouse_address_id")
+    @mock.patch("returns.batches.get_easypost_client")
+    def test_stale_running_batch_is_reclaimed_without_rebuying_recorded_labels(
+        self, _client, _address, _parcel, _email
+    ):
+        with mock.patch("returns.tasks.run_label_batch.delay"), self.captureOnCommitCallbacks(execute=True):
+            batch = create_label_batch(self.merchant, [r.pk for r in self.returns])
+        # The previous worker died after recording the first label, before flushing progress.
+        LabelBatch.objects.filter(pk=batch.pk).update(
+            status="running", started_at=timezone.now() - timedelta(hours=2)
+        )
+        first = batch.items.get(return_request=self.returns[0])
+        first.status = "purchased"
+        first.save()
+
+        bought = []
+
+        def purchase(client, order):
+            bought.append(order.pk)
+            return f"https://labels.test/{order.pk}.pdf", "9400", f"shp_{order.pk}"
+
+        with mock.patch("returns.tasks.run_label_batch.delay") as mock_delay, self.captureOnCommitCallbacks(
+            execute=True
+        ):
+            retry = self.client.post(reverse("returns:label-batch-retry", args=[batch.pk]))
+        self.assertEqual(retry.status_code, status.HTTP_202_ACCEPTED)
+        mock_delay.assert_called_once_with(batch.pk)
+
+        with mock.patch("returns.batches.purchase_label", side_effect=purchase), mock.patch(
+            "returns.labels.schedule_label_store"
+        ):
+            batch = process_label_batch(batch.pk)
+
+        self.assertEqual(sorted(bought), [self.returns[1].order_id, self.returns[2].order_id])
+        self.assertEqual((batch.status, batch.succeeded, batch.failed), ("completed", 3, 0))
+
+    @mock.patch("returns.batches.get_parcel_id")
+    @mock.patch("returns.batches.get_warehouse_address_id")
+    @mock.patch("returns.batches.get_easypost_client")
+    def test_purchases_are_recorded_before_progress_is_flushed(self, _client, _address, _parcel):
+        with mock.patch("returns.tasks.run_label_batch.delay"), self.captureOnCommitCallbacks(execute=True):
+            batch = create_label_batch(self.merchant, [self.returns[0].pk])
+
+        # The worker dies at its first progress flush.
+        with mock.patch(
+            "returns.batches.purchase_label", return_value=("https://labels.test/1.pdf", "9400", "shp_1")
+        ), mock.patch("returns.batches._flush", side_effect=SystemExit), self.assertRaises(SystemExit):
+            process_label_batch(batch.pk)
+
+        self.returns[0].refresh_from_db()
+        self.assertEqual(self.returns[0].easypost_shipment_id, "shp_1")
+        self.assertEqual(batch.items.get().status, "purchased")
+
+
+class LabelStoreTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        storage_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(storage_dir.cleanup)
+        storages_override = override_settings(
+            STORAGES={
+                "default": {"BACKEND": "django.core.files.storage.InMemoryStorage"},
+                "staticfiles": {"BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage"},
+                "labels": {
+                    "BACKEND": "django.core.files.storage.FileSystemStorage",
+                    "OPTIONS": {"location": storage_dir.name},
+                },
+            }
+        )
+        storages_override.enable()
+        self.addCleanup(storages_override.disable)
+
+        user = User.objects.create_user(username="labels", email="labels@returnshield.app", password="StrongPass123!")
+        order = Order.objects.create(
+            user=user,
+            external_id="5001",
+            platform="shopify",
+            customer_email="shopper@example.com",
+            total=Decimal("40.00"),
+            created_at=timezone.now(),
+        )
+        self.return_request = ReturnRequest.objects.create(
+            order=order,
+            user=user,
+            reason="Too big",
+            shipping_label_url="https://labels.test/1.pdf",
+            easypost_shipment_id="shp_1",
+        )
+
+    def _download(self, content, content_type):
+        response = mock.Mock(content=content, headers={"Content-Type": content_type})
+        session = mock.Mock()
+        session.get.return_value = response
+        return mock.patch("returns.labels.get_session", return_value=session)
+
+    def test_label_is_downloaded_once_and_served_with_cache_headers(self):
+        url = label_download_url(self.return_request)
+
+        with self._download(b"%PDF-1.4 label", "application/pdf") as get_session:
+            first = self.client.get(url)
+            second = self.client.get(url)
+            cache.clear()
+            third = self.client.get(url, HTTP_IF_NONE_MATCH=first["ETag"])
+
+        get_session.return_value.get.assert_called_once()
+        self.assertEqual(first.status_code, status.HTTP_200_OK)
+        self.assertEqual(b"".join(second.streaming_content), b"%PDF-1.4 label")
+        self.assertEqual(second["Content-Type"], "application/pdf")
+        self.assertIn("immutable", second["Cache-Control"])
+        self.assertEqual(third.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(LabelFile.objects.filter(return_request=self.return_request).count(), 1)
+
+    def test_converted_format_is_stored_and_reused(self):
+        client = mock.Mock()
+        client.shipment.label.return_value = SimpleNamespace(
+            postage_label=SimpleNamespace(label_zpl_url="https://labels.test/1.zpl")
+        )
+        url = label_download_url(self.return_request, "zpl")
+
+        with override_settings(EASYPOST_API_KEY="EZTK_stub"), mock.patch(
+            "returns.shipping.get_easypost_client", return_value=client
+        ), self._download(b"^XA^XZ", "application/pdf") as get_session:
+            get_session.return_value.get.side_effect = [
+                mock.Mock(content=b"%PDF-1.4 label", headers={"Content-Type": "application/pdf"}),
+                mock.Mock(content=b"^XA^XZ", headers={"Content-Type": "application/octet-stream"}),
+            ]
+            first = self.client.get(url)
+            cache.clear()
+            second = self.client.get(url)
+
+        client.shipment.label.assert_called_once_with("shp_1", file_format="ZPL")
+        self.assertEqual(b"".join(second.streaming_content), b"^XA^XZ")
+        self.assertEqual(first["ETag"], second["ETag"])
+        self.assertEqual(
+            sorted(LabelFile.objects.values_list("file_format", flat=True)), ["pdf", "zpl"]
+        )
+
+    def test_tampered_token_is_rejected(self):
+        url = label_download_url(self.return_request).rstrip("/") + "x/"
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_404_NOT_FOUND)
+
+
+@override_settings(EASYPOST_WEBHOOK_SECRET="whsec_tracking")
+class TrackingWebhookTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        user = User.objects.create_user(username="tracking", email="tracking@returnshield.app", password="StrongPass123!")
+        order = Order.objects.create(
+            user=user,
+            external_id="6001",
+            platform="shopify",
+            customer_email="shopper@example.com",
+            total=Decimal("40.00"),
+            created_at=timezone.now(),
+        )
+        self.return_request = ReturnRequest.objects.create(
+            order=order, user=user, reason="Too big", status="approved", tracking_number="9400TRACK"
+        )
+
+    def _post(self, event_id, tracking_status, updated_at):
+        body = json.dumps(
+            {
+                "id": event_id,
+                "description": "tracker.updated",
+                "result": {"tracking_code": "9400TRACK", "status": tracking_status, "updated_at": updated_at},
+            }
+        ).encode()
+        signature = hmac.new(b"whsec_tracking", body, hashlib.sha256).hexdigest()
+        return self.client.post(
+            reverse("returns:easypost-webhook"),
+            body,
+            content_type="application/json",
+            HTTP_X_HMAC_SIGNATURE=f"hmac-sha256-hex={signature}",
+        )
+
+    def test_events_are_deduplicated_and_applied_in_one_batch(self):
+        with mock.patch("returns.tasks.apply_tracking_updates.apply_async") as mock_apply, self.captureOnCommitCallbacks(
+            execute=True
+        ):
+            self._post("evt_1", "in_transit", "2026-10-01T10:00:00Z")
+            duplicate = self._post("evt_1", "in_transit", "2026-10-01T10:00:00Z")
+            self._post("evt_3", "delivered", "2026-10-03T10:00:00Z")
+            # Arrives late; must not move the package back in transit.
+            self._post("evt_2", "out_for_delivery", "2026-10-02T10:00:00Z")
+
+        self.assertFalse(duplicate.data["recorded"])
+        self.assertEqual(TrackingEvent.objects.count(), 3)
+        mock_apply.assert_called_once()
+
+        # Two locking reads and two bulk writes, all inside one atomic block.
+        with self.assertNumQueries(6):
+            totals = apply_tracking_events()
+
+        self.assertEqual(totals, {"events": 3, "updated": 1, "completed": 1})
+        self.return_request.refresh_from_db()
+        self.assertEqual(self.return_request.tracking_status, "delivered")
+        self.assertEqual(self.return_request.status, "completed")
+        self.assertFalse(TrackingEvent.objects.filter(processed_at__isnull=True).exists())
+
+    def test_invalid_signature_is_rejected(self):
+        response = self.client.post(
+            reverse("returns:easypost-webhook"),
+            {"id": "evt_1"},
+            format="json",
+            HTTP_X_HMAC_SIGNATURE="hmac-sha256-hex=bogus",
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(TrackingEvent.objects.exists())
+
+
+class SyntheticDataTests(APITestCase):
+    def test_command_generates_linked_orders_and_returns(self):
+        call_command(
+            "generate_synthetic_data",
+            merchants=2,
+            orders=120,
+            batch_size=50,
+            return_rate=0.5,
+            seed=7,
+            stdout=io.StringIO(),
+        )
+
+        self.assertEqual(User.objects.filter(username__startswith="synthetic-merchant-").count(), 2)
+        self.assertEqual(Order.objects.count(), 240)
+        returns = list(ReturnRequest.objects.select_related("order"))
+        self.assertGreater(len(returns), 60)
+        for return_request in returns:
+            self.assertEqual(return_request.user_id, return_request.order.user_id)
+            order_item_ids = {item["id"] for item in return_request.order.line_items}
+            self.assertTrue({item["line_item_id"] for item in return_request.items} <= order_item_ids)
+            self.assertRegex(return_request.reason, r"\[(REFUND|EXCHANGE)\]")
+        # Completed returns feed the insight builders.
+        self.assertTrue(build_returnless_insights()["candidates"])
+
+    def test_command_rejects_non_positive_batch_size_and_days(self):
+        for option in ("batch_size", "days"):
+            with self.subTest(option=option), self.assertRaisesMessage(CommandError, "must be at least 1"):
+                call_command("generate_synthetic_data", merchants=1, orders=1, stdout=io.StringIO(), **{option: 0})
+        self.assertFalse(Order.objects.exists())
+
+
+class BenchmarkTests(APITestCase):
+    def test_measure_and_compare_with_baseline(self):
+        call_command("generate_synthetic_data", merchants=1, orders=40, prefix="benchmark", stdout=io.StringIO())
+        merchant = User.objects.get(username="benchmark-merchant-1")
+        benchmarks = {benchmark.name: benchmark for benchmark in BENCHMARKS}
+
+        result = measure(benchmarks["analytics_profitability"], merchant, repeat=1)
+
+        self.assertEqual(result["queries"], 4)
+        self.assertGreaterEqual(result["wall_ms"], 0)
+        report = {"results": {"10k": {"analytics_profitability": {**result, "wall_ms": 100.0}}}}
+        baseline = {"results": {"10k": {"analytics_profitability": {"wall_ms": 50.0, "peak_mb": 0.01, "queries": 3}}}}
+        rows = {row["metric"]: row for row in compare(report, baseline)}
+        self.assertEqual(rows["wall_ms"]["delta"], 1.0)
+        self.assertTrue(rows["wall_ms"]["regressed"])
+        self.assertTrue(rows["queries"]["regressed"])
+        # Tiny absolute memory changes are noise.
+        self.assertFalse(rows["peak_mb"]["regressed"])
+
+
+class QueryBudgetTests(APITestCase):
+    """Budgeted views keep a constant query count as the dataset grows."""
+
+    def setUp(self):
+        cache.clear()
+        self.merchant = User.objects.create_user(
+            username="budget", email="budget@returnshield.app", password="StrongPass123!"
+        )
+        from automation.models import AutomationRule, FraudSettings
+
+        FraudSettings.objects.create(user=self.merchant, high_value_threshold=Decimal("1000.00"))
+        AutomationRule.objects.create(
+            user=self.merchant,
+            name="Approve small returns",
+            rule_type=AutomationRule.RuleType.APPROVE,
+            trigger_field=AutomationRule.TriggerField.TOTAL_VALUE,
+            operator=AutomationRule.Operator.LESS_THAN,
+            value="100",
+        )
+
+    def _grow(self, orders):
+        call_command(
+            "generate_synthetic_data", merchants=1, orders=orders, return_rate=0.5, stdout=io.StringIO()
+        )
+
+    def _submit(self, index):
+        order = Order.objects.create(
+            user=self.merchant,
+            external_id=f"budget-{index}",
+            platform="shopify",
+            customer_email="budget-shopper@example.com",
+            total=Decimal("40.00"),
+            created_at=timezone.now(),
+            line_items=[{"line_item_id": "1", "sku": "SKU-1", "price": "40.00", "quantity": 1}],
+        )
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(
+                reverse("returns:return-submit"),
+                {"order_id": order.pk, "items": ["1"], "reason": "Too big", "resolution": "refund"},
+                format="json",
+            )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        return response, len(queries)
+
+    def _reasons(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse("returns:analytics-reasons"))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return len(queries)
+
+    def test_submit_and_reason_analytics_stay_within_budget(self):
+        self.client.force_authenticate(self.merchant)
+
+        self._grow(20)
+        first_submit, small_submit = self._submit(1)
+        small_reasons = self._reasons()
+        self._grow(200)
+        _response, large_submit = self._submit(2)
+        large_reasons = self._reasons()
+
+        self.assertEqual(first_submit.data["status"], "approved")
+        self.assertEqual(small_submit, large_submit)
+        self.assertEqual(small_reasons, large_reasons)
+
+    def test_view_over_budget_fails(self):
+        from core.query_budget import QueryBudget, QueryBudgetExceeded
+
+        self.client.force_authenticate(self.merchant)
+        with mock.patch.dict(
+            "core.query_budget.QUERY_BUDGETS", {"returns:analytics-reasons": QueryBudget(0)}
+        ), self.assertRaises(QueryBudgetExceeded):
+            self.client.get(reverse("returns:analytics-reasons"))
@@ -0,0 +1,154 @@
+"""
+Shipment tracking for return labels.
+
+EasyPost posts a ``tracker.updated`` event every time a carrier scans a
+return package. The webhook only stores each event once (``record_event``)
+and schedules a debounced ``apply_tracking_events`` run. That run claims every
+pending event, folds them through a small in-memory state machine per return
+(``ShipmentState``) and writes the outcome with one bulk update, so a burst
+of scans costs a few queries instead of one row update per event.
+"""
+from __future__ import annotations
+
+import logging
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import ReturnRequest, TrackingEvent
+
+logger = logging.getLogger(__name__)
+
+APPLY_SCHEDULED_KEY = "returns:tracking:apply-scheduled"
+APPLY_BATCH_SIZE = 1000
+TRACKER_EVENTS = {"tracker.created", "tracker.updated"}
+
+# Statuses a package does not leave once reached.
+TERMINAL_STATUSES = {"delivered", "return_to_sender", "cancelled"}
+# Return status changes triggered by a tracking status, keyed by the current
+# return status. Pending returns still wait for merchant review.
+RETURN_STATUS_TRANSITIONS = {
+    "delivered": {"approved": "completed"},
+}
+TRACKING_STATUSES = {choice for choice, _label in ReturnRequest.TRACKING_STATUS_CHOICES}
+
+
+@dataclass
+class ShipmentState:
+    """Tracking state of one return while a batch of events is applied."""
+
+    return_request: ReturnRequest
+    changed: bool = False
+
+    def apply(self, tracking_status: str, occurred_at: datetime) -> bool:
+        """Move to ``tracking_status`` if the transition is allowed; return whether it was."""
+        return_request = self.return_request
+        current = return_request.tracking_status
+        if tracking_status not in TRACKING_STATUSES:
+            return False
+        if return_request.tracking_updated_at and occurred_at < return_request.tracking_updated_at:
+            # Carriers and webhook retries deliver events out of order.
+            return False
+        if current in TERMINAL_STATUSES and tracking_status not in TERMINAL_STATUSES:
+            return False
+        if current and tracking_status == "unknown":
+            return False
+
+        return_request.tracking_status = tracking_status
+        return_request.tracking_updated_at = occurred_at
+        next_status = RETURN_STATUS_TRANSITIONS.get(tracking_status, {}).get(return_request.status)
+        if next_status:
+            return_request.status = next_status
+        self.changed = True
+        return True
+
+
+def parse_tracker_event(payload: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Pull the fields we keep out of an EasyPost webhook event, or ``None`` if it is not a tracker event."""
+    if payload.get("description") not in TRACKER_EVENTS:
+        return None
+    tracker = payload.get("result") or {}
+    tracking_code = tracker.get("tracking_code")
+    if not payload.get("id") or not tracking_code:
+        return None
+    occurred_at = parse_datetime(tracker.get("updated_at") or "") or timezone.now()
+    return {
+        "event_id": payload["id"],
+        "tracking_code": tracking_code,
+        "status": tracker.get("status") or "unknown",
+        "carrier_updated_at": occurred_at,
+        "payload": payload,
+    }
+
+
+def record_event(event: Dict[str, Any]) -> bool:
+    """Store a parsed tracker event unless it was already received. Returns whether it was new."""
+    _stored, created = TrackingEvent.objects.get_or_create(
+        event_id=event["event_id"],
+        defaults={key: value for key, value in event.items() if key != "event_id"},
+    )
+    if created:
+        transaction.on_commit(_schedule_apply)
+    return created
+
+
+def _schedule_apply() -> None:
+    # Coalesce every event received within one batch window into a single run.
+    if cache.add(APPLY_SCHEDULED_KEY, True, settings.TRACKING_BATCH_WINDOW_SECONDS):
+        from returns.tasks import apply_tracking_updates
+
+        apply_tracking_updates.apply_async(countdown=settings.TRACKING_BATCH_WINDOW_SECONDS)
+
+
+def apply_tracking_events(limit: int = APPLY_BATCH_SIZE) -> Dict[str, int]:
+    """
+    Apply up to ``limit`` pending tracking events to their returns in one write.
+
+    The whole run is one transaction. Events are claimed with
+    ``skip_locked`` so an overlapping run picks up different ones. The
+    affected returns are locked before they are read, so a merchant's
+    concurrent status change is either seen here or waits for this write
+    instead of being overwritten by it.
+    """
+    with transaction.atomic():
+        events = list(
+            TrackingEvent.objects.select_for_update(skip_locked=True)
+            .filter(processed_at__isnull=True)
+            .order_by("carrier_updated_at", "id")
+            .only("id", "tracking_code", "status", "carrier_updated_at")[:limit]
+        )
+        if not events:
+            return {"events": 0, "updated": 0, "completed": 0}
+
+        states: Dict[str, List[ShipmentState]] = {}
+        returns = (
+            ReturnRequest.objects.select_for_update()
+            .filter(tracking_number__in={event.tracking_code for event in events})
+            .order_by("id")
+            .only("id", "status", "tracking_number", "tracking_status", "tracking_updated_at")
+        )
+        for return_request in returns:
+            states.setdefault(return_request.tracking_number, []).append(ShipmentState(return_request))
+        initial_status = {
+            state.return_request.pk: state.return_request.status for group in states.values() for state in group
+        }
+
+        for event in events:
+            for state in states.get(event.tracking_code, []):
+                state.apply(event.status, event.carrier_updated_at)
+
+        now = timezone.now()
+        changed = [state.return_request for group in states.values() for state in group if state.changed]
+        for return_request in changed:
+            return_request.updated_at = now
+        ReturnRequest.objects.bulk_update(changed, ["status", "tracking_status", "tracking_updated_at", "updated_at"])
+        TrackingEvent.objects.filter(pk__in=[event.pk for event in events]).update(processed_at=now)
+
+    completed = sum(1 for r in changed if r.status == "completed" and initial_status[r.pk] != "completed")
+    return {"events": len(events), "updated": len(changed), "completed": completed}
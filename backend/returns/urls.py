@@ -1,6 +1,8 @@
 from django.urls import path
 
 from .views import ExchangeAutomationView, ExchangeCoachView, ReturnlessInsightsView, VIPResolutionView, ShopperOrderLookupView, ShopperReturnSubmitView
+from .views import LabelBatchDetailView, LabelBatchListView, LabelBatchRetryView, LabelDownloadView
+from .views import EasyPostWebhookView
 from analytics.views import ReturnReasonAnalyticsView, CohortAnalysisView, ProfitabilityImpactView
 
 app_name = "returns"
@@ -32,6 +34,14 @@ urlpatterns = [
         ShopperReturnSubmitView.as_view(),
         name="return-submit",
     ),
+    # Bulk labels
+    path("labels/batches/", LabelBatchListView.as_view(), name="label-batches"),
+    path("labels/batches/<int:pk>/", LabelBatchDetailView.as_view(), name="label-batch"),
+    path("labels/batches/<int:pk>/retry/", LabelBatchRetryView.as_view(), name="label-batch-retry"),
+    path("labels/<str:token>/", LabelDownloadView.as_view(), name="label-download"),
+    path("labels/<str:token>/<str:file_format>/", LabelDownloadView.as_view(), name="label-download-format"),
+    # Tracking
+    path("webhooks/easypost/", EasyPostWebhookView.as_view(), name="easypost-webhook"),
     # Analytics
     path("analytics/reasons/", ReturnReasonAnalyticsView.as_view(), name="analytics-reasons"),
     path("analytics/cohorts/", CohortAnalysisView.as_view(), name="analytics-cohorts"),
@@ -185,7 +185,7 @@ def build_vip_resolution_queue() -> Dict[str, Any]:
     # For MVP, we'll just return an empty queue or a placeholder if no real VIP logic exists yet.
     # But let's try to pull from recent returns.
     
-    returns = ReturnRequest.objects.filter(status='completed').order_by('-created_at')[:5]
+    returns = ReturnRequest.objects.filter(status='completed').select_related('order').order_by('-created_at')[:5]
     queue: List[Dict[str, Any]] = []
 
     for idx, req in enumerate(returns):
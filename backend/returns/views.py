@@ -1,16 +1,39 @@
 import logging
 
+from easypost.errors import SignatureVerificationError
+from easypost.util import validate_webhook
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
 from rest_framework.permissions import IsAuthenticated, AllowAny
 from rest_framework import permissions
 from rest_framework.throttling import AnonRateThrottle
+from django.conf import settings
+from django.http import FileResponse, HttpResponseNotModified
 from django.shortcuts import get_object_or_404
 
 from analytics.posthog import capture as capture_event
-
-from .serializers import ExchangeAutomationInputSerializer
+from core.db_routers import ReplicaReadMixin
+from core.timing import timed
+
+from .batches import create_label_batch, retry_failed_items
+from .labels import (
+    LABEL_CACHE_CONTROL,
+    LabelUnavailable,
+    get_label_meta,
+    label_download_url,
+    label_storage,
+    return_id_from_token,
+    schedule_label_store,
+)
+from .models import LabelBatch
+from .serializers import (
+    ExchangeAutomationInputSerializer,
+    LabelBatchCreateSerializer,
+    LabelBatchItemSerializer,
+    LabelBatchSerializer,
+)
+from .tracking import parse_tracker_event, record_event
 from .utils import (
     build_exchange_coach_actions,
     build_exchange_playbook,
@@ -38,7 +61,7 @@ class ExchangeAutomationView(APIView):
         return Response(playbook, status=status.HTTP_200_OK)
 
 
-class ReturnlessInsightsView(APIView):
+class ReturnlessInsightsView(ReplicaReadMixin, APIView):
     permission_classes = [permissions.AllowAny]
 
     def get(self, request, *args, **kwargs):
@@ -54,7 +77,7 @@ class ReturnlessInsightsView(APIView):
         return Response(insights, status=status.HTTP_200_OK)
 
 
-class ExchangeCoachView(APIView):
+class ExchangeCoachView(ReplicaReadMixin, APIView):
     permission_classes = [permissions.AllowAny]
 
     def get(self, request, *args, **kwargs):
@@ -67,7 +90,7 @@ class ExchangeCoachView(APIView):
         return Response(payload, status=status.HTTP_200_OK)
 
 
-class VIPResolutionView(APIView):
+class VIPResolutionView(ReplicaReadMixin, APIView):
     permission_classes = [permissions.AllowAny]
 
     def get(self, request, *args, **kwargs):
@@ -80,7 +103,7 @@ class VIPResolutionView(APIView):
         return Response(queue, status=status.HTTP_200_OK)
 
 
-class ShopperOrderLookupView(APIView):
+class ShopperOrderLookupView(ReplicaReadMixin, APIView):
     """
     Public endpoint for shoppers to look up their order.
     Requires 'order_number' and 'email' OR 'zip_code' (for gift returns).
@@ -210,7 +233,7 @@ class ShopperReturnSubmitView(APIView):
         # Create the return request
         return_request = ReturnRequest.objects.create(
             order=order,
-            user=order.user, # Associate with the order's user (merchant's customer record)
+            user_id=order.user_id, # Associate with the order's user (merchant's customer record)
             reason=full_reason,
             status='pending',
             items=return_items,
@@ -221,19 +244,23 @@ class ShopperReturnSubmitView(APIView):
 
         # Generate Shipping Label
         from .shipping import generate_return_label
-        label_data = generate_return_label(return_request)
+        with timed("label"):
+            label_data = generate_return_label(return_request)
         
         if label_data["label_url"]:
             return_request.shipping_label_url = label_data["label_url"]
             return_request.tracking_number = label_data["tracking_number"]
+            return_request.easypost_shipment_id = label_data.get("shipment_id", "")
             return_request.save()
+            schedule_label_store([return_request.pk])
 
         # --- Automation & Fraud Detection ---
         from automation.services import RuleEvaluator, FraudDetector
         from automation.models import AutomationRule
 
         # 1. Check Fraud
-        is_fraud, fraud_reason = FraudDetector.check_fraud(return_request)
+        with timed("fraud"):
+            is_fraud, fraud_reason = FraudDetector.check_fraud(return_request)
         if is_fraud:
             return_request.is_flagged_fraud = True
             return_request.fraud_reason = fraud_reason
@@ -243,7 +270,8 @@ class ShopperReturnSubmitView(APIView):
 
         # 2. Check Automation Rules (only if not fraud)
         if not is_fraud:
-            matched_rule = RuleEvaluator.evaluate(return_request)
+            with timed("rules"):
+                matched_rule = RuleEvaluator.evaluate(return_request)
             if matched_rule:
                 return_request.automation_rule_applied = matched_rule
                 if matched_rule.rule_type == AutomationRule.RuleType.APPROVE:
@@ -259,5 +287,131 @@ class ShopperReturnSubmitView(APIView):
             "id": return_request.id,
             "status": return_request.status,
             "message": "Return submitted successfully",
-            "label_url": return_request.shipping_label_url
+            "label_url": label_download_url(return_request)
         }, status=status.HTTP_201_CREATED)
+
+
+class LabelBatchListView(APIView):
+    """Start a bulk label purchase for many of the merchant's returns."""
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request, *args, **kwargs):
+        serializer = LabelBatchCreateSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        try:
+            batch = create_label_batch(request.user, serializer.validated_data["return_ids"])
+        except ValueError as exc:
+            return Response({"detail": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+
+        capture_event(
+            "label_batch_started",
+            distinct_id=str(request.user.pk),
+            properties={"batch_id": batch.pk, "total": batch.total},
+        )
+        return Response(LabelBatchSerializer(batch).data, status=status.HTTP_202_ACCEPTED)
+
+
+class LabelBatchDetailView(APIView):
+    """Progress of a label batch, including per-return results and errors."""
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request, pk, *args, **kwargs):
+        batch = get_object_or_404(LabelBatch, pk=pk, user=request.user)
+        items = batch.items.select_related("return_request").order_by("pk")
+        payload = LabelBatchSerializer(batch).data
+        payload["items"] = LabelBatchItemSerializer(items, many=True).data
+        return Response(payload)
+
+
+class LabelBatchRetryView(APIView):
+    """Re-run the failed items of a finished label batch."""
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request, pk, *args, **kwargs):
+        batch = get_object_or_404(LabelBatch, pk=pk, user=request.user)
+        try:
+            reset = retry_failed_items(batch)
+        except ValueError as exc:
+            return Response({"detail": str(exc)}, status=status.HTTP_409_CONFLICT)
+        batch.refresh_from_db()
+        return Response({**LabelBatchSerializer(batch).data, "retrying": reset}, status=status.HTTP_202_ACCEPTED)
+
+
+class LabelDownloadView(APIView):
+    """
+    Serve a return label from the label store.
+
+    The signed token in the URL is the only credential, so the link can be
+    emailed to shoppers. Stored labels never change, so responses carry an
+    ETag (the file's SHA-256) and may be cached for a year.
+    """
+    permission_classes = [permissions.AllowAny]
+    authentication_classes = []
+
+    def get(self, request, token, file_format=None, *args, **kwargs):
+        return_id = return_id_from_token(token)
+        if return_id is None:
+            return Response({"detail": "Invalid label link."}, status=status.HTTP_404_NOT_FOUND)
+
+        try:
+            meta = get_label_meta(return_id, file_format)
+        except LabelUnavailable as exc:
+            return Response({"detail": str(exc)}, status=status.HTTP_404_NOT_FOUND)
+        except Exception:
+            logger.exception("Could not fetch label for return %s", return_id)
+            return Response(
+                {"detail": "Label is temporarily unavailable."},
+                status=status.HTTP_503_SERVICE_UNAVAILABLE,
+            )
+
+        etag = f'"{meta["sha256"]}"'
+        if etag in request.headers.get("If-None-Match", ""):
+            response = HttpResponseNotModified()
+        else:
+            response = FileResponse(
+                label_storage().open(meta["path"], "rb"),
+                content_type=meta["content_type"],
+                filename=f"return-{return_id}-label.{meta['file_format']}",
+            )
+        response["ETag"] = etag
+        response["Cache-Control"] = LABEL_CACHE_CONTROL
+        return response
+
+
+class EasyPostWebhookView(APIView):
+    """
+    Receive EasyPost tracker events.
+
+    Events are verified and recorded once per event id; returns.tasks
+    applies them to returns in batches.
+    """
+    permission_classes = [permissions.AllowAny]
+    authentication_classes = []
+
+    def post(self, request, *args, **kwargs):
+        webhook_secret = settings.EASYPOST_WEBHOOK_SECRET
+        if not webhook_secret:
+            logger.warning("EasyPost webhook called but EASYPOST_WEBHOOK_SECRET is not configured.")
+            return Response(
+                {"detail": "EasyPost webhook is not configured."},
+                status=status.HTTP_503_SERVICE_UNAVAILABLE,
+            )
+
+        try:
+            payload = validate_webhook(request.body, request.headers, webhook_secret)
+        except SignatureVerificationError:
+            logger.warning("EasyPost webhook signature verification failed.")
+            return Response({"detail": "Invalid signature."}, status=status.HTTP_400_BAD_REQUEST)
+        except ValueError:
+            return Response({"detail": "Invalid payload."}, status=status.HTTP_400_BAD_REQUEST)
+
+        event = parse_tracker_event(payload)
+        if event is None:
+            # Acknowledge other event types so EasyPost does not retry them.
+            return Response({"received": True, "recorded": False})
+
+        recorded = record_event(event)
+        if not recorded:
+            logger.info("Ignoring duplicate EasyPost event %s", event["event_id"])
+        return Response({"received": True, "recorded": recorded})
@@ -1,6 +1,6 @@
 from django.contrib import admin
 
-from .models import ShopifyInstallation
+from .models import ShopifyInstallation, ShopifySyncRun
 
 
 @admin.register(ShopifyInstallation)
@@ -8,4 +8,25 @@ class ShopifyInstallationAdmin(admin.ModelAdmin):
     list_display = ["shop_domain", "user", "active", "last_synced_at", "created_at"]
     search_fields = ["shop_domain", "user__username", "user__email"]
     list_filter = ["active", "created_at"]
-    readonly_fields = ["created_at", "updated_at", "last_synced_at"]
+    readonly_fields = ["created_at", "updated_at", "last_synced_at", "sync_cursor", "sync_high_water_mark"]
+
+
+@admin.register(ShopifySyncRun)
+class ShopifySyncRunAdmin(admin.ModelAdmin):
+    list_display = ["installation", "kind", "status", "pages", "orders", "duration_seconds", "started_at"]
+    list_filter = ["kind", "status", "started_at"]
+    search_fields = ["installation__shop_domain"]
+    readonly_fields = [
+        "installation",
+        "kind",
+        "shards",
+        "status",
+        "resumed_from",
+        "resumed_from_cursor",
+        "pages",
+        "orders",
+        "started_at",
+        "finished_at",
+        "duration_seconds",
+        "error",
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 5.2.8 on 2026-10-19 16:56
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shopify_integration', '0002_alter_shopifyinstallation_unique_together_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='shopifyinstallation',
+            name='sync_cursor',
+            field=models.TextField(blank=True, help_text='Next page URL of the sync in progress'),
+        ),
+        migrations.AddField(
+            model_name='shopifyinstallation',
+            name='sync_high_water_mark',
+            field=models.DateTimeField(blank=True, help_text='Latest order updated_at committed by a sync', null=True),
+        ),
+        migrations.CreateModel(
+            name='ShopifySyncRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('running', 'Running'), ('completed', 'Completed'), ('paused', 'Paused at time budget'), ('failed', 'Failed')], default='running', max_length=16)),
+                ('resumed_from', models.DateTimeField(blank=True, help_text='High-water mark the run started from', null=True)),
+                ('resumed_from_cursor', models.BooleanField(default=False)),
+                ('pages', models.PositiveIntegerField(default=0)),
+                ('orders', models.PositiveIntegerField(default=0)),
+                ('started_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('duration_seconds', models.FloatField(blank=True, null=True)),
+                ('error', models.TextField(blank=True)),
+                ('installation', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='sync_runs', to='shopify_integration.shopifyinstallation')),
+            ],
+            options={
+                'ordering': ('-started_at',),
+                'indexes': [models.Index(fields=['installation', '-started_at'], name='shopify_int_install_55aa0c_idx')],
+            },
+        ),
+    ]
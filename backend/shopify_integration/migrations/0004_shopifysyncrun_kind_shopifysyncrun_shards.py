@@ -0,0 +1,23 @@
+# Generated by Django 5.2.8 on 2026-10-19 16:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shopify_integration', '0003_shopifyinstallation_sync_cursor_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='shopifysyncrun',
+            name='kind',
+            field=models.CharField(choices=[('incremental', 'Incremental'), ('backfill', 'Initial backfill')], default='incremental', max_length=16),
+        ),
+        migrations.AddField(
+            model_name='shopifysyncrun',
+            name='shards',
+            field=models.PositiveIntegerField(default=0, help_text='Time-window shards of a backfill'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.8 on 2026-10-19 17:32
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shopify_integration', '0004_shopifysyncrun_kind_shopifysyncrun_shards'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ShopifyBackfillShard',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at_min', models.DateTimeField()),
+                ('created_at_max', models.DateTimeField()),
+                ('cursor', models.TextField(blank=True, help_text='Next page URL of the window in progress')),
+                ('completed_at', models.DateTimeField(blank=True, null=True)),
+                ('run', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='backfill_shards', to='shopify_integration.shopifysyncrun')),
+            ],
+            options={
+                'ordering': ('created_at_min',),
+                'constraints': [models.UniqueConstraint(fields=('run', 'created_at_min'), name='shopify_backfill_shard_window_uniq')],
+            },
+        ),
+    ]
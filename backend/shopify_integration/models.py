@@ -21,6 +21,17 @@ class ShopifyInstallation(models.Model):
         blank=True,
         help_text="Last successful order sync timestamp"
     )
+    # Sync checkpoint, saved with every committed page so an interrupted
+    # sync resumes where it stopped instead of starting over.
+    sync_cursor = models.TextField(
+        blank=True,
+        help_text="Next page URL of the sync in progress"
+    )
+    sync_high_water_mark = models.DateTimeField(
+        null=True,
+        blank=True,
+        help_text="Latest order updated_at committed by a sync"
+    )
 
     class Meta:
         unique_together = [["user", "shop_domain"]] # Changed from ordering
@@ -35,3 +46,71 @@ class ShopifyInstallation(models.Model):
     def __str__(self) -> str:
         return f"{self.shop_domain} ({'active' if self.active else 'pending'})"
 
+
+
+class ShopifySyncRun(models.Model):
+    """
+    One run of ``sync_shopify_orders`` (or of a sharded initial backfill):
+    where it started, how far it got and how long it took.
+    """
+
+    STATUS_CHOICES = [
+        ("running", "Running"),
+        ("completed", "Completed"),
+        ("paused", "Paused at time budget"),
+        ("failed", "Failed"),
+    ]
+
+    installation = models.ForeignKey(ShopifyInstallation, on_delete=models.CASCADE, related_name="sync_runs")
+    kind = models.CharField(
+        max_length=16,
+        choices=[("incremental", "Incremental"), ("backfill", "Initial backfill")],
+        default="incremental",
+    )
+    shards = models.PositiveIntegerField(default=0, help_text="Time-window shards of a backfill")
+    status = models.CharField(max_length=16, choices=STATUS_CHOICES, default="running")
+    resumed_from = models.DateTimeField(null=True, blank=True, help_text="High-water mark the run started from")
+    resumed_from_cursor = models.BooleanField(default=False)
+    pages = models.PositiveIntegerField(default=0)
+    orders = models.PositiveIntegerField(default=0)
+    started_at = models.DateTimeField(default=timezone.now)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    duration_seconds = models.FloatField(null=True, blank=True)
+    error = models.TextField(blank=True)
+
+    class Meta:
+        ordering = ("-started_at",)
+        indexes = [models.Index(fields=["installation", "-started_at"])]
+
+    def finish(self, status: str, error: str = "") -> None:
+        self.status = status
+        self.error = error
+        self.finished_at = timezone.now()
+        self.duration_seconds = (self.finished_at - self.started_at).total_seconds()
+        self.save(update_fields=["status", "error", "finished_at", "duration_seconds", "pages", "orders"])
+
+    def __str__(self) -> str:
+        return f"{self.installation.shop_domain} sync {self.started_at:%Y-%m-%d %H:%M} ({self.status})"
+
+
+class ShopifyBackfillShard(models.Model):
+    """
+    One ``created_at`` window of a backfill and how far it got. A resumed
+    backfill skips completed windows and continues the others from their
+    cursor.
+    """
+
+    run = models.ForeignKey(ShopifySyncRun, on_delete=models.CASCADE, related_name="backfill_shards")
+    created_at_min = models.DateTimeField()
+    created_at_max = models.DateTimeField()
+    cursor = models.TextField(blank=True, help_text="Next page URL of the window in progress")
+    completed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ("created_at_min",)
+        constraints = [
+            models.UniqueConstraint(fields=["run", "created_at_min"], name="shopify_backfill_shard_window_uniq")
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.run.installation.shop_domain} {self.created_at_min:%Y-%m-%d}..{self.created_at_max:%Y-%m-%d}"
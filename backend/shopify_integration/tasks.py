@@ -2,22 +2,53 @@
 Shopify data synchronization tasks.
 """
 import logging
+import time
 from datetime import timedelta
 
 import shopify
-from celery import shared_task
+from celery import chain, chord, group, shared_task
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F
 from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from pyactiveresource.connection import ClientError, ConnectionError as ShopifyConnectionError, ServerError
 
-from shopify_integration.models import ShopifyInstallation
+from accounts.entitlements import get_snapshots
+from core.timing import timed
+from shopify_integration.models import ShopifyBackfillShard, ShopifyInstallation, ShopifySyncRun
 
 
 logger = logging.getLogger(__name__)
 
+# Dispatch order for periodic syncs; unknown tiers go last.
+SYNC_TIER_ORDER = {'elite': 0, 'scale': 1, 'launch': 2, 'trial': 3}
+SYNC_LOCK_KEY = 'shopify:sync:{installation_id}'
+# Shopify REST pages hold at most 250 orders.
+PAGE_SIZE = 250
+INITIAL_SYNC_DAYS = 365
+# Initial backfills are split into created_at windows of this many days.
+BACKFILL_WINDOW_DAYS = 7
+# Held by a backfill until its chord callback runs, so periodic syncs skip
+# the store meanwhile. Every committed shard page renews it, so it only
+# lapses once a backfill has made no progress for this long; the next
+# periodic sync then resumes the unfinished windows.
+BACKFILL_LOCK_SECONDS = 6 * 60 * 60
 
-@shared_task
+
+@shared_task(ignore_result=True)
 def sync_shopify_orders(installation_id):
     """
     Background task to sync orders from a Shopify store.
+
+    Orders are read in ``updated_at`` order from the installation's
+    high-water mark. Each page is written in one transaction together with
+    the checkpoint (next page cursor and high-water mark), so a run that is
+    killed resumes from its last committed page. A run stops itself after
+    ``SHOPIFY_SYNC_RUN_SECONDS`` and queues its continuation, well inside
+    ``CELERY_TASK_TIME_LIMIT``.
     
     Args:
         installation_id: ID of the ShopifyInstallation record
@@ -31,70 +62,309 @@ def sync_shopify_orders(installation_id):
     if not installation.active:
         logger.info(f"Skipping inactive installation: {installation.shop_domain}")
         return
+
+    # Periodic syncs are queued every 15 minutes; one run per store at a time.
+    lock_key = SYNC_LOCK_KEY.format(installation_id=installation_id)
+    if not cache.add(lock_key, True, settings.CELERY_TASK_TIME_LIMIT):
+        logger.info(f"Sync already running for {installation.shop_domain}")
+        return
+
+    if not (installation.sync_high_water_mark or installation.sync_cursor or installation.last_synced_at):
+        # Never synced: fetch the first 12 months as parallel shards instead.
+        _start_backfill(installation, lock_key)
+        return
+
+    run = ShopifySyncRun.objects.create(
+        installation=installation,
+        resumed_from=installation.sync_high_water_mark or installation.last_synced_at,
+        resumed_from_cursor=bool(installation.sync_cursor),
+    )
     
     # Initialize Shopify API session
     session = shopify.Session(installation.shop_domain, '2024-01', installation.access_token)
     shopify.ShopifyResource.activate_session(session)
     
+    continue_later = False
     try:
-        # Fetch orders since last sync (or 12 months if first sync)
-        last_sync = installation.last_synced_at or (timezone.now() - timedelta(days=365))
-        
-        logger.info(f"Syncing orders for {installation.shop_domain} since {last_sync}")
-        
-        # Shopify API limits to 250 orders per page
-        page = 1
-        synced_count = 0
+        logger.info(
+            f"Syncing orders for {installation.shop_domain} since {run.resumed_from or 'the last 12 months'}"
+            f"{' from saved cursor' if run.resumed_from_cursor else ''}"
+        )
+        deadline = time.monotonic() + settings.SHOPIFY_SYNC_RUN_SECONDS
+        orders = _first_page(installation)
         
         while True:
-            orders = shopify.Order.find(
-                created_at_min=last_sync.isoformat(),
-                limit=250,
-                page=page
-            )
+            next_page_url = getattr(orders, 'next_page_url', None) or ''
+            with timed("write_orders"), transaction.atomic():
+                for shopify_order in orders:
+                    _create_or_update_order(installation, shopify_order)
+                _save_checkpoint(installation, orders, next_page_url)
+                run.pages += 1
+                run.orders += len(orders)
+                run.save(update_fields=['pages', 'orders'])
             
-            if not orders:
+            if not next_page_url:
                 break
-            
-            for shopify_order in orders:
-                _create_or_update_order(installation, shopify_order)
-                synced_count += 1
-            
-            page += 1
-            
-            # Safety limit to prevent infinite loops
-            if page > 100:
-                logger.warning(f"Hit page limit for {installation.shop_domain}")
+            if time.monotonic() > deadline:
+                continue_later = True
                 break
+            
+            # Fetch by URL rather than next_page() so earlier pages are not kept alive.
+            with timed("shopify_page"):
+                orders = shopify.Order.find(from_=next_page_url)
         
-        # Update last sync time
-        installation.last_synced_at = timezone.now()
-        installation.save(update_fields=['last_synced_at'])
-        
-        logger.info(f"Successfully synced {synced_count} orders for {installation.shop_domain}")
+        run.finish('paused' if continue_later else 'completed')
+        logger.info(
+            f"Synced {run.orders} orders in {run.pages} pages for {installation.shop_domain}"
+            f"{'; continuing in a new run' if continue_later else ''}"
+        )
         
     except Exception as exc:
+        run.finish('failed', error=str(exc))
         logger.exception(f"Error syncing orders for {installation.shop_domain}: {exc}")
         raise
     finally:
         shopify.ShopifyResource.clear_session()
+        cache.delete(lock_key)
 
+    if continue_later:
+        sync_shopify_orders.delay(installation_id)
 
-@shared_task
+
+def _sync_start(installation):
+    # Stores last synced before checkpoints existed have no high-water mark;
+    # their last completed sync bounds the query instead of a full year.
+    return (
+        installation.sync_high_water_mark
+        or installation.last_synced_at
+        or timezone.now() - timedelta(days=INITIAL_SYNC_DAYS)
+    )
+
+
+def _first_page(installation):
+    """First page of a run: the saved cursor if there is one, else a query from the high-water mark."""
+    if installation.sync_cursor:
+        try:
+            with timed("shopify_page"):
+                return shopify.Order.find(from_=installation.sync_cursor)
+        except ClientError:
+            # Page cursors expire; the high-water mark still bounds the restart.
+            logger.warning(f"Saved sync cursor rejected for {installation.shop_domain}; restarting from high-water mark")
+    with timed("shopify_page"):
+        return shopify.Order.find(
+            status='any',
+            updated_at_min=_sync_start(installation).isoformat(),
+            order='updated_at asc',
+            limit=PAGE_SIZE,
+        )
+
+
+def _save_checkpoint(installation, orders, next_page_url):
+    """Record a committed page; a finished sync also sets ``last_synced_at``."""
+    updated = [parse_datetime(str(order.updated_at)) for order in orders if getattr(order, 'updated_at', None)]
+    updated = [value for value in updated if value is not None]
+    if updated and (installation.sync_high_water_mark is None or max(updated) > installation.sync_high_water_mark):
+        installation.sync_high_water_mark = max(updated)
+    installation.sync_cursor = next_page_url
+    update_fields = ['sync_cursor', 'sync_high_water_mark']
+    if not next_page_url:
+        installation.last_synced_at = timezone.now()
+        update_fields.append('last_synced_at')
+    installation.save(update_fields=update_fields)
+
+
+def schedule_initial_sync(installation_id):
+    """Queue a store's first sync once the install is committed."""
+    transaction.on_commit(lambda: sync_shopify_orders.delay(installation_id))
+
+
+def backfill_windows(start, end, days=BACKFILL_WINDOW_DAYS):
+    """Contiguous ``(created_at_min, created_at_max)`` windows covering ``start``..``end``."""
+    windows = []
+    while start < end:
+        window_end = min(start + timedelta(days=days), end)
+        windows.append((start, window_end))
+        start = window_end
+    return windows
+
+
+def _start_backfill(installation, lock_key):
+    """
+    Fetch the first 12 months of orders as weekly ``created_at`` shards.
+
+    Shards are dealt round-robin into ``SHOPIFY_BACKFILL_CONCURRENCY`` lanes;
+    the lanes run in parallel and the shards of one lane one after another,
+    so the store sees at most that many concurrent API clients. The chord
+    callback finalizes the checkpoint and onboarding once every lane is done.
+
+    A backfill that failed or stalled is resumed rather than restarted: its
+    completed windows are skipped and the others continue from their cursor.
+    """
+    cache.set(lock_key, True, BACKFILL_LOCK_SECONDS)
+    run = installation.sync_runs.filter(kind='backfill').exclude(status='completed').first()
+    resumed = run is not None
+    if not resumed:
+        started_at = timezone.now()
+        windows = backfill_windows(started_at - timedelta(days=INITIAL_SYNC_DAYS), started_at)
+        with transaction.atomic():
+            run = ShopifySyncRun.objects.create(
+                installation=installation, kind='backfill', shards=len(windows), started_at=started_at
+            )
+            ShopifyBackfillShard.objects.bulk_create(
+                ShopifyBackfillShard(run=run, created_at_min=window_start, created_at_max=window_end)
+                for window_start, window_end in windows
+            )
+    else:
+        run.status, run.error, run.finished_at, run.duration_seconds = 'running', '', None, None
+        run.save(update_fields=['status', 'error', 'finished_at', 'duration_seconds'])
+
+    shard_ids = list(run.backfill_shards.filter(completed_at__isnull=True).values_list('pk', flat=True))
+    callback = finish_shopify_backfill.s(installation.pk, run.pk).on_error(
+        fail_shopify_backfill.s(installation.pk, run.pk)
+    )
+    if not shard_ids:
+        # Every window is stored; only the callback is missing.
+        callback.delay([])
+        return
+    lanes = [[] for _ in range(min(settings.SHOPIFY_BACKFILL_CONCURRENCY, len(shard_ids)))]
+    for index, shard_id in enumerate(shard_ids):
+        lanes[index % len(lanes)].append(backfill_shopify_window.si(shard_id))
+    chord(group(chain(*lane) for lane in lanes))(callback)
+    logger.info(
+        f"{'Resumed' if resumed else 'Started'} backfill of {installation.shop_domain}: "
+        f"{len(shard_ids)} of {run.shards} shards in {len(lanes)} lanes"
+    )
+
+
+@shared_task(
+    bind=True,
+    autoretry_for=(ServerError, ShopifyConnectionError),
+    retry_backoff=True,
+    max_retries=5,
+)
+def backfill_shopify_window(self, shard_id):
+    """
+    Fetch every order created in one backfill window.
+
+    Like ``sync_shopify_orders``, each page is written in one transaction
+    together with the shard's cursor, so a retried or resumed shard continues
+    from its last committed page, and a shard stops after
+    ``SHOPIFY_SYNC_RUN_SECONDS``. It then replaces itself with its
+    continuation, which keeps its place in the lane and the chord. Every page
+    also renews the store's sync lock. Unlike the other sync tasks its result
+    is kept: the chord waits on it.
+    """
+    shard = ShopifyBackfillShard.objects.select_related('run__installation__user').get(pk=shard_id)
+    if shard.completed_at:
+        return
+    installation = shard.run.installation
+    lock_key = SYNC_LOCK_KEY.format(installation_id=installation.pk)
+    session = shopify.Session(installation.shop_domain, '2024-01', installation.access_token)
+    shopify.ShopifyResource.activate_session(session)
+    continue_later = False
+    try:
+        deadline = time.monotonic() + settings.SHOPIFY_SYNC_RUN_SECONDS
+        orders = _first_window_page(shard)
+        while True:
+            next_page_url = getattr(orders, 'next_page_url', None) or ''
+            with timed("write_orders"), transaction.atomic():
+                for shopify_order in orders:
+                    _create_or_update_order(installation, shopify_order)
+                shard.cursor = next_page_url
+                shard.completed_at = None if next_page_url else timezone.now()
+                shard.save(update_fields=['cursor', 'completed_at'])
+                ShopifySyncRun.objects.filter(pk=shard.run_id).update(
+                    pages=F('pages') + 1, orders=F('orders') + len(orders)
+                )
+            cache.touch(lock_key, BACKFILL_LOCK_SECONDS)
+            if not next_page_url:
+                break
+            if time.monotonic() > deadline:
+                continue_later = True
+                break
+            with timed("shopify_page"):
+                orders = shopify.Order.find(from_=next_page_url)
+    finally:
+        shopify.ShopifyResource.clear_session()
+
+    if continue_later:
+        raise self.replace(backfill_shopify_window.si(shard_id))
+
+
+def _first_window_page(shard):
+    """First page of a shard: its saved cursor if there is one, else the start of its window."""
+    if shard.cursor:
+        try:
+            with timed("shopify_page"):
+                return shopify.Order.find(from_=shard.cursor)
+        except ClientError:
+            # Page cursors expire; refetching the window is idempotent.
+            logger.warning(f"Saved cursor of backfill shard {shard.pk} rejected; restarting its window")
+    with timed("shopify_page"):
+        return shopify.Order.find(
+            status='any',
+            created_at_min=shard.created_at_min.isoformat(),
+            created_at_max=shard.created_at_max.isoformat(),
+            limit=PAGE_SIZE,
+        )
+
+
+@shared_task(ignore_result=True)
+def finish_shopify_backfill(_lane_results, installation_id, run_id):
+    """Chord callback: mark the store synced up to the backfill start and move onboarding on."""
+    run = ShopifySyncRun.objects.select_related('installation').get(pk=run_id)
+    installation = run.installation
+    # Orders changed while the backfill ran are newer than its start, so the
+    # next incremental sync picks them up from here.
+    installation.sync_high_water_mark = run.started_at
+    installation.sync_cursor = ''
+    installation.last_synced_at = timezone.now()
+    installation.save(update_fields=['sync_high_water_mark', 'sync_cursor', 'last_synced_at'])
+    get_user_model().objects.filter(pk=installation.user_id, onboarding_stage='sync').update(
+        onboarding_stage='insights'
+    )
+    run.finish('completed')
+    cache.delete(SYNC_LOCK_KEY.format(installation_id=installation_id))
+    logger.info(
+        f"Backfilled {run.orders} orders for {installation.shop_domain} in {run.duration_seconds:.0f}s"
+    )
+
+
+@shared_task(ignore_result=True)
+def fail_shopify_backfill(request, exc, traceback, installation_id, run_id):
+    """Chord error callback: record the failure and let the next periodic sync resume the unfinished windows."""
+    ShopifySyncRun.objects.get(pk=run_id).finish('failed', error=str(exc))
+    cache.delete(SYNC_LOCK_KEY.format(installation_id=installation_id))
+    logger.error(f"Backfill of installation {installation_id} failed: {exc}")
+
+
+def _sync_priority(snapshot):
+    """Broker priority of a store's sync (0 is served first); unknown tiers go last."""
+    return min(SYNC_TIER_ORDER.get(snapshot.get('tier'), len(SYNC_TIER_ORDER)) * 3, 9)
+
+
+@shared_task(ignore_result=True)
 def sync_all_installations():
     """
     Periodic task to sync all active Shopify installations.
     Runs every 15 minutes via Celery Beat.
     """
-    active_installations = ShopifyInstallation.objects.filter(active=True)
+    active_installations = list(
+        ShopifyInstallation.objects.filter(active=True).values_list('id', 'user_id')
+    )
+    
+    logger.info(f"Starting sync for {len(active_installations)} Shopify installations")
     
-    logger.info(f"Starting sync for {active_installations.count()} Shopify installations")
+    # Resolve every merchant's tier in one pass so scale/elite stores are
+    # queued ahead of the rest.
+    snapshots = get_snapshots(user_id for _, user_id in active_installations)
+    active_installations.sort(key=lambda row: _sync_priority(snapshots.get(row[1], {})))
     
-    for installation in active_installations:
-        # Queue individual sync tasks
-        sync_shopify_orders.delay(installation.id)
+    for installation_id, user_id in active_installations:
+        # Queue individual sync tasks; the sync queue serves higher tiers first.
+        sync_shopify_orders.apply_async((installation_id,), priority=_sync_priority(snapshots.get(user_id, {})))
     
-    logger.info(f"Queued sync tasks for {active_installations.count()} installations")
+    logger.info(f"Queued sync tasks for {len(active_installations)} installations")
 
 
 def _create_or_update_order(installation, shopify_order):
@@ -127,11 +397,15 @@ def _create_or_update_order(installation, shopify_order):
     if hasattr(shopify_order, 'shipping_address') and shopify_order.shipping_address:
         addr = shopify_order.shipping_address
         order_data['shipping_address'] = {
+            'name': getattr(addr, 'name', ''),
+            'phone': getattr(addr, 'phone', ''),
             'address1': getattr(addr, 'address1', ''),
             'address2': getattr(addr, 'address2', ''),
             'city': getattr(addr, 'city', ''),
             'province': getattr(addr, 'province', ''),
+            'province_code': getattr(addr, 'province_code', ''),
             'country': getattr(addr, 'country', ''),
+            'country_code': getattr(addr, 'country_code', ''),
             'zip': getattr(addr, 'zip', ''),
         }
     
@@ -163,9 +437,9 @@ def _process_refunds(installation, shopify_order, refunds):
         # Calculate refund amount
         amount = Decimal('0.00')
         if hasattr(refund, 'transactions'):
-            for transaction in refund.transactions:
-                if transaction.kind == 'refund' and transaction.status == 'success':
-                    amount += Decimal(str(transaction.amount))
+            for refund_transaction in refund.transactions:
+                if refund_transaction.kind == 'refund' and refund_transaction.status == 'success':
+                    amount += Decimal(str(refund_transaction.amount))
         
         # Determine items
         refund_items = []
@@ -1,13 +1,27 @@
+from datetime import datetime, timedelta, timezone as dt_timezone
+from types import SimpleNamespace
 from unittest import mock
 from urllib.parse import urlencode
 
+from celery.exceptions import Ignore
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
 from django.test import TestCase, override_settings
 from django.urls import reverse
+from django.utils import timezone
 from rest_framework import status
 from rest_framework.test import APIClient
 
-from shopify_integration.models import ShopifyInstallation
+from returns.models import Order
+from shopify_integration.models import ShopifyBackfillShard, ShopifyInstallation, ShopifySyncRun
+from shopify_integration.tasks import (
+    BACKFILL_LOCK_SECONDS,
+    backfill_shopify_window,
+    backfill_windows,
+    finish_shopify_backfill,
+    sync_all_installations,
+    sync_shopify_orders,
+)
 from shopify_integration.utils import ensure_myshopify_domain, generate_state
 
 User = get_user_model()
@@ -53,8 +67,8 @@ class ShopifyIntegrationTests(TestCase):
         mock_capture.assert_called_once()
 
     @mock.patch("shopify_integration.views.capture_event")
-    @mock.patch("shopify_integration.views.requests.post")
-    def test_callback_marks_install_active(self, mock_post, mock_capture):
+    @mock.patch("shopify_integration.views.get_async_client")
+    def test_callback_marks_install_active(self, mock_client, mock_capture):
         self.client.force_authenticate(self.user)
         # Create pending installation
         state = generate_state()
@@ -79,8 +93,9 @@ class ShopifyIntegrationTests(TestCase):
             hashlib.sha256,
         ).hexdigest()
 
-        mock_post.return_value.json.return_value = {"access_token": "token", "scope": "read_orders"}
-        mock_post.return_value.raise_for_status.return_value = None
+        mock_client.return_value.post = mock.AsyncMock(
+            return_value=mock.Mock(json=lambda: {"access_token": "token", "scope": "read_orders"})
+        )
 
         response = self.client.get(
             reverse("shopify_integration:callback") + "?" + urlencode({**params, "hmac": hmac_value})
@@ -93,3 +108,225 @@ class ShopifyIntegrationTests(TestCase):
         self.user.refresh_from_db()
         self.assertEqual(self.user.shopify_domain, "brand.myshopify.com")
         mock_capture.assert_called_once()
+
+
+class FakePage(list):
+    def __init__(self, orders, next_page_url=None):
+        super().__init__(orders)
+        self.next_page_url = next_page_url
+
+
+def fake_order(order_id, updated_at):
+    return SimpleNamespace(
+        id=order_id,
+        email="shopper@example.com",
+        total_price="25.00",
+        currency="USD",
+        created_at="2025-01-01T00:00:00Z",
+        updated_at=updated_at,
+        line_items=[],
+    )
+
+
+@mock.patch("shopify_integration.tasks.shopify.ShopifyResource")
+@mock.patch("shopify_integration.tasks.shopify.Order.find")
+class ShopifySyncCheckpointTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        user = User.objects.create_user(username="syncer", email="syncer@example.com", password="pass")
+        self.installation = ShopifyInstallation.objects.create(
+            user=user,
+            shop_domain="brand.myshopify.com",
+            access_token="token",
+            active=True,
+            # Incremental syncs; a store that never synced gets a backfill.
+            sync_high_water_mark=datetime(2024, 12, 1, tzinfo=dt_timezone.utc),
+        )
+
+    def test_store_synced_before_checkpoints_resumes_from_last_sync(self, mock_find, _resource):
+        last_synced_at = datetime(2025, 2, 1, tzinfo=dt_timezone.utc)
+        ShopifyInstallation.objects.filter(pk=self.installation.pk).update(
+            sync_high_water_mark=None, last_synced_at=last_synced_at
+        )
+        mock_find.side_effect = [FakePage([])]
+
+        sync_shopify_orders(self.installation.pk)
+
+        self.assertEqual(mock_find.call_args.kwargs["updated_at_min"], last_synced_at.isoformat())
+        self.assertEqual(ShopifySyncRun.objects.get().resumed_from, last_synced_at)
+
+    def test_interrupted_sync_resumes_from_last_committed_page(self, mock_find, _resource):
+        cursor = "https://brand.myshopify.com/admin/api/2024-01/orders.json?page_info=abc"
+        mock_find.side_effect = [
+            FakePage([fake_order(1, "2025-01-02T00:00:00Z"), fake_order(2, "2025-01-03T00:00:00Z")], cursor),
+            RuntimeError("worker killed"),
+        ]
+        with self.assertRaises(RuntimeError), self.assertLogs("shopify_integration.tasks", level="ERROR"):
+            sync_shopify_orders(self.installation.pk)
+
+        self.installation.refresh_from_db()
+        self.assertEqual(self.installation.sync_cursor, cursor)
+        self.assertEqual(self.installation.sync_high_water_mark.isoformat(), "2025-01-03T00:00:00+00:00")
+        self.assertIsNone(self.installation.last_synced_at)
+        failed = ShopifySyncRun.objects.get()
+        self.assertEqual((failed.status, failed.pages, failed.orders), ("failed", 1, 2))
+
+        mock_find.side_effect = [FakePage([fake_order(3, "2025-01-04T00:00:00Z")])]
+        sync_shopify_orders(self.installation.pk)
+
+        mock_find.assert_called_with(from_=cursor)
+        self.installation.refresh_from_db()
+        self.assertEqual(self.installation.sync_cursor, "")
+        self.assertIsNotNone(self.installation.last_synced_at)
+        self.assertEqual(Order.objects.filter(platform="shopify").count(), 3)
+        resumed = ShopifySyncRun.objects.latest("started_at")
+        self.assertTrue(resumed.resumed_from_cursor)
+        self.assertEqual((resumed.status, resumed.pages, resumed.orders), ("completed", 1, 1))
+        self.assertIsNotNone(resumed.duration_seconds)
+
+    @override_settings(SHOPIFY_SYNC_RUN_SECONDS=0)
+    def test_run_hands_over_at_its_time_budget(self, mock_find, _resource):
+        mock_find.return_value = FakePage([fake_order(1, "2025-01-02T00:00:00Z")], "https://next")
+        with mock.patch.object(sync_shopify_orders, "delay") as delay:
+            sync_shopify_orders(self.installation.pk)
+
+        delay.assert_called_once_with(self.installation.pk)
+        self.assertEqual(ShopifySyncRun.objects.get().status, "paused")
+        self.assertIsNone(cache.get(f"shopify:sync:{self.installation.pk}"))
+
+
+@mock.patch("shopify_integration.tasks.shopify.ShopifyResource")
+class ShopifyBackfillTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            username="newstore", email="newstore@example.com", password="pass", onboarding_stage="sync"
+        )
+        self.installation = ShopifyInstallation.objects.create(
+            user=self.user, shop_domain="new.myshopify.com", access_token="token", active=True
+        )
+
+    def _shard(self, run, created_at_min, **fields):
+        return ShopifyBackfillShard.objects.create(
+            run=run, created_at_min=created_at_min, created_at_max=created_at_min + timedelta(days=7), **fields
+        )
+
+    def test_windows_cover_the_range_without_gaps(self, _resource):
+        end = timezone.now()
+        windows = backfill_windows(end - timedelta(days=365), end)
+        self.assertEqual(len(windows), 53)
+        self.assertEqual(windows[-1][1], end)
+        self.assertTrue(all(previous[1] == current[0] for previous, current in zip(windows, windows[1:])))
+
+    @override_settings(SHOPIFY_BACKFILL_CONCURRENCY=4)
+    @mock.patch("shopify_integration.tasks.chord")
+    def test_first_sync_dispatches_sharded_backfill(self, mock_chord, _resource):
+        sync_shopify_orders(self.installation.pk)
+
+        (header,), _kwargs = mock_chord.call_args
+        lanes = list(header.tasks)
+        self.assertEqual(len(lanes), 4)
+        shards = [task for lane in lanes for task in lane.tasks]
+        self.assertEqual(len(shards), 53)
+        run = ShopifySyncRun.objects.get()
+        self.assertEqual((run.kind, run.shards, run.status), ("backfill", 53, "running"))
+        self.assertEqual(run.backfill_shards.count(), 53)
+        callback = mock_chord.return_value.call_args.args[0]
+        self.assertEqual(callback.task, "shopify_integration.tasks.finish_shopify_backfill")
+        # Periodic syncs stay out of the way until the callback runs.
+        self.assertTrue(cache.get(f"shopify:sync:{self.installation.pk}"))
+
+    @mock.patch("shopify_integration.tasks.shopify.Order.find")
+    def test_shards_then_callback_finalize_sync_and_onboarding(self, mock_find, _resource):
+        run = ShopifySyncRun.objects.create(installation=self.installation, kind="backfill", shards=1)
+        shard = self._shard(run, datetime(2025, 1, 1, tzinfo=dt_timezone.utc))
+        mock_find.side_effect = [
+            FakePage([fake_order(1, "2025-01-02T00:00:00Z")], "https://next"),
+            FakePage([fake_order(2, "2025-01-03T00:00:00Z")]),
+        ]
+        backfill_shopify_window(shard.pk)
+        self.assertEqual(mock_find.call_args_list[0].kwargs["created_at_max"], "2025-01-08T00:00:00+00:00")
+        shard.refresh_from_db()
+        self.assertIsNotNone(shard.completed_at)
+
+        cache.set(f"shopify:sync:{self.installation.pk}", True)
+        finish_shopify_backfill([None], self.installation.pk, run.pk)
+
+        run.refresh_from_db()
+        self.assertEqual((run.status, run.pages, run.orders), ("completed", 2, 2))
+        self.installation.refresh_from_db()
+        self.assertEqual(self.installation.sync_high_water_mark, run.started_at)
+        self.assertIsNotNone(self.installation.last_synced_at)
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.onboarding_stage, "insights")
+        self.assertIsNone(cache.get(f"shopify:sync:{self.installation.pk}"))
+
+    @mock.patch("shopify_integration.tasks.chord")
+    def test_failed_backfill_resumes_only_unfinished_windows(self, mock_chord, _resource):
+        run = ShopifySyncRun.objects.create(installation=self.installation, kind="backfill", shards=3)
+        run.finish("failed", error="lane crashed")
+        start = datetime(2025, 1, 1, tzinfo=dt_timezone.utc)
+        self._shard(run, start, completed_at=timezone.now())
+        partial = self._shard(run, start + timedelta(days=7), cursor="https://next")
+        untouched = self._shard(run, start + timedelta(days=14))
+
+        sync_shopify_orders(self.installation.pk)
+
+        (header,), _kwargs = mock_chord.call_args
+        shards = [task for lane in header.tasks for task in lane.tasks]
+        self.assertEqual(sorted(shard.args[0] for shard in shards), [partial.pk, untouched.pk])
+        run.refresh_from_db()
+        self.assertEqual((run.status, run.error), ("running", ""))
+        self.assertEqual(ShopifySyncRun.objects.count(), 1)
+
+    @override_settings(SHOPIFY_SYNC_RUN_SECONDS=0)
+    @mock.patch("shopify_integration.tasks.shopify.Order.find")
+    def test_shard_checkpoints_and_hands_over_at_its_time_budget(self, mock_find, _resource):
+        run = ShopifySyncRun.objects.create(installation=self.installation, kind="backfill", shards=1)
+        shard = self._shard(run, datetime(2025, 1, 1, tzinfo=dt_timezone.utc))
+        mock_find.return_value = FakePage([fake_order(1, "2025-01-02T00:00:00Z")], "https://next")
+
+        with mock.patch.object(backfill_shopify_window, "replace", side_effect=Ignore()) as replace, mock.patch(
+            "shopify_integration.tasks.cache.touch"
+        ) as touch, self.assertRaises(Ignore):
+            backfill_shopify_window(shard.pk)
+
+        self.assertEqual(replace.call_args.args[0].args, (shard.pk,))
+        shard.refresh_from_db()
+        self.assertEqual((shard.cursor, shard.completed_at), ("https://next", None))
+        # The committed page renewed the store's lock.
+        touch.assert_called_once_with(f"shopify:sync:{self.installation.pk}", BACKFILL_LOCK_SECONDS)
+
+        # The continuation starts from the saved cursor.
+        mock_find.return_value = FakePage([fake_order(2, "2025-01-03T00:00:00Z")])
+        backfill_shopify_window(shard.pk)
+        mock_find.assert_called_with(from_="https://next")
+        shard.refresh_from_db()
+        self.assertIsNotNone(shard.completed_at)
+
+
+class ShopifySyncDispatchTests(TestCase):
+    @mock.patch("shopify_integration.tasks.get_snapshots")
+    @mock.patch.object(sync_shopify_orders, "apply_async")
+    def test_syncs_are_queued_with_tier_priority(self, mock_apply_async, mock_snapshots):
+        installations = {}
+        for tier in ("trial", "elite", "scale"):
+            user = User.objects.create_user(username=f"{tier}-merchant", email=f"{tier}@example.com", password="pass")
+            installations[tier] = ShopifyInstallation.objects.create(
+                user=user, shop_domain=f"{tier}.myshopify.com", active=True
+            )
+        mock_snapshots.return_value = {
+            installation.user_id: {"tier": tier} for tier, installation in installations.items()
+        }
+
+        sync_all_installations()
+
+        calls = [(call.args[0], call.kwargs["priority"]) for call in mock_apply_async.call_args_list]
+        self.assertEqual(
+            calls,
+            [
+                ((installations["elite"].pk,), 0),
+                ((installations["scale"].pk,), 3),
+                ((installations["trial"].pk,), 9),
+            ],
+        )
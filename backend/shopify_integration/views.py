@@ -1,7 +1,9 @@
 import logging
 from typing import Dict
 
-import requests
+import httpx
+from adrf.views import APIView as AsyncAPIView
+from asgiref.sync import sync_to_async
 from django.conf import settings
 from django.utils import timezone
 from rest_framework import permissions, status
@@ -9,7 +11,9 @@ from rest_framework.response import Response
 from rest_framework.views import APIView
 
 from analytics.posthog import capture as capture_event
+from core.http import get_async_client
 from shopify_integration.models import ShopifyInstallation
+from shopify_integration.tasks import schedule_initial_sync
 
 from .serializers import InstallRequestSerializer
 from .utils import build_install_url, ensure_myshopify_domain, generate_state, verify_hmac
@@ -53,10 +57,10 @@ class ShopifyInstallUrlView(APIView):
         return Response({"install_url": install_url, "state": state})
 
 
-class ShopifyCallbackView(APIView):
+class ShopifyCallbackView(AsyncAPIView):
     permission_classes: list = []  # Shopify callback
 
-    def get(self, request, *args, **kwargs):
+    async def get(self, request, *args, **kwargs):
         params: Dict[str, str] = request.query_params.dict()
         logger.debug("Shopify callback params: %s", params)
 
@@ -74,13 +78,15 @@ class ShopifyCallbackView(APIView):
             return Response({"detail": "Invalid HMAC signature."}, status=status.HTTP_400_BAD_REQUEST)
 
         try:
-            installation = ShopifyInstallation.objects.get(state=state, shop_domain=shop_domain)
+            installation = await ShopifyInstallation.objects.select_related("user").aget(
+                state=state, shop_domain=shop_domain
+            )
         except ShopifyInstallation.DoesNotExist:
             return Response({"detail": "Unknown installation request."}, status=status.HTTP_400_BAD_REQUEST)
 
         token_url = f"https://{shop_domain}/admin/oauth/access_token"
         try:
-            response = requests.post(
+            response = await get_async_client().post(
                 token_url,
                 json={
                     "client_id": settings.SHOPIFY_CLIENT_ID,
@@ -90,7 +96,7 @@ class ShopifyCallbackView(APIView):
                 timeout=15,
             )
             response.raise_for_status()
-        except requests.RequestException as exc:
+        except httpx.HTTPError as exc:
             logger.exception("Failed to exchange Shopify token: %s", exc)
             return Response({"detail": "Failed to finalize Shopify install."}, status=502)
 
@@ -101,12 +107,13 @@ class ShopifyCallbackView(APIView):
         if not access_token:
             return Response({"detail": "Shopify response missing access token."}, status=502)
 
-        installation.mark_installed(access_token=access_token, scope=scope)
+        await sync_to_async(installation.mark_installed)(access_token=access_token, scope=scope)
+        await sync_to_async(schedule_initial_sync)(installation.pk)
 
         user = installation.user
         user.shopify_domain = shop_domain
         user.onboarding_stage = "sync"
-        user.save(update_fields=["shopify_domain", "onboarding_stage"])
+        await user.asave(update_fields=["shopify_domain", "onboarding_stage"])
 
         capture_event(
             "shopify_install_completed",
@@ -1,3 +1,46 @@
+from django.conf import settings
 from django.db import models
+from django.utils import timezone
 
-# Create your models here.
+
+class SupportTicket(models.Model):
+    """
+    Support message submitted from the dashboard (transactional outbox).
+
+    The API stores the ticket and returns immediately;
+    ``support.tasks.drain_support_outbox`` delivers queued tickets to HelpScout.
+    """
+
+    class Status(models.TextChoices):
+        QUEUED = "queued", "Queued"
+        SUBMITTED = "submitted", "Submitted"
+        FAILED = "failed", "Failed"
+
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="support_tickets")
+    subject = models.CharField(max_length=200)
+    message = models.TextField()
+    customer_email = models.EmailField()
+    customer_first_name = models.CharField(max_length=120, blank=True)
+    customer_last_name = models.CharField(max_length=120, blank=True)
+    tags = models.JSONField(default=list, blank=True)
+    metadata = models.JSONField(default=dict, blank=True)
+
+    status = models.CharField(max_length=16, choices=Status.choices, default=Status.QUEUED)
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    conversation_id = models.CharField(max_length=64, blank=True)
+    mailbox_id = models.CharField(max_length=64, blank=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    submitted_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ("-created_at",)
+        indexes = [
+            models.Index(fields=["status", "next_attempt_at"], name="support_outbox_due_idx"),
+            models.Index(fields=["user", "-created_at"], name="support_ticket_user_idx"),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.subject} ({self.status})"
@@ -1,5 +1,7 @@
 from rest_framework import serializers
 
+from .models import SupportTicket
+
 
 class SupportMessageSerializer(serializers.Serializer):
     subject = serializers.CharField(max_length=200)
@@ -16,3 +18,25 @@ class SupportMessageSerializer(serializers.Serializer):
     def validate_tags(self, value):
         return [tag.strip() for tag in value if tag.strip()]
 
+
+
+class SupportTicketSerializer(serializers.ModelSerializer):
+    ticketId = serializers.IntegerField(source="id", read_only=True)
+    conversationId = serializers.CharField(source="conversation_id", read_only=True)
+    mailboxId = serializers.CharField(source="mailbox_id", read_only=True)
+    createdAt = serializers.DateTimeField(source="created_at", read_only=True)
+    submittedAt = serializers.DateTimeField(source="submitted_at", read_only=True)
+
+    class Meta:
+        model = SupportTicket
+        fields = [
+            "ticketId",
+            "subject",
+            "status",
+            "attempts",
+            "conversationId",
+            "mailboxId",
+            "createdAt",
+            "submittedAt",
+        ]
+        read_only_fields = fields
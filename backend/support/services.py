@@ -1,13 +1,20 @@
 from __future__ import annotations
 
 import logging
+import time
+from datetime import timedelta
 from typing import Any, Dict, Optional
 
 import requests
 from django.conf import settings
 from django.core.cache import cache
+from django.db import transaction
 from django.utils import timezone
 
+from core.http import get_session
+
+from .models import SupportTicket
+
 logger = logging.getLogger(__name__)
 
 
@@ -16,21 +23,34 @@ class HelpScoutClient:
     Lightweight client for HelpScout's Mailbox API.
 
     Uses the client credentials flow to obtain an access token and caches it
-    until expiry to avoid unnecessary authentication calls.
+    until expiry to avoid unnecessary authentication calls. Only one process
+    fetches a token at a time (a cache lock); the others wait for its result.
+    Tokens close to expiry are refreshed by ``support.tasks.refresh_helpscout_token``
+    while the current one keeps being served.
     """
 
     TOKEN_CACHE_KEY = "helpscout_access_token"
+    REFRESH_LOCK_KEY = "helpscout_access_token:refreshing"
+    REFRESH_SCHEDULED_KEY = "helpscout_access_token:refresh_scheduled"
     BASE_URL = "https://api.helpscout.net/v2"
 
+    # Tokens are refreshed in the background this long before they expire.
+    REFRESH_AHEAD_SECONDS = 10 * 60
+    REFRESH_LOCK_TIMEOUT = 30
+    REFRESH_WAIT_SECONDS = 5.0
+    REFRESH_POLL_SECONDS = 0.1
+
     def __init__(
         self,
         app_id: Optional[str] = None,
         app_secret: Optional[str] = None,
         mailbox_id: Optional[str] = None,
+        base_url: Optional[str] = None,
     ) -> None:
         self.app_id = app_id or settings.HELPSCOUT_APP_ID
         self.app_secret = app_secret or settings.HELPSCOUT_APP_SECRET
         self.mailbox_id = mailbox_id or settings.HELPSCOUT_MAILBOX_ID
+        self.base_url = (base_url or settings.HELPSCOUT_API_BASE_URL or self.BASE_URL).rstrip("/")
 
     def is_configured(self) -> bool:
         return bool(self.app_id and self.app_secret and self.mailbox_id)
@@ -40,40 +60,96 @@ class HelpScoutClient:
         return max(expires_in - 60, 60)
 
     def get_access_token(self, *, force_refresh: bool = False) -> str:
-        token: Optional[str] = None
         if not force_refresh:
-            cached: Optional[Dict[str, Any]] = cache.get(self.TOKEN_CACHE_KEY)
-            if cached:
-                token = cached.get("token")
-        if token:
-            return token
+            entry = cache.get(self.TOKEN_CACHE_KEY)
+            if entry and entry.get("token"):
+                if self._due_for_refresh(entry):
+                    self._schedule_background_refresh()
+                return entry["token"]
 
         if not self.is_configured():
             raise ValueError("HelpScout credentials are not configured.")
 
-        response = requests.post(
-            f"{self.BASE_URL}/oauth2/token",
+        # Single flight: one process fetches, the rest wait for its token.
+        if not cache.add(self.REFRESH_LOCK_KEY, True, self.REFRESH_LOCK_TIMEOUT):
+            deadline = time.monotonic() + self.REFRESH_WAIT_SECONDS
+            while time.monotonic() < deadline:
+                time.sleep(self.REFRESH_POLL_SECONDS)
+                entry = cache.get(self.TOKEN_CACHE_KEY)
+                if entry and entry.get("token") and not self._predates_refresh(entry, force_refresh):
+                    return entry["token"]
+            logger.warning("Timed out waiting for HelpScout token refresh; fetching directly.")
+            return self._fetch_token()
+
+        try:
+            return self._fetch_token()
+        finally:
+            cache.delete(self.REFRESH_LOCK_KEY)
+
+    def _fetch_token(self) -> str:
+        response = get_session().post(
+            f"{self.base_url}/oauth2/token",
             headers={"Content-Type": "application/x-www-form-urlencoded"},
-            data={
-                "grant_type": "client_credentials",
-                "client_id": self.app_id,
-                "client_secret": self.app_secret,
-            },
+            data=self._token_request_data(),
             timeout=15,
         )
         response.raise_for_status()
-        payload = response.json()
+        token, entry, timeout = self._token_cache_entry(response.json())
+        cache.set(self.TOKEN_CACHE_KEY, entry, timeout=timeout)
+        return token
+
+    def refresh_if_due(self) -> bool:
+        """Refresh the cached token if it is missing or inside the refresh-ahead window."""
+        entry = cache.get(self.TOKEN_CACHE_KEY)
+        if entry and entry.get("token") and not self._due_for_refresh(entry):
+            return False
+        self.get_access_token(force_refresh=True)
+        return True
+
+    @staticmethod
+    def _due_for_refresh(entry: Dict[str, Any]) -> bool:
+        refresh_after = entry.get("refresh_after")
+        return refresh_after is not None and time.time() >= refresh_after
+
+    @staticmethod
+    def _predates_refresh(entry: Dict[str, Any], force_refresh: bool) -> bool:
+        # A forced refresh must not settle for the token it is replacing.
+        return force_refresh and time.time() - entry.get("fetched_at_ts", 0) > HelpScoutClient.REFRESH_WAIT_SECONDS
+
+    def _schedule_background_refresh(self) -> None:
+        if not cache.add(self.REFRESH_SCHEDULED_KEY, True, self.REFRESH_LOCK_TIMEOUT):
+            return
+        from support.tasks import refresh_helpscout_token
+
+        try:
+            refresh_helpscout_token.delay()
+        except Exception:
+            logger.exception("Could not schedule HelpScout token refresh.")
+            cache.delete(self.REFRESH_SCHEDULED_KEY)
+
+    def _token_request_data(self) -> Dict[str, str]:
+        return {
+            "grant_type": "client_credentials",
+            "client_id": self.app_id,
+            "client_secret": self.app_secret,
+        }
+
+    def _token_cache_entry(self, payload: Dict[str, Any]) -> tuple[str, Dict[str, Any], int]:
         token = payload["access_token"]
         expires_in = int(payload.get("expires_in", 3600))
-        cache.set(
-            self.TOKEN_CACHE_KEY,
-            {"token": token, "fetched_at": timezone.now()},
-            timeout=self._cache_timeout(expires_in),
-        )
-        return token
+        now = time.time()
+        entry = {
+            "token": token,
+            "fetched_at": timezone.now(),
+            "fetched_at_ts": now,
+            # Refresh in the background well before the cached entry expires so
+            # requests never wait on a token fetch at rollover.
+            "refresh_after": now + max(expires_in - self.REFRESH_AHEAD_SECONDS, expires_in // 2),
+        }
+        return token, entry, self._cache_timeout(expires_in)
 
-    def _headers(self) -> Dict[str, str]:
-        token = self.get_access_token()
+    def _headers(self, *, force_refresh: bool = False) -> Dict[str, str]:
+        token = self.get_access_token(force_refresh=force_refresh)
         return {
             "Authorization": f"Bearer {token}",
             "Content-Type": "application/json",
@@ -93,6 +169,66 @@ class HelpScoutClient:
         if not self.is_configured():
             raise ValueError("HelpScout credentials are not configured.")
 
+        payload = self._conversation_payload(
+            subject=subject,
+            body=body,
+            customer_email=customer_email,
+            customer_first_name=customer_first_name,
+            customer_last_name=customer_last_name,
+            tags=tags,
+            metadata=metadata,
+        )
+        response = get_session().post(
+            f"{self.base_url}/conversations",
+            headers=self._headers(),
+            json=payload,
+            timeout=20,
+        )
+        if response.status_code == 401:
+            # The cached token was revoked or expired early: fetch a new one once.
+            response = get_session().post(
+                f"{self.base_url}/conversations",
+                headers=self._headers(force_refresh=True),
+                json=payload,
+                timeout=20,
+            )
+
+        try:
+            response.raise_for_status()
+        except requests.HTTPError as exc:
+            logger.error(
+                "HelpScout conversation creation failed: %s",
+                exc,
+                extra={"response": response.text},
+            )
+            raise
+
+        return self._conversation_result(response)
+
+    @staticmethod
+    def _conversation_result(response) -> Dict[str, Any]:
+        # HelpScout answers 201 with an empty body and the new conversation's
+        # ID in the Resource-ID header.
+        try:
+            result = response.json() or {}
+        except ValueError:
+            result = {}
+        resource_id = response.headers.get("Resource-ID")
+        if resource_id and "id" not in result:
+            result["id"] = int(resource_id) if resource_id.isdigit() else resource_id
+        return result
+
+    def _conversation_payload(
+        self,
+        *,
+        subject: str,
+        body: str,
+        customer_email: str,
+        customer_first_name: Optional[str],
+        customer_last_name: Optional[str],
+        tags: Optional[list[str]],
+        metadata: Optional[Dict[str, Any]],
+    ) -> Dict[str, Any]:
         payload: Dict[str, Any] = {
             "type": "email",
             "mailboxId": int(self.mailbox_id),
@@ -122,26 +258,120 @@ class HelpScoutClient:
             payload["fields"] = [
                 {"name": key, "value": value} for key, value in metadata.items()
             ]
+        return payload
 
-        response = requests.post(
-            f"{self.BASE_URL}/conversations",
-            headers=self._headers(),
-            json=payload,
-            timeout=20,
-        )
 
-        try:
-            response.raise_for_status()
-        except requests.HTTPError as exc:
-            logger.error(
-                "HelpScout conversation creation failed: %s",
-                exc,
-                extra={"response": response.text},
-            )
-            raise
+# --- Outbox -----------------------------------------------------------------
+
+OUTBOX_BATCH_SIZE = 50
+OUTBOX_MAX_ATTEMPTS = 8
+OUTBOX_RETRY_BASE_SECONDS = 30
+OUTBOX_RETRY_CAP_SECONDS = 60 * 60
+# Claimed tickets are hidden from other drains for this long, so a drain
+# that dies mid-batch hands its unsent tickets back once the lease runs out.
+OUTBOX_CLAIM_LEASE = timedelta(minutes=15)
+DRAIN_SCHEDULED_KEY = "support:outbox-drain-scheduled"
+
+
+def queue_support_ticket(user, data: Dict[str, Any]) -> SupportTicket:
+    """Persist a support message and schedule delivery once the transaction commits."""
+    ticket = SupportTicket.objects.create(
+        user=user,
+        subject=data["subject"],
+        message=data["message"],
+        customer_email=data["customer_email"],
+        customer_first_name=data.get("customer_first_name") or "",
+        customer_last_name=data.get("customer_last_name") or "",
+        tags=data.get("tags") or [],
+        metadata={"source": "ReturnShield Dashboard"},
+    )
+    transaction.on_commit(_schedule_drain)
+    return ticket
+
+
+def _schedule_drain() -> None:
+    if cache.add(DRAIN_SCHEDULED_KEY, True, 5):
+        from support.tasks import drain_support_outbox
 
         try:
-            return response.json()
-        except ValueError:
-            return {}
+            drain_support_outbox.delay()
+        except Exception:
+            # The periodic sweep delivers the ticket if the broker is unavailable.
+            logger.exception("Could not schedule support outbox drain.")
+            cache.delete(DRAIN_SCHEDULED_KEY)
+
+
+def _is_permanent(exc: Exception) -> bool:
+    # 401 survives a token refresh only while credentials are being rotated,
+    # and 429 is rate limiting: both are retried.
+    response = getattr(exc, "response", None)
+    status_code = getattr(response, "status_code", None)
+    return status_code is not None and 400 <= status_code < 500 and status_code not in (401, 429)
+
+
+def _claim_due_tickets(limit: int) -> list[SupportTicket]:
+    """Lease up to ``limit`` due tickets to this drain before anything is posted."""
+    now = timezone.now()
+    with transaction.atomic():
+        due = list(
+            SupportTicket.objects.select_for_update(skip_locked=True)
+            .filter(status=SupportTicket.Status.QUEUED, next_attempt_at__lte=now)
+            .order_by("next_attempt_at", "id")[:limit]
+        )
+        SupportTicket.objects.filter(pk__in=[ticket.pk for ticket in due]).update(
+            next_attempt_at=now + OUTBOX_CLAIM_LEASE
+        )
+    return due
+
+
+def drain_outbox(client: Optional[HelpScoutClient] = None, limit: int = OUTBOX_BATCH_SIZE) -> Dict[str, int]:
+    """
+    Deliver up to ``limit`` due tickets to HelpScout.
+
+    The batch shares one access token and the pooled session. Tickets are
+    claimed before posting and each outcome is saved as soon as it is known,
+    so an overlapping or later drain never creates a second conversation.
+    Transient failures are retried with exponential backoff; HelpScout
+    rejecting a ticket (4xx other than 401 and 429) marks it failed straight
+    away.
+    """
+    client = client or HelpScoutClient()
+    totals = {"submitted": 0, "retrying": 0, "failed": 0}
+    if not client.is_configured():
+        return totals
 
+    for ticket in _claim_due_tickets(limit):
+        ticket.attempts += 1
+        try:
+            result = client.create_conversation(
+                subject=ticket.subject,
+                body=ticket.message,
+                customer_email=ticket.customer_email,
+                customer_first_name=ticket.customer_first_name,
+                customer_last_name=ticket.customer_last_name,
+                tags=ticket.tags,
+                metadata=ticket.metadata,
+            )
+        except Exception as exc:
+            ticket.last_error = str(exc)[:2000]
+            if _is_permanent(exc) or ticket.attempts >= OUTBOX_MAX_ATTEMPTS:
+                ticket.status = SupportTicket.Status.FAILED
+                totals["failed"] += 1
+            else:
+                delay = min(OUTBOX_RETRY_BASE_SECONDS * (2 ** (ticket.attempts - 1)), OUTBOX_RETRY_CAP_SECONDS)
+                ticket.next_attempt_at = timezone.now() + timedelta(seconds=delay)
+                totals["retrying"] += 1
+            logger.warning("HelpScout delivery failed for support ticket %s: %s", ticket.pk, exc)
+        else:
+            ticket.status = SupportTicket.Status.SUBMITTED
+            ticket.conversation_id = str(result.get("id") or "")
+            ticket.mailbox_id = str(result.get("mailboxId") or client.mailbox_id)
+            ticket.last_error = ""
+            ticket.submitted_at = timezone.now()
+            totals["submitted"] += 1
+        ticket.save(
+            update_fields=[
+                "status", "attempts", "last_error", "next_attempt_at", "conversation_id", "mailbox_id", "submitted_at"
+            ]
+        )
+    return totals
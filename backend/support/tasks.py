@@ -0,0 +1,55 @@
+"""
+HelpScout maintenance tasks.
+"""
+import logging
+
+from celery import shared_task
+from django.core.cache import cache
+
+from support.services import DRAIN_SCHEDULED_KEY, OUTBOX_BATCH_SIZE, HelpScoutClient, drain_outbox
+
+
+logger = logging.getLogger(__name__)
+
+DRAIN_LOCK_KEY = "support:outbox-drain-lock"
+DRAIN_LOCK_TIMEOUT = 10 * 60
+
+
+@shared_task(ignore_result=True)
+def refresh_helpscout_token():
+    """
+    Refresh the shared HelpScout access token ahead of expiry.
+    Triggered when a request sees a token inside the refresh window and
+    periodically by Celery Beat so the token is always warm.
+    """
+    client = HelpScoutClient()
+    try:
+        if not client.is_configured():
+            return
+        if client.refresh_if_due():
+            logger.info("Refreshed HelpScout access token")
+    finally:
+        cache.delete(HelpScoutClient.REFRESH_SCHEDULED_KEY)
+
+
+@shared_task(ignore_result=True)
+def drain_support_outbox():
+    """
+    Deliver queued support tickets to HelpScout.
+    Triggered after a ticket is queued and swept every minute by Celery Beat.
+    """
+    cache.delete(DRAIN_SCHEDULED_KEY)
+    if not cache.add(DRAIN_LOCK_KEY, True, DRAIN_LOCK_TIMEOUT):
+        return
+
+    try:
+        client = HelpScoutClient()
+        while True:
+            totals = drain_outbox(client)
+            if sum(totals.values()) < OUTBOX_BATCH_SIZE:
+                break
+    finally:
+        cache.delete(DRAIN_LOCK_KEY)
+
+    if any(totals.values()):
+        logger.info(f"Support outbox drained: {totals}")
@@ -0,0 +1,46 @@
+"""
+Local stand-in for the HelpScout Mailbox API.
+
+``HelpScoutStub`` serves the two endpoints ReturnShield uses (token and
+conversation creation) on a loopback port so the outbox can be exercised
+end to end without network access::
+
+    with HelpScoutStub() as stub, override_settings(HELPSCOUT_API_BASE_URL=stub.base_url):
+        drain_outbox()
+    stub.conversations  # payloads received
+
+It can also be run by hand for local development by pointing
+``HELPSCOUT_API_BASE_URL`` at ``stub.base_url``.
+"""
+from __future__ import annotations
+
+from typing import Any, Dict, List, Mapping
+
+from core.testing import LoopbackStub
+
+
+class HelpScoutStub(LoopbackStub):
+    def __init__(self, *, fail_next: int = 0, fail_status: int = 503) -> None:
+        super().__init__()
+        self.conversations: List[Dict[str, Any]] = []
+        self.token_requests = 0
+        # The next ``fail_next`` conversation requests answer ``fail_status``.
+        self.fail_next = fail_next
+        self.fail_status = fail_status
+
+    def handle(self, path: str, headers: Mapping[str, str], body: Dict[str, Any]):
+        if path == "/v2/oauth2/token":
+            with self._lock:
+                self.token_requests += 1
+            return 200, {"access_token": "stub-token", "expires_in": 172800}
+        if path != "/v2/conversations":
+            return 404, {"message": "Not found"}
+        if headers.get("Authorization") != "Bearer stub-token":
+            return 401, {"message": "Unauthorized"}
+        with self._lock:
+            if self.fail_next:
+                self.fail_next -= 1
+                return self.fail_status, {"message": "Stubbed failure"}
+            self.conversations.append(body)
+            conversation_id = 1000 + len(self.conversations)
+        return 201, None, {"Resource-ID": str(conversation_id)}
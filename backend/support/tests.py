@@ -3,10 +3,14 @@ from unittest import mock
 from django.contrib.auth import get_user_model
 from django.core.cache import cache
 from django.test import TestCase, override_settings
+from django.utils import timezone
 from rest_framework import status
 from rest_framework.test import APITestCase
 
-from support.services import HelpScoutClient
+from core.http import reset_breakers
+from support.models import SupportTicket
+from support.services import HelpScoutClient, drain_outbox, queue_support_ticket
+from support.testing import HelpScoutStub
 
 
 User = get_user_model()
@@ -21,8 +25,9 @@ class HelpScoutClientTests(TestCase):
     def setUp(self):
         cache.clear()
 
-    @mock.patch("support.services.requests.post")
-    def test_token_cached_after_first_request(self, mock_post):
+    @mock.patch("support.services.get_session")
+    def test_token_cached_after_first_request(self, mock_session):
+        mock_post = mock_session.return_value.post
         mock_post.return_value.json.return_value = {
             "access_token": "access123",
             "expires_in": 120,
@@ -38,8 +43,9 @@ class HelpScoutClientTests(TestCase):
         self.assertEqual(mock_post.call_count, 1)
 
     @mock.patch.object(HelpScoutClient, "get_access_token", return_value="access123")
-    @mock.patch("support.services.requests.post")
-    def test_create_conversation_payload(self, mock_post, mock_token):
+    @mock.patch("support.services.get_session")
+    def test_create_conversation_payload(self, mock_session, mock_token):
+        mock_post = mock_session.return_value.post
         mock_post.return_value.json.return_value = {"id": 99, "mailboxId": 123456}
         mock_post.return_value.raise_for_status.return_value = None
 
@@ -59,6 +65,35 @@ class HelpScoutClientTests(TestCase):
         self.assertEqual(request_kwargs["json"]["mailboxId"], 123456)
         self.assertEqual(request_kwargs["json"]["tags"], ["urgent"])
 
+    @mock.patch("support.services.get_session")
+    def test_concurrent_refresh_waits_for_lock_holder(self, mock_session):
+        cache.add(HelpScoutClient.REFRESH_LOCK_KEY, True, 30)
+
+        def other_worker_finishes(_seconds):
+            cache.set(HelpScoutClient.TOKEN_CACHE_KEY, {"token": "from-other-worker"}, 60)
+
+        with mock.patch("support.services.time.sleep", side_effect=other_worker_finishes):
+            token = HelpScoutClient().get_access_token()
+
+        self.assertEqual(token, "from-other-worker")
+        mock_session.return_value.post.assert_not_called()
+
+    @mock.patch("support.tasks.refresh_helpscout_token.delay")
+    @mock.patch("support.services.get_session")
+    def test_token_near_expiry_refreshed_in_background(self, mock_session, mock_delay):
+        cache.set(
+            HelpScoutClient.TOKEN_CACHE_KEY,
+            {"token": "still-valid", "refresh_after": 0},
+            60,
+        )
+
+        client = HelpScoutClient()
+        self.assertEqual(client.get_access_token(), "still-valid")
+        self.assertEqual(client.get_access_token(), "still-valid")
+
+        mock_delay.assert_called_once_with()
+        mock_session.return_value.post.assert_not_called()
+
 
 @override_settings(
     HELPSCOUT_APP_ID="app_id",
@@ -80,19 +115,97 @@ class SupportMessageViewTests(APITestCase):
             "customer_email": "ops@returnshield.app",
         }
 
-        with mock.patch("support.views.HelpScoutClient") as mock_client_cls, mock.patch(
-            "support.views.capture_event"
-        ) as mock_capture_event:
-            mock_client = mock_client_cls.return_value
-            mock_client.create_conversation.return_value = {
-                "id": 321,
-                "mailboxId": 123456,
-            }
-
+        with mock.patch("support.views.capture_event") as mock_capture_event:
             self.client.force_authenticate(self.user)
             response = self.client.post("/api/support/messages/", payload, format="json")
 
-        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
-        mock_client.create_conversation.assert_called_once()
-        self.assertEqual(response.data["status"], "submitted")
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(response.data["status"], "queued")
+        ticket = SupportTicket.objects.get(pk=response.data["ticketId"])
+        self.assertEqual(ticket.user, self.user)
+        self.assertEqual(ticket.subject, "Launch blocker")
         mock_capture_event.assert_called_once()
+
+        listing = self.client.get("/api/support/messages/")
+        self.assertEqual([item["ticketId"] for item in listing.data], [ticket.pk])
+
+
+@override_settings(
+    HELPSCOUT_APP_ID="app_id",
+    HELPSCOUT_APP_SECRET="app_secret",
+    HELPSCOUT_MAILBOX_ID="123456",
+)
+class SupportOutboxTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        reset_breakers()
+        self.user = User.objects.create_user(
+            username="outbox",
+            email="outbox@returnshield.app",
+            password="StrongPass123!",
+        )
+        self.ticket = queue_support_ticket(
+            self.user,
+            {"subject": "Label help", "message": "Labels fail.", "customer_email": "outbox@returnshield.app"},
+        )
+
+    def test_outbox_drained_against_local_stub(self):
+        with HelpScoutStub(fail_next=1) as stub, override_settings(HELPSCOUT_API_BASE_URL=stub.base_url):
+            first = drain_outbox()
+            SupportTicket.objects.update(next_attempt_at=timezone.now())
+            second = drain_outbox()
+
+        self.assertEqual(first, {"submitted": 0, "retrying": 1, "failed": 0})
+        self.assertEqual(second, {"submitted": 1, "retrying": 0, "failed": 0})
+        self.assertEqual(stub.token_requests, 1)
+        self.assertEqual(stub.conversations[0]["subject"], "Label help")
+        self.ticket.refresh_from_db()
+        self.assertEqual(self.ticket.status, SupportTicket.Status.SUBMITTED)
+        self.assertEqual(self.ticket.conversation_id, "1001")
+        self.assertEqual(self.ticket.attempts, 2)
+
+    def test_rejected_ticket_marked_failed(self):
+        with HelpScoutStub(fail_next=1, fail_status=400) as stub, override_settings(
+            HELPSCOUT_API_BASE_URL=stub.base_url
+        ):
+            totals = drain_outbox()
+
+        self.assertEqual(totals["failed"], 1)
+        self.ticket.refresh_from_db()
+        self.assertEqual(self.ticket.status, SupportTicket.Status.FAILED)
+
+    def test_revoked_token_is_refreshed_and_the_ticket_delivered(self):
+        cache.set(HelpScoutClient.TOKEN_CACHE_KEY, {"token": "revoked-token"}, 3600)
+        with HelpScoutStub() as stub, override_settings(HELPSCOUT_API_BASE_URL=stub.base_url):
+            totals = drain_outbox()
+
+        self.assertEqual(totals, {"submitted": 1, "retrying": 0, "failed": 0})
+        self.assertEqual(stub.token_requests, 1)
+        self.assertEqual(cache.get(HelpScoutClient.TOKEN_CACHE_KEY)["token"], "stub-token")
+
+    def test_each_ticket_is_saved_before_the_next_is_posted(self):
+        second = queue_support_ticket(
+            self.user,
+            {"subject": "Refund help", "message": "Refund missing.", "customer_email": "outbox@returnshield.app"},
+        )
+        client = mock.Mock(mailbox_id="123456")
+
+        def create_conversation(**kwargs):
+            if kwargs["subject"] == "Refund help":
+                # An overlapping drain finds both tickets claimed, and the
+                # first one is already recorded when the worker dies.
+                self.assertEqual(drain_outbox(client), {"submitted": 0, "retrying": 0, "failed": 0})
+                self.ticket.refresh_from_db()
+                self.assertEqual(self.ticket.status, SupportTicket.Status.SUBMITTED)
+                raise SystemExit
+            return {"id": 1001}
+
+        client.create_conversation.side_effect = create_conversation
+        with self.assertRaises(SystemExit):
+            drain_outbox(client)
+
+        self.ticket.refresh_from_db()
+        second.refresh_from_db()
+        self.assertEqual(self.ticket.conversation_id, "1001")
+        self.assertEqual(second.status, SupportTicket.Status.QUEUED)
+        self.assertGreater(second.next_attempt_at, timezone.now())
@@ -1,10 +1,10 @@
 from django.urls import path
 
-from .views import SupportMessageView
+from .views import SupportMessageView, SupportTicketDetailView
 
 app_name = "support"
 
 urlpatterns = [
     path("messages/", SupportMessageView.as_view(), name="support-message"),
+    path("messages/<int:pk>/", SupportTicketDetailView.as_view(), name="support-ticket"),
 ]
-
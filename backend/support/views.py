@@ -1,11 +1,17 @@
+from adrf.views import APIView as AsyncAPIView
+from asgiref.sync import sync_to_async
 from django.conf import settings
+from django.shortcuts import get_object_or_404
 from analytics.posthog import capture as capture_event
 from rest_framework import permissions, status
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
-from .serializers import SupportMessageSerializer
-from .services import HelpScoutClient
+from .models import SupportTicket
+from .serializers import SupportMessageSerializer, SupportTicketSerializer
+from .services import queue_support_ticket
+
+RECENT_TICKETS_LIMIT = 20
 
 
 class HelpScoutConfiguredMixin:
@@ -18,10 +24,16 @@ class HelpScoutConfiguredMixin:
             raise ValueError("HelpScout credentials are not configured.")
 
 
-class SupportMessageView(APIView, HelpScoutConfiguredMixin):
+class SupportMessageView(AsyncAPIView, HelpScoutConfiguredMixin):
     permission_classes = [permissions.IsAuthenticated]
 
-    def post(self, request, *args, **kwargs):
+    async def get(self, request, *args, **kwargs):
+        tickets = await sync_to_async(
+            lambda: list(SupportTicket.objects.filter(user=request.user)[:RECENT_TICKETS_LIMIT])
+        )()
+        return Response(SupportTicketSerializer(tickets, many=True).data)
+
+    async def post(self, request, *args, **kwargs):
         serializer = SupportMessageSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
         data = serializer.validated_data
@@ -34,16 +46,8 @@ class SupportMessageView(APIView, HelpScoutConfiguredMixin):
                 status=status.HTTP_503_SERVICE_UNAVAILABLE,
             )
 
-        client = HelpScoutClient()
-        response_payload = client.create_conversation(
-            subject=data["subject"],
-            body=data["message"],
-            customer_email=data["customer_email"],
-            customer_first_name=data.get("customer_first_name"),
-            customer_last_name=data.get("customer_last_name"),
-            tags=data.get("tags"),
-            metadata={"source": "ReturnShield Dashboard"},
-        )
+        # Stored locally and delivered to HelpScout by support.tasks.
+        ticket = await sync_to_async(queue_support_ticket)(request.user, data)
         try:
             capture_event(
                 "support_ticket_created",
@@ -56,11 +60,12 @@ class SupportMessageView(APIView, HelpScoutConfiguredMixin):
         except Exception:  # pragma: no cover
             pass
 
-        return Response(
-            {
-                "status": "submitted",
-                "conversationId": response_payload.get("id"),
-                "mailboxId": response_payload.get("mailboxId"),
-            },
-            status=status.HTTP_201_CREATED,
-        )
+        return Response(SupportTicketSerializer(ticket).data, status=status.HTTP_202_ACCEPTED)
+
+
+class SupportTicketDetailView(APIView):
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request, pk, *args, **kwargs):
+        ticket = get_object_or_404(SupportTicket, pk=pk, user=request.user)
+        return Response(SupportTicketSerializer(ticket).data)
@@ -17,9 +17,9 @@ class WooCommerceIntegrationTests(APITestCase):
         )
         self.client.force_authenticate(self.user)
 
-    @mock.patch("woocommerce_integration.views.requests.get")
-    def test_connect_success(self, mock_get):
-        mock_get.return_value = mock.Mock(status_code=200, json=lambda: {})
+    @mock.patch("woocommerce_integration.views.get_async_client")
+    def test_connect_success(self, mock_client):
+        mock_client.return_value.get = mock.AsyncMock(return_value=mock.Mock(status_code=200, json=lambda: {}))
 
         response = self.client.post(
             reverse("woocommerce_integration:connect"),
@@ -37,9 +37,9 @@ class WooCommerceIntegrationTests(APITestCase):
         self.user.refresh_from_db()
         self.assertEqual(self.user.store_platform, User.StorePlatform.WOOCOMMERCE)
 
-    @mock.patch("woocommerce_integration.views.requests.get")
-    def test_connect_failure(self, mock_get):
-        mock_get.return_value = mock.Mock(status_code=403, json=lambda: {})
+    @mock.patch("woocommerce_integration.views.get_async_client")
+    def test_connect_failure(self, mock_client):
+        mock_client.return_value.get = mock.AsyncMock(return_value=mock.Mock(status_code=403, json=lambda: {}))
 
         response = self.client.post(
             reverse("woocommerce_integration:connect"),
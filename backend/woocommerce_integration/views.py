@@ -2,22 +2,25 @@ from __future__ import annotations
 
 import logging
 
-import requests
+import httpx
+from adrf.views import APIView as AsyncAPIView
+from asgiref.sync import sync_to_async
 from rest_framework import permissions, status
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
 from accounts.models import User
+from core.http import get_async_client
 from .models import WooCommerceConnection
 from .serializers import WooCommerceConnectSerializer
 
 logger = logging.getLogger(__name__)
 
 
-class WooCommerceConnectView(APIView):
+class WooCommerceConnectView(AsyncAPIView):
     permission_classes = [permissions.IsAuthenticated]
 
-    def post(self, request, *args, **kwargs):
+    async def post(self, request, *args, **kwargs):
         serializer = WooCommerceConnectSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
         data = serializer.validated_data
@@ -27,12 +30,12 @@ class WooCommerceConnectView(APIView):
         consumer_secret = data["consumer_secret"]
 
         try:
-            response = requests.get(
+            response = await get_async_client().get(
                 f"{site_url}/wp-json/wc/v3",
                 auth=(consumer_key, consumer_secret),
                 timeout=10,
             )
-        except requests.RequestException as exc:
+        except httpx.HTTPError as exc:
             logger.exception("WooCommerce verification failed: %s", exc)
             return Response(
                 {"detail": "Unable to reach WooCommerce API. Please verify credentials."},
@@ -45,7 +48,7 @@ class WooCommerceConnectView(APIView):
                 status=status.HTTP_400_BAD_REQUEST,
             )
 
-        connection, _created = WooCommerceConnection.objects.get_or_create(
+        connection, _created = await WooCommerceConnection.objects.aget_or_create(
             user=request.user,
             defaults={
                 "site_url": site_url,
@@ -59,11 +62,9 @@ class WooCommerceConnectView(APIView):
             connection.site_url = site_url
             connection.consumer_key = consumer_key
             connection.consumer_secret = consumer_secret
-            connection.mark_active()
-        else:
-            connection.mark_active()
+        await sync_to_async(connection.mark_active)()
 
-        self._update_user_store_profile(request.user, site_url)
+        await sync_to_async(self._update_user_store_profile)(request.user, site_url)
 
         return Response(
             {"status": "connected", "site_url": site_url},